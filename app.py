@@ -35,6 +35,7 @@ def check_for_updates():
             
             if updated:
                 logger.info(f"Updated to version {new_version}, restarting...")
+                uploader.save_upload_queue()
                 auto_updater.restart_application()
             elif error_message:
                 logger.info(f"Update check result: {error_message}")
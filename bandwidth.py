@@ -0,0 +1,307 @@
+"""
+Upload bandwidth limiting for YouTube Auto Uploader
+
+The media reader (see media_reader.py) takes tokens from token buckets
+before it hands each block of a chunk to the HTTP layer:
+
+- one global bucket shared by all uploads running at the same time
+- one bucket per upload, for the per-task cap
+
+The global rate comes from a schedule of time windows, so uploads can for
+example be unlimited at night and capped to 20 Mbit/s during the day.
+Rates are configured in Mbit/s (None or 0 means unlimited):
+
+    "bandwidth_limit_mbps": 50,
+    "bandwidth_task_limit_mbps": null,
+    "bandwidth_schedule": [
+        {"start": "08:00", "end": "18:00", "limit_mbps": 20, "days": [0, 1, 2, 3, 4]},
+        {"start": "22:00", "end": "06:00", "limit_mbps": null}
+    ]
+
+Days are numbered from Monday (0) to Sunday (6), windows may cross
+midnight, and the first matching window wins over bandwidth_limit_mbps.
+"""
+import time
+import logging
+import threading
+from datetime import datetime
+
+import config
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('bandwidth')
+
+# Seconds between reloads of the limits from the configuration
+REFRESH_INTERVAL = 5
+
+# Seconds of traffic a bucket may send at once after being idle
+BURST_SECONDS = 0.5
+
+# Smallest burst, so reads of one socket block never have to wait twice
+MIN_BURST = 64 * 1024
+
+# Bytes paid for at once while throttling. http.client reads the body 8 KB at
+# a time, so tokens are taken per block instead of per read
+THROTTLE_BLOCK_SIZE = 64 * 1024
+
+def mbps_to_bytes(limit_mbps):
+    """
+    Convert a limit in Mbit/s to bytes per second
+
+    Args:
+        limit_mbps (float): Limit in Mbit/s, None or 0 for unlimited
+
+    Returns:
+        float: Bytes per second, or None for unlimited
+    """
+    if not limit_mbps:
+        return None
+    return float(limit_mbps) * 1000 * 1000 / 8
+
+def parse_time_of_day(value):
+    """
+    Parse a "HH:MM" time of day
+
+    Args:
+        value (str): Time of day
+
+    Returns:
+        int: Minutes since midnight
+
+    Raises:
+        ValueError: If the time is not valid
+    """
+    hours, minutes = str(value).split(':')
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > 24 * 60:
+        raise ValueError(f"Invalid time of day: {value}")
+    return hours * 60 + minutes
+
+def validate_schedule(schedule):
+    """
+    Check a bandwidth schedule from the settings
+
+    Args:
+        schedule (list): Window dicts with start, end, limit_mbps and optional days
+
+    Returns:
+        list: The schedule with limits converted to numbers
+
+    Raises:
+        ValueError: Describing the first invalid window
+    """
+    if schedule is None:
+        return []
+    if not isinstance(schedule, list):
+        raise ValueError("The bandwidth schedule must be a list of time windows")
+
+    windows = []
+    for index, window in enumerate(schedule):
+        if not isinstance(window, dict):
+            raise ValueError(f"Window {index + 1} must be an object")
+        parse_time_of_day(window.get('start'))
+        parse_time_of_day(window.get('end'))
+
+        limit = window.get('limit_mbps')
+        if limit not in (None, ''):
+            limit = float(limit)
+            if limit < 0:
+                raise ValueError(f"Window {index + 1} has a negative limit")
+        else:
+            limit = None
+
+        days = window.get('days')
+        if days is not None and not all(isinstance(day, int) and 0 <= day <= 6 for day in days):
+            raise ValueError(f"Window {index + 1} has invalid days (use 0 = Monday to 6 = Sunday)")
+
+        windows.append({**window, 'limit_mbps': limit})
+    return windows
+
+def window_matches(window, now):
+    """
+    Check whether a schedule window covers a point in time
+
+    Args:
+        window (dict): Window with start, end and optional days
+        now (datetime): Point in time
+
+    Returns:
+        bool: True if the window applies
+    """
+    start = parse_time_of_day(window['start'])
+    end = parse_time_of_day(window['end'])
+    minute = now.hour * 60 + now.minute
+    days = window.get('days')
+
+    if start <= end:
+        return start <= minute < end and (days is None or now.weekday() in days)
+
+    # Crosses midnight: the part after midnight belongs to the previous day
+    if minute >= start:
+        return days is None or now.weekday() in days
+    if minute < end:
+        return days is None or (now.weekday() - 1) % 7 in days
+    return False
+
+def get_scheduled_limit(app_config, now=None):
+    """
+    Get the global upload limit that applies right now
+
+    Args:
+        app_config (dict): Application configuration
+        now (datetime, optional): Point in time, defaults to now
+
+    Returns:
+        float: Limit in Mbit/s, or None for unlimited
+    """
+    now = now or datetime.now()
+    for window in app_config.get('bandwidth_schedule') or []:
+        try:
+            if window_matches(window, now):
+                return window.get('limit_mbps') or None
+        except (KeyError, ValueError) as e:
+            logger.warning(f"Ignoring invalid bandwidth schedule window {window}: {e}")
+    return app_config.get('bandwidth_limit_mbps') or None
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that makes callers wait for their bytes
+
+    Callers reserve tokens and then sleep off any deficit outside the lock,
+    so several uploads sharing a bucket together stay within its rate.
+
+    Attributes:
+        rate (float): Bytes per second, None for unlimited
+    """
+    def __init__(self, rate=None):
+        """Create a bucket with the given rate"""
+        self.lock = threading.Lock()
+        self.rate = None
+        self.burst = MIN_BURST
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        """
+        Change the rate of the bucket
+
+        Args:
+            rate (float): Bytes per second, None for unlimited
+        """
+        with self.lock:
+            if rate == self.rate:
+                return
+            self._refill(time.monotonic())
+            self.rate = rate
+            self.burst = max(MIN_BURST, rate * BURST_SECONDS) if rate else MIN_BURST
+            self.tokens = min(self.tokens, self.burst)
+
+    def _refill(self, now):
+        """Add the tokens earned since the last update, caller holds the lock"""
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, amount):
+        """
+        Take tokens for a number of bytes, waiting if the bucket is empty
+
+        Args:
+            amount (int): Number of bytes
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        with self.lock:
+            if not self.rate:
+                return 0.0
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+class BandwidthLimiter:
+    """
+    Global upload limiter following the configured schedule
+
+    Attributes:
+        bucket (TokenBucket): Bucket shared by all uploads
+        task_rate (float): Per-upload rate in bytes per second, None for unlimited
+        limit_mbps (float): Global limit that currently applies
+    """
+    def __init__(self):
+        """Create a limiter, limits are loaded on first use"""
+        self.bucket = TokenBucket()
+        self.task_rate = None
+        self.limit_mbps = None
+        self.refreshed_at = None
+        self.lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """
+        Reload the limits from the configuration and schedule if it is time
+
+        Args:
+            force (bool): Reload even if the last reload was recent
+        """
+        now = time.monotonic()
+        with self.lock:
+            if not force and self.refreshed_at is not None and now - self.refreshed_at < REFRESH_INTERVAL:
+                return
+            self.refreshed_at = now
+
+        app_config = config.load_config()
+        limit_mbps = get_scheduled_limit(app_config)
+        if limit_mbps != self.limit_mbps:
+            logger.info(f"Upload bandwidth limit: {f'{limit_mbps} Mbit/s' if limit_mbps else 'unlimited'}")
+        self.limit_mbps = limit_mbps
+        self.bucket.set_rate(mbps_to_bytes(limit_mbps))
+        self.task_rate = mbps_to_bytes(app_config.get('bandwidth_task_limit_mbps'))
+
+    def create_task_bucket(self):
+        """
+        Create the bucket for one upload
+
+        Returns:
+            TokenBucket: Bucket with the current per-task rate
+        """
+        self.refresh()
+        return TokenBucket(self.task_rate)
+
+    def throttle(self, amount, task_bucket=None):
+        """
+        Wait until an upload may send a number of bytes
+
+        Args:
+            amount (int): Number of bytes
+            task_bucket (TokenBucket, optional): Bucket of the upload
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        self.refresh()
+        waited = self.bucket.consume(amount)
+        if task_bucket is not None:
+            task_bucket.set_rate(self.task_rate)
+            waited += task_bucket.consume(amount)
+        return waited
+
+# Shared limiter for all uploads
+limiter = BandwidthLimiter()
+
+def get_current_limit():
+    """
+    Get the global upload limit that applies right now
+
+    Returns:
+        float: Limit in Mbit/s, or None for unlimited
+    """
+    limiter.refresh()
+    return limiter.limit_mbps
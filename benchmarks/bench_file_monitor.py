@@ -0,0 +1,354 @@
+"""
+Benchmarks for the file monitor of YouTube Auto Uploader
+
+Builds synthetic watch folders in a temporary directory and measures:
+
+- is_video_file throughput
+- scan_folder_for_videos time and entries per second for flat and nested
+  folders of different sizes (mixed video and non-video files)
+- memory held by the processed-file structures (file index cache and
+  stability tracker) after a scan
+- wait_for_file_stability time for a file that is already complete
+- detection latency from the moment a writer closes a file until the
+  monitor callback runs, while other files in the folder are still growing
+
+Usage:
+    python benchmarks/bench_file_monitor.py
+    python benchmarks/bench_file_monitor.py --sizes 10,1000 --output before.json
+    python benchmarks/bench_file_monitor.py --output after.json --compare before.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+import tracemalloc
+
+# Run from anywhere: make the application modules importable
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import config
+import file_index
+import file_monitor
+from stability_tracker import StabilityTracker
+
+# Share of generated entries that are video files
+VIDEO_RATIO = 0.1
+
+# Non-video names found next to recordings
+OTHER_EXTENSIONS = ['.txt', '.jpg', '.png', '.json', '.log', '.ini']
+
+def create_watch_folder(base_dir, entry_count, nested=False, files_per_folder=1000):
+    """
+    Create a synthetic watch folder
+
+    Args:
+        base_dir (str): Directory to create the folder in
+        entry_count (int): Number of files to create
+        nested (bool): Spread files over per-game subfolders two levels deep
+        files_per_folder (int): Files per subfolder when nested
+
+    Returns:
+        tuple: (folder path, number of video files created)
+    """
+    folder = tempfile.mkdtemp(prefix=f"watch_{entry_count}_", dir=base_dir)
+    video_every = max(1, int(1 / VIDEO_RATIO))
+    video_count = 0
+
+    for i in range(entry_count):
+        if nested:
+            subfolder = os.path.join(folder, f"game_{i // files_per_folder:04d}", f"session_{(i // 100) % 10}")
+            os.makedirs(subfolder, exist_ok=True)
+        else:
+            subfolder = folder
+
+        if i % video_every == 0:
+            name = f"recording_{i:07d}.mp4"
+            video_count += 1
+        else:
+            name = f"file_{i:07d}{OTHER_EXTENSIONS[i % len(OTHER_EXTENSIONS)]}"
+
+        with open(os.path.join(subfolder, name), 'wb') as f:
+            f.write(b'\0' * 16)
+
+    return folder, video_count
+
+def use_temporary_index(work_dir):
+    """Point the shared file index at a fresh database in the work directory"""
+    if file_index.file_index is not None:
+        file_index.file_index.close()
+    file_index.file_index = file_index.FileIndex(os.path.join(work_dir, f"index_{time.time_ns()}.db"))
+    return file_index.file_index
+
+def bench_is_video_file(iterations=200000):
+    """
+    Measure is_video_file calls per second over mixed file names
+
+    Returns:
+        dict: Calls per second and nanoseconds per call
+    """
+    names = [f"/videos/game/file_{i}{ext}" for i, ext in
+             enumerate(['.mp4', '.MKV', '.txt', '.jpg', '.m2ts', '.log', '.json', '.mov'])]
+    calls = 0
+    start = time.perf_counter()
+    while calls < iterations:
+        for name in names:
+            file_monitor.is_video_file(name)
+        calls += len(names)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'calls_per_second': round(calls / elapsed),
+        'ns_per_call': round(elapsed / calls * 1e9, 1)
+    }
+
+def bench_scan(work_dir, entry_count, nested):
+    """
+    Measure one scan of a synthetic folder and the memory it leaves behind
+
+    The stability tracker is created but not started, so the scan only
+    measures discovery; the found files are then claimed in the file index
+    as the tracker would do once they are stable.
+
+    Returns:
+        dict: Scan figures for this folder
+    """
+    folder, video_count = create_watch_folder(work_dir, entry_count, nested)
+    index = use_temporary_index(work_dir)
+    rule = file_monitor.normalize_watch_rule({'path': folder, 'recursive': nested, 'max_depth': None}, {})
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+
+    file_monitor.stability_tracker = StabilityTracker(lambda paths: None, mode='size')
+    start = time.perf_counter()
+    found = file_monitor.scan_folder_for_videos(folder, rule)
+    scan_time = time.perf_counter() - start
+    tracked_memory = tracemalloc.get_traced_memory()[0] - baseline
+
+    # Process the found files like the tracker does once they are stable
+    file_monitor.on_new_files_callback = lambda paths: None
+    pending = list(file_monitor.stability_tracker.files)
+    file_monitor.stability_tracker = None
+    start = time.perf_counter()
+    for batch_start in range(0, len(pending), 500):
+        file_monitor.process_video_files(pending[batch_start:batch_start + 500])
+    process_time = time.perf_counter() - start
+    processed_memory = tracemalloc.get_traced_memory()[0] - baseline
+
+    # A second scan should find nothing new and mostly hit the index
+    start = time.perf_counter()
+    file_monitor.scan_folder_for_videos(folder, rule)
+    rescan_time = time.perf_counter() - start
+
+    tracemalloc.stop()
+    file_monitor.on_new_files_callback = None
+    stats = file_monitor.get_last_scan_stats()
+    shutil.rmtree(folder, ignore_errors=True)
+
+    return {
+        'entries': entry_count,
+        'nested': nested,
+        'videos_created': video_count,
+        'videos_found': found,
+        'directories': stats.get('directories'),
+        'scan_seconds': round(scan_time, 4),
+        'entries_per_second': round(entry_count / scan_time) if scan_time > 0 else 0,
+        'process_seconds': round(process_time, 4),
+        'rescan_seconds': round(rescan_time, 4),
+        'tracker_memory_kb': round(tracked_memory / 1024, 1),
+        'processed_memory_kb': round(processed_memory / 1024, 1),
+        'index_cache_entries': len(index.cache)
+    }
+
+def bench_wait_for_file_stability(work_dir):
+    """
+    Measure how long wait_for_file_stability takes for a complete file
+
+    Returns:
+        dict: Seconds until the file was reported stable
+    """
+    file_path = os.path.join(work_dir, 'complete.mp4')
+    with open(file_path, 'wb') as f:
+        f.write(b'\0' * 1024)
+
+    start = time.perf_counter()
+    stable = file_monitor.wait_for_file_stability(file_path, check_interval=1, max_wait_time=10)
+    return {
+        'stable': stable,
+        'seconds': round(time.perf_counter() - start, 3)
+    }
+
+def bench_detection_latency(work_dir, stability_mode, samples=5, growing_files=3):
+    """
+    Measure the time from a writer closing a file until the callback runs
+
+    While the measured files are written, other files in the folder keep
+    growing in a background writer thread, as during a live recording.
+
+    Args:
+        work_dir (str): Directory for the watch folder
+        stability_mode (str): Stability mode to monitor with
+        samples (int): Number of files to measure
+        growing_files (int): Number of files kept growing in the background
+
+    Returns:
+        dict: Latency figures in milliseconds
+    """
+    folder = tempfile.mkdtemp(prefix='latency_', dir=work_dir)
+    use_temporary_index(work_dir)
+
+    detected = {}
+    detected_event = threading.Condition()
+
+    def on_new_file(file_path):
+        with detected_event:
+            detected[file_path] = time.perf_counter()
+            detected_event.notify_all()
+
+    # Keep some files growing for the whole measurement
+    stop_writing = threading.Event()
+
+    def keep_writing():
+        handles = [open(os.path.join(folder, f"growing_{i}.mp4"), 'wb') for i in range(growing_files)]
+        try:
+            while not stop_writing.is_set():
+                for handle in handles:
+                    handle.write(b'\0' * 4096)
+                    handle.flush()
+                time.sleep(0.05)
+        finally:
+            for handle in handles:
+                handle.close()
+
+    original_load_config = config.load_config
+    overrides = {'stability_mode': stability_mode, 'stability_check_interval': 0.5}
+    config.load_config = lambda: {**original_load_config(), **overrides}
+    file_monitor.register_callback(on_new_file)
+
+    writer = threading.Thread(target=keep_writing)
+    writer.daemon = True
+    writer.start()
+
+    latencies = []
+    try:
+        file_monitor.start_monitoring(folder, check_existing=False, watch_folders=[])
+        mode = file_monitor.stability_tracker.mode
+
+        for i in range(samples):
+            file_path = os.path.join(folder, f"sample_{i}.mp4")
+            with open(file_path, 'wb') as f:
+                for _ in range(10):
+                    f.write(b'\0' * 65536)
+                    f.flush()
+                    time.sleep(0.02)
+            closed_at = time.perf_counter()
+
+            with detected_event:
+                detected_event.wait_for(lambda: file_path in detected, timeout=30)
+            if file_path in detected:
+                latencies.append((detected[file_path] - closed_at) * 1000)
+    finally:
+        file_monitor.stop_monitoring()
+        file_monitor.register_callback(None)
+        config.load_config = original_load_config
+        stop_writing.set()
+        writer.join(timeout=5)
+        shutil.rmtree(folder, ignore_errors=True)
+
+    latencies.sort()
+    return {
+        'requested_mode': stability_mode,
+        'mode': mode,
+        'samples': len(latencies),
+        'min_ms': round(latencies[0], 1) if latencies else None,
+        'median_ms': round(latencies[len(latencies) // 2], 1) if latencies else None,
+        'max_ms': round(latencies[-1], 1) if latencies else None
+    }
+
+def get_git_revision():
+    """Get the current commit hash, or None outside a git checkout"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+def print_comparison(results, baseline):
+    """Print scan and latency figures next to those of an earlier run"""
+    print(f"\nComparison with {baseline.get('revision') or 'baseline'}:")
+
+    old_scans = {(s['entries'], s['nested']): s for s in baseline.get('scans', [])}
+    for scan in results['scans']:
+        old = old_scans.get((scan['entries'], scan['nested']))
+        if old and old['scan_seconds'] and scan['scan_seconds']:
+            print(f"  scan {scan['entries']:>7} {'nested' if scan['nested'] else 'flat  '}: "
+                  f"{old['scan_seconds']:.4f}s -> {scan['scan_seconds']:.4f}s "
+                  f"({old['scan_seconds'] / scan['scan_seconds']:.2f}x)")
+
+    old_latency = {l['requested_mode']: l for l in baseline.get('latency', [])}
+    for latency in results['latency']:
+        old = old_latency.get(latency['requested_mode'])
+        if old and old['median_ms'] is not None and latency['median_ms'] is not None:
+            print(f"  latency {latency['requested_mode']:<11}: {old['median_ms']}ms -> {latency['median_ms']}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the file monitor')
+    parser.add_argument('--sizes', default='10,1000,100000',
+                        help='Comma separated entry counts for the synthetic folders')
+    parser.add_argument('--latency-samples', type=int, default=5,
+                        help='Number of files used to measure detection latency')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Compare with results from an earlier --output file')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+
+    work_dir = tempfile.mkdtemp(prefix='bench_file_monitor_')
+    results = {'revision': get_git_revision(), 'scans': [], 'latency': []}
+    try:
+        results['is_video_file'] = bench_is_video_file()
+        print(f"is_video_file: {results['is_video_file']['ns_per_call']} ns/call")
+
+        for size in sizes:
+            for nested in (False, True):
+                scan = bench_scan(work_dir, size, nested)
+                results['scans'].append(scan)
+                print(f"scan {size:>7} {'nested' if nested else 'flat  '}: {scan['scan_seconds']:.4f}s "
+                      f"({scan['entries_per_second']} entries/s), rescan {scan['rescan_seconds']:.4f}s, "
+                      f"{scan['videos_found']} videos, tracker {scan['tracker_memory_kb']} KB, "
+                      f"processed {scan['processed_memory_kb']} KB")
+
+        results['wait_for_file_stability'] = bench_wait_for_file_stability(work_dir)
+        print(f"wait_for_file_stability: {results['wait_for_file_stability']['seconds']}s")
+
+        for mode in ('size', 'close_write'):
+            latency = bench_detection_latency(work_dir, mode, samples=args.latency_samples)
+            results['latency'].append(latency)
+            print(f"detection latency ({latency['mode']}): median {latency['median_ms']} ms, "
+                  f"max {latency['max_ms']} ms over {latency['samples']} files")
+    finally:
+        if file_index.file_index is not None:
+            file_index.file_index.close()
+            file_index.file_index = None
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+
+if __name__ == '__main__':
+    main()
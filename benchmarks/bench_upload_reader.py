@@ -0,0 +1,236 @@
+"""
+Benchmarks for the upload media sources of YouTube Auto Uploader
+
+Sends a synthetic file through a resumable upload request against an
+in-process fake server (which consumes the body like http.client does, in
+8 KB blocks) and measures for each media source:
+
+- media_file: MediaFileUpload, which the uploader used before, reading
+  each block the HTTP layer sends into a new bytes object
+- read_ahead: ReadAheadMediaUpload, two reused buffers filled in the background
+- mmap: MmapMediaUpload, views of a memory map of the file
+
+Figures per source:
+
+- Python memory allocated per chunk (tracemalloc peak above the baseline)
+- bytes handed to the HTTP layer as newly allocated objects rather than
+  views of existing memory, per chunk
+- peak RSS growth of a fresh process while uploading; for mmap this
+  includes the mapped file pages, which belong to the page cache and can
+  be dropped by the kernel at any time
+- upload time and throughput without a network
+
+Usage:
+    python benchmarks/bench_upload_reader.py
+    python benchmarks/bench_upload_reader.py --size-mb 1024 --chunk-mb 16 --output after.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+
+# Run from anywhere: make the application modules importable
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import httplib2
+from googleapiclient.http import HttpRequest, MediaFileUpload
+
+import media_reader
+
+MB = 1024 * 1024
+
+# Block size http.client uses to send file-like bodies
+SEND_BLOCK_SIZE = 8192
+
+MODES = ['media_file', 'read_ahead', 'mmap']
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, RSS figures are skipped there
+    resource = None
+
+class FakeUploadServer:
+    """
+    Minimal resumable upload endpoint that discards the received data
+
+    Attributes:
+        received (int): Bytes confirmed so far
+        copied_bytes (int): Bytes received as new bytes objects instead of views
+    """
+    def __init__(self):
+        """Create a server with no upload in progress"""
+        self.received = 0
+        self.copied_bytes = 0
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        """Answer like the upload API: start a session, then accept chunks"""
+        headers = headers or {}
+        if uri.endswith('/upload'):
+            return httplib2.Response({'status': '200', 'location': 'http://localhost/session'}), b''
+
+        match = re.match(r'bytes (\d+)-(\d+)/(\d+)', headers.get('Content-Range', ''))
+        start, end, total = map(int, match.groups())
+
+        length = 0
+        if hasattr(body, 'read'):
+            while True:
+                block = body.read(SEND_BLOCK_SIZE)
+                if not block:
+                    break
+                length += len(block)
+                if isinstance(block, bytes):
+                    self.copied_bytes += len(block)
+        else:
+            length = len(body)
+            self.copied_bytes += length
+        assert length == end - start + 1, f"Got {length} bytes for range {start}-{end}"
+
+        self.received = end + 1
+        if self.received == total:
+            return httplib2.Response({'status': '200'}), b'{"id": "benchmark"}'
+        return httplib2.Response({'status': '308', 'range': f'bytes=0-{end}'}), b''
+
+def create_media(mode, file_path, chunk_size):
+    """Create the media source to benchmark"""
+    if mode == 'media_file':
+        return MediaFileUpload(file_path, mimetype='video/mp4', chunksize=chunk_size, resumable=True)
+    if mode == 'read_ahead':
+        return media_reader.ReadAheadMediaUpload(file_path, 'video/mp4', chunk_size)
+    return media_reader.MmapMediaUpload(file_path, 'video/mp4', chunk_size)
+
+def close_media(media):
+    """Release the file of a media source"""
+    if hasattr(media, 'close'):
+        media.close()
+    elif getattr(media, '_fd', None):
+        media._fd.close()
+
+def get_max_rss():
+    """Get the peak resident set size of this process in bytes, or None"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+def run_upload(mode, file_path, chunk_size):
+    """
+    Upload a file once and measure it
+
+    Returns:
+        dict: Chunk count, per-chunk allocation, RSS growth and timing
+    """
+    server = FakeUploadServer()
+    rss_before = get_max_rss()
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    media = create_media(mode, file_path, chunk_size)
+    request = HttpRequest(server, lambda resp, content: json.loads(content), 'http://localhost/upload',
+                          method='POST', body='{}', resumable=media)
+
+    chunk_peaks = []
+    response = None
+    start = time.perf_counter()
+    while response is None:
+        tracemalloc.reset_peak()
+        chunk_baseline = tracemalloc.get_traced_memory()[0]
+        _, response = request.next_chunk(http=server)
+        chunk_peaks.append(tracemalloc.get_traced_memory()[1] - chunk_baseline)
+    elapsed = time.perf_counter() - start
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    close_media(media)
+    rss_after = get_max_rss()
+    file_size = os.path.getsize(file_path)
+    chunk_peaks.sort()
+
+    return {
+        'mode': mode,
+        'chunks': len(chunk_peaks),
+        'median_chunk_alloc_kb': round(chunk_peaks[len(chunk_peaks) // 2] / 1024, 1),
+        'max_chunk_alloc_kb': round(chunk_peaks[-1] / 1024, 1),
+        'copied_kb_per_chunk': round(server.copied_bytes / len(chunk_peaks) / 1024, 1),
+        'retained_kb': round(retained / 1024, 1),
+        'rss_growth_mb': round((rss_after - rss_before) / MB, 1) if rss_before is not None else None,
+        'seconds': round(elapsed, 3),
+        'mb_per_second': round(file_size / MB / elapsed, 1) if elapsed > 0 else None
+    }
+
+def run_in_subprocess(mode, file_path, chunk_size):
+    """Run one mode in a fresh interpreter, so peak RSS isn't shared between modes"""
+    output = subprocess.check_output([
+        sys.executable, os.path.abspath(__file__), '--child', mode,
+        '--file', file_path, '--chunk-bytes', str(chunk_size)
+    ])
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+def create_test_file(work_dir, size):
+    """Write a file of random-looking data"""
+    file_path = os.path.join(work_dir, 'upload.mp4')
+    block = os.urandom(MB)
+    with open(file_path, 'wb') as f:
+        written = 0
+        while written < size:
+            f.write(block[:min(MB, size - written)])
+            written += MB
+    return file_path
+
+def get_git_revision():
+    """Get the current commit hash, or None outside a git checkout"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the upload media sources')
+    parser.add_argument('--size-mb', type=int, default=256, help='Size of the synthetic file')
+    parser.add_argument('--chunk-mb', type=int, default=8, help='Chunk size of the upload')
+    parser.add_argument('--modes', default=','.join(MODES), help='Comma separated sources to measure')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--file', help=argparse.SUPPRESS)
+    parser.add_argument('--chunk-bytes', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    if args.child:
+        print(json.dumps(run_upload(args.child, args.file, args.chunk_bytes)))
+        return
+
+    chunk_size = args.chunk_mb * MB
+    work_dir = tempfile.mkdtemp(prefix='bench_upload_reader_')
+    results = {'revision': get_git_revision(), 'size_mb': args.size_mb, 'chunk_mb': args.chunk_mb, 'modes': []}
+    try:
+        file_path = create_test_file(work_dir, args.size_mb * MB)
+        for mode in [mode for mode in args.modes.split(',') if mode]:
+            result = run_in_subprocess(mode, file_path, chunk_size)
+            results['modes'].append(result)
+            print(f"{mode:<10}: {result['chunks']} chunks, "
+                  f"{result['median_chunk_alloc_kb']} KB allocated per chunk (max {result['max_chunk_alloc_kb']} KB), "
+                  f"{result['copied_kb_per_chunk']} KB copied per chunk, "
+                  f"peak RSS +{result['rss_growth_mb']} MB, {result['mb_per_second']} MB/s")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == '__main__':
+    main()
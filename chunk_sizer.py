@@ -0,0 +1,181 @@
+"""
+Adaptive upload chunk sizing for YouTube Auto Uploader
+
+Every chunk of a resumable upload costs a full HTTP round trip, so small
+chunks waste most of a fast or high-latency link on waiting. The chunk
+sizer measures how long each chunk takes and adjusts the size with an
+AIMD (additive increase, multiplicative decrease) controller:
+
+- while a chunk takes less than the target time, the size grows by a
+  fixed step
+- when a chunk takes much longer than the target (the link got slower),
+  the size shrinks a little
+- after a failed chunk the size is halved, so the retry re-sends less data
+
+Sizes are always multiples of 256 KB, as required by the resumable upload
+protocol, and stay within the configured bounds.
+"""
+import time
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('chunk_sizer')
+
+# Chunk sizes must be multiples of this (except the last chunk)
+CHUNK_GRANULARITY = 256 * 1024
+
+MB = 1024 * 1024
+
+def round_chunk_size(size):
+    """
+    Round a size down to a multiple of CHUNK_GRANULARITY (at least one)
+
+    Args:
+        size (float): Size in bytes
+
+    Returns:
+        int: Valid chunk size
+    """
+    return max(CHUNK_GRANULARITY, int(size) // CHUNK_GRANULARITY * CHUNK_GRANULARITY)
+
+class ChunkSizer:
+    """
+    AIMD controller for the chunk size of one upload
+
+    Attributes:
+        min_size (int): Smallest chunk size in bytes
+        max_size (int): Largest chunk size in bytes
+        chunk_size (int): Current chunk size in bytes
+        target_seconds (float): Time one chunk should take
+        increase_step (int): Bytes added after a fast chunk
+        chunks (int): Number of chunks sent successfully
+        failures (int): Number of failed chunks
+        throughput (float): Smoothed throughput in bytes per second
+        last_chunk_seconds (float): Round trip time of the last chunk
+    """
+    def __init__(self, min_size=MB, max_size=64 * MB, initial_size=None,
+                 target_seconds=4, increase_step=MB):
+        """Create a sizer starting at initial_size (or min_size)"""
+        self.min_size = round_chunk_size(min_size)
+        self.max_size = max(self.min_size, round_chunk_size(max_size))
+        self.target_seconds = target_seconds
+        self.increase_step = round_chunk_size(increase_step)
+        self.chunk_size = self._clamp(initial_size or self.min_size)
+
+        self.chunks = 0
+        self.failures = 0
+        self.throughput = None
+        self.last_chunk_seconds = None
+        self.started_at = None
+
+    @classmethod
+    def from_config(cls, app_config, file_size=None):
+        """
+        Create a sizer with the bounds from the application configuration
+
+        Args:
+            app_config (dict): Application configuration
+            file_size (int, optional): Size of the file to upload
+
+        Returns:
+            ChunkSizer: The new sizer
+        """
+        initial_mb = app_config.get("upload_chunk_initial_mb")
+        if not initial_mb:
+            # Same starting point as the old fixed sizes
+            initial_mb = 4 if file_size and file_size > 100 * MB else 1
+
+        return cls(
+            min_size=app_config.get("upload_chunk_min_mb", 1) * MB,
+            max_size=app_config.get("upload_chunk_max_mb", 64) * MB,
+            initial_size=initial_mb * MB,
+            target_seconds=app_config.get("upload_chunk_target_seconds", 4)
+        )
+
+    def _clamp(self, size):
+        """Round a size and keep it within the bounds"""
+        return min(self.max_size, max(self.min_size, round_chunk_size(size)))
+
+    def start_chunk(self):
+        """Note the start time of the next chunk"""
+        self.started_at = time.monotonic()
+
+    def chunk_succeeded(self, sent_bytes):
+        """
+        Adjust the size after a chunk was accepted
+
+        Args:
+            sent_bytes (int): Bytes the server confirmed for this chunk
+
+        Returns:
+            int: The new chunk size
+        """
+        if self.started_at is None or sent_bytes <= 0:
+            return self.chunk_size
+
+        elapsed = max(time.monotonic() - self.started_at, 1e-6)
+        self.started_at = None
+        self.chunks += 1
+        self.last_chunk_seconds = elapsed
+
+        rate = sent_bytes / elapsed
+        self.throughput = rate if self.throughput is None else 0.7 * self.throughput + 0.3 * rate
+
+        if elapsed < self.target_seconds:
+            new_size = self.chunk_size + self.increase_step
+        elif elapsed > 2 * self.target_seconds:
+            new_size = self.chunk_size * 0.75
+        else:
+            new_size = self.chunk_size
+
+        new_size = self._clamp(new_size)
+        if new_size != self.chunk_size:
+            logger.debug(f"Chunk size {self.chunk_size} -> {new_size} bytes "
+                         f"({elapsed:.2f}s, {rate / MB:.2f} MB/s)")
+            self.chunk_size = new_size
+        return self.chunk_size
+
+    def chunk_failed(self):
+        """
+        Halve the size after a chunk failed
+
+        Returns:
+            int: The new chunk size
+        """
+        self.started_at = None
+        self.failures += 1
+        self.chunk_size = self._clamp(self.chunk_size / 2)
+        logger.debug(f"Chunk failed, chunk size reduced to {self.chunk_size} bytes")
+        return self.chunk_size
+
+    def apply(self, media):
+        """
+        Set the current chunk size on a resumable media upload
+
+        Args:
+            media (MediaUpload): Media of the upload request
+        """
+        if hasattr(media, 'set_chunksize'):
+            media.set_chunksize(self.chunk_size)
+        else:
+            # MediaFileUpload has no setter, chunksize() returns this attribute
+            media._chunksize = self.chunk_size
+
+    def stats(self):
+        """
+        Get the sizer's state for display
+
+        Returns:
+            dict: Current size, bounds, counts and measurements
+        """
+        return {
+            'chunk_size': self.chunk_size,
+            'min_chunk_size': self.min_size,
+            'max_chunk_size': self.max_size,
+            'chunks': self.chunks,
+            'failures': self.failures,
+            'throughput': round(self.throughput) if self.throughput else None,
+            'last_chunk_seconds': round(self.last_chunk_seconds, 3) if self.last_chunk_seconds else None
+        }
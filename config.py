@@ -23,10 +23,40 @@ def load_config():
         "delete_after_upload": True,
         "check_existing_files": True,
         "max_retries": 3,
-        "upload_limit_duration": 24,  # hours
+        "retry_base_delay": 1,  # seconds, upper bound of the first random retry wait (doubles per retry)
+        "retry_max_delay": 60,  # seconds, longest wait between retries
+        "circuit_breaker_threshold": 5,  # transient failures in a row that pause an API project
+        "circuit_breaker_reset": 120,  # seconds an API project stays paused
+        "quota_daily_limit": 10000,  # YouTube API units per project and day (an upload costs 1600)
+        "quota_project_limits": {},  # daily units of projects with a different quota, by project ID
         "delete_retry_delay": 5,  # seconds
         "delete_retry_count": 5,  # times
         "selected_channel_id": None,  # Selected YouTube channel ID
+        "watch_folders": [],  # extra folders: paths or {path, recursive, max_depth, include, exclude}
+        "watch_recursive": False,  # default for watched folders: include subfolders
+        "watch_max_depth": None,  # default subfolder depth limit (None = unlimited)
+        "watch_include": [],  # default glob patterns a file must match
+        "watch_exclude": [],  # default glob patterns for files and folders to skip
+        "watcher_mode": "auto",  # auto (native with polling fallback) or polling
+        "polling_interval": 5,  # seconds, used by the polling watcher
+        "stability_check_interval": 1,  # seconds between file size checks
+        "stability_mode": "auto",  # auto, size, or close_write (Linux: wait for the writer to close the file)
+        "file_index_cache_size": 10000,  # processed-file lookups kept in memory
+        "skip_duplicate_uploads": True,  # skip files with the same content as an earlier upload
+        "fingerprint_full_hash": False,  # also hash whole files to confirm duplicates
+        "max_concurrent_uploads": 2,  # videos uploaded at the same time, across all API projects
+        "max_concurrent_uploads_per_project": None,  # upload workers per API project (None = max_concurrent_uploads)
+        "upload_chunk_min_mb": 1,  # smallest upload chunk (rounded to 256 KB multiples)
+        "upload_chunk_max_mb": 64,  # largest upload chunk
+        "upload_chunk_initial_mb": None,  # first chunk size (None = 4 MB for files over 100 MB, else 1 MB)
+        "upload_chunk_target_seconds": 4,  # chunks grow while they take less than this
+        "upload_mmap_min_mb": 512,  # files at least this large are sent from a memory map (None = never)
+        "bandwidth_limit_mbps": None,  # upload limit shared by all uploads, Mbit/s (None = unlimited)
+        "bandwidth_task_limit_mbps": None,  # upload limit per video, Mbit/s (None = unlimited)
+        "bandwidth_schedule": [],  # time windows with their own limit: {start, end, limit_mbps, days}
+        "queue_flush_interval": 5,  # seconds between saves of upload progress to the queue journal
+        "check_container_integrity": True,  # reject MP4/MKV files that were not written completely
+        "quarantine_folder": "",  # move rejected files here (empty = leave them in place)
         "theme": "light"  # Default theme
     }
     
@@ -0,0 +1,173 @@
+"""
+Deletion of uploaded video files for YouTube Auto Uploader
+
+Right after an upload the recording is often still open in another
+program (the game recorder, a preview, an antivirus scan), so deleting it
+may fail a few times before it works. One background thread does all
+deletions. Files waiting for their next attempt are kept in a heap
+ordered by the time of that attempt, and the thread sleeps until the
+earliest one is due. Then it handles every file that is due in one pass.
+A burst of finished uploads therefore costs one thread and one wake-up,
+not a sleeping thread per file.
+
+The outcome of every attempt is written to the task:
+- delete_attempts
+- delete_success
+- delete_failed
+- delete_next_attempt
+The task is then handed to a callback, so the queue can save and show it.
+"""
+import os
+import time
+import heapq
+import itertools
+import logging
+import threading
+
+import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('file_deleter')
+
+# Metrics
+file_deletions = metrics.counter('file_deletions_total', 'Deletions of uploaded video files, by result', ['result'])
+delete_failures = metrics.counter('file_delete_failed_attempts_total', 'Failed attempts to delete an uploaded video file')
+deletions_waiting = metrics.gauge('file_deletions_waiting', 'Uploaded video files waiting to be deleted',
+                                  function=lambda: len(deleter.scheduled))
+
+class FileDeleter:
+    """
+    Single worker deleting files with delayed retries
+
+    Attributes:
+        on_change (function): Called with the task after every attempt
+        heap (list): (due time, sequence, task ID) entries, earliest first
+        scheduled (dict): task ID -> (task, max_attempts, retry_delay) of
+            the files waiting for an attempt
+    """
+    def __init__(self, on_change=None):
+        """Create a deleter, the worker thread starts with the first file"""
+        self.on_change = on_change
+        self.heap = []
+        self.scheduled = {}
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def schedule(self, task, max_attempts=5, retry_delay=5):
+        """
+        Queue a task's file for deletion, the first attempt is made right away
+
+        Args:
+            task (UploadTask): Task of the uploaded file
+            max_attempts (int): Attempts before giving up
+            retry_delay (float): Seconds between attempts
+        """
+        with self.condition:
+            if task.id in self.scheduled or task.delete_success:
+                return
+            task.delete_failed = False
+            task.delete_next_attempt = time.time()
+            self.scheduled[task.id] = (task, max(1, int(max_attempts)), max(0, float(retry_delay)))
+            heapq.heappush(self.heap, (time.monotonic(), next(self.sequence), task.id))
+            self._ensure_running()
+            self.condition.notify()
+
+    def _ensure_running(self):
+        """Start the worker thread if needed, caller holds the condition"""
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name='file-deleter')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def _take_due(self):
+        """
+        Wait until files are due and take them off the heap
+
+        Returns:
+            list: (task, max_attempts, retry_delay) of the due files
+        """
+        with self.condition:
+            while True:
+                if not self.heap:
+                    self.condition.wait()
+                    continue
+                delay = self.heap[0][0] - time.monotonic()
+                if delay > 0:
+                    self.condition.wait(timeout=delay)
+                    continue
+                break
+
+            now = time.monotonic()
+            due = []
+            while self.heap and self.heap[0][0] <= now:
+                _, _, task_id = heapq.heappop(self.heap)
+                entry = self.scheduled.pop(task_id, None)
+                if entry is not None:
+                    due.append(entry)
+            return due
+
+    def _delete(self, task, max_attempts):
+        """
+        Make one attempt to delete a file
+
+        Returns:
+            bool: True if the file should be tried again
+        """
+        try:
+            os.remove(task.file_path)
+            task.delete_success = True
+            file_deletions.inc(result="deleted")
+            logger.info(f"Deleted uploaded file: {task.file_path}")
+            return False
+        except FileNotFoundError:
+            logger.info(f"File no longer exists, marking as deleted: {task.file_path}")
+            task.delete_success = True
+            file_deletions.inc(result="missing")
+            return False
+        except Exception as e:
+            task.delete_attempts += 1
+            delete_failures.inc()
+            logger.warning(f"Failed to delete file (attempt {task.delete_attempts}/{max_attempts}): {e}")
+
+        if task.delete_attempts < max_attempts:
+            return True
+
+        logger.error(f"Failed to delete file after {max_attempts} attempts: {task.file_path}")
+        file_deletions.inc(result="failed")
+        task.delete_failed = True
+        task.error = f"Failed to delete file after {max_attempts} attempts"
+        return False
+
+    def _run(self):
+        """Delete the files that are due, then sleep until the next one is"""
+        while True:
+            due = self._take_due()
+            if len(due) > 1:
+                logger.info(f"Deleting {len(due)} uploaded files")
+
+            for task, max_attempts, retry_delay in due:
+                retry = False
+                try:
+                    retry = self._delete(task, max_attempts)
+                except Exception as e:
+                    logger.error(f"Error deleting {task.file_path}: {e}")
+
+                with self.condition:
+                    if not retry:
+                        task.delete_next_attempt = None
+                    elif task.id not in self.scheduled:
+                        self.scheduled[task.id] = (task, max_attempts, retry_delay)
+                        heapq.heappush(self.heap, (time.monotonic() + retry_delay, next(self.sequence), task.id))
+                        task.delete_next_attempt = time.time() + retry_delay
+
+                if self.on_change is not None:
+                    try:
+                        self.on_change(task)
+                    except Exception as e:
+                        logger.error(f"Error reporting deletion of {task.file_path}: {e}")
+
+# Shared deleter for all uploads, the uploader sets on_change
+deleter = FileDeleter()
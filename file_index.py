@@ -0,0 +1,405 @@
+"""
+Persistent index of processed video files for YouTube Auto Uploader
+
+Remembers which files have been detected and uploaded across restarts, so the
+monitor does not hand the same recording to the uploader again. Files are
+identified by path, size, modification time and inode, so a new recording
+saved under an old name is treated as a new file.
+"""
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+import config
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('file_index')
+
+# Location of the index database
+DATA_DIR = 'data'
+INDEX_DB_FILE = os.path.join(DATA_DIR, 'file_index.db')
+
+# Statuses that keep a file from being processed again after a restart.
+# Anything else (detected, queued, uploading, error) is retried on the next run.
+FINAL_STATUSES = ('completed', 'cancelled', 'duplicate', 'quarantined')
+
+# Shared index instance, opened on first use
+file_index = None
+file_index_lock = threading.Lock()
+
+class FileIndex:
+    """
+    SQLite-backed record of processed files with a bounded lookup cache
+
+    Attributes:
+        db_path (str): Path to the SQLite database
+        cache_size (int): Maximum number of paths kept in the lookup cache
+        run_id (str): Identifier of the current process run; records from this
+            run always count as processed, older ones only in a final status
+    """
+    def __init__(self, db_path=INDEX_DB_FILE, cache_size=10000):
+        """Open (and create if needed) the index database"""
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self.run_id = f"{int(time.time() * 1000)}_{os.getpid()}"
+
+        # path -> row dict, or None for paths known to have no record
+        self.cache = OrderedDict()
+        self.lock = threading.RLock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime_ns INTEGER,
+                inode INTEGER,
+                status TEXT,
+                video_id TEXT,
+                run_id TEXT,
+                updated_at REAL,
+                fingerprint TEXT,
+                full_hash TEXT
+            )
+        """)
+
+        # Columns added after the first version of the index
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(files)")]
+        for column in ('fingerprint', 'full_hash'):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE files ADD COLUMN {column} TEXT")
+
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_fingerprint ON files (fingerprint)")
+        self.conn.commit()
+        logger.info(f"Opened file index: {db_path}")
+
+    def close(self):
+        """Close the database connection"""
+        with self.lock:
+            self.conn.close()
+            self.cache.clear()
+
+    def _stat(self, file_path, st=None):
+        """Return a stat result for the file, or None if it cannot be read"""
+        if st is not None:
+            return st
+        try:
+            return os.stat(file_path)
+        except OSError:
+            return None
+
+    def _cache_put(self, file_path, row):
+        """Store a lookup result, evicting the least recently used entries"""
+        self.cache[file_path] = row
+        self.cache.move_to_end(file_path)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def _load(self, file_path):
+        """Get the stored row for a path, using the cache when possible"""
+        if file_path in self.cache:
+            self.cache.move_to_end(file_path)
+            return self.cache[file_path]
+
+        cursor = self.conn.execute(
+            "SELECT size, mtime_ns, inode, status, video_id, run_id FROM files WHERE path = ?",
+            (file_path,)
+        )
+        result = cursor.fetchone()
+        row = None
+        if result:
+            row = {
+                'size': result[0],
+                'mtime_ns': result[1],
+                'inode': result[2],
+                'status': result[3],
+                'video_id': result[4],
+                'run_id': result[5]
+            }
+        self._cache_put(file_path, row)
+        return row
+
+    def _matches(self, row, st):
+        """Check whether a stored row describes the file with this stat result"""
+        if st is None:
+            # The file is gone (e.g. deleted after upload), trust the path
+            return True
+        return (row['size'] == st.st_size and
+                row['mtime_ns'] == st.st_mtime_ns and
+                row['inode'] == st.st_ino)
+
+    def _is_live(self, row):
+        """Check whether a stored row still counts as processed"""
+        return row['run_id'] == self.run_id or row['status'] in FINAL_STATUSES
+
+    def get_record(self, file_path, st=None):
+        """
+        Get the record for a file if it still describes the file on disk
+
+        Args:
+            file_path (str): Normalized path to the file
+            st (os.stat_result, optional): Stat result if already available
+
+        Returns:
+            dict: The record (status, video_id, ...), or None if there is none
+        """
+        with self.lock:
+            row = self._load(file_path)
+            if row is None or not self._matches(row, self._stat(file_path, st)):
+                return None
+            return dict(row)
+
+    def get_status(self, file_path, st=None):
+        """
+        Get the processing status of a file
+
+        Args:
+            file_path (str): Normalized path to the file
+            st (os.stat_result, optional): Stat result if already available
+
+        Returns:
+            str: The status, or None if the file has not been processed
+        """
+        record = self.get_record(file_path, st)
+        if record is None or not self._is_live(record):
+            return None
+        return record['status']
+
+    def is_processed(self, file_path, st=None):
+        """
+        Check whether a file has already been processed
+
+        Args:
+            file_path (str): Normalized path to the file
+            st (os.stat_result, optional): Stat result if already available
+
+        Returns:
+            bool: True if the file should not be processed again
+        """
+        return self.get_status(file_path, st) is not None
+
+    def get_statuses(self, candidates):
+        """
+        Get the processing status of many files with as few queries as possible
+
+        Args:
+            candidates (list): (file_path, stat_result) tuples
+
+        Returns:
+            dict: file_path -> status for the files that have been processed
+        """
+        statuses = {}
+        with self.lock:
+            rows = {}
+            missing = []
+            for file_path, _ in candidates:
+                if file_path in self.cache:
+                    rows[file_path] = self.cache[file_path]
+                else:
+                    missing.append(file_path)
+
+            # Stay well below SQLite's host parameter limit
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                cursor = self.conn.execute(
+                    f"SELECT path, size, mtime_ns, inode, status, video_id, run_id FROM files "
+                    f"WHERE path IN ({placeholders})",
+                    chunk
+                )
+                for result in cursor.fetchall():
+                    rows[result[0]] = {
+                        'size': result[1],
+                        'mtime_ns': result[2],
+                        'inode': result[3],
+                        'status': result[4],
+                        'video_id': result[5],
+                        'run_id': result[6]
+                    }
+                for file_path in chunk:
+                    self._cache_put(file_path, rows.get(file_path))
+
+            for file_path, st in candidates:
+                row = rows.get(file_path)
+                if row is not None and self._matches(row, self._stat(file_path, st)) and self._is_live(row):
+                    statuses[file_path] = row['status']
+
+        return statuses
+
+    def record(self, file_path, status, video_id=None, st=None):
+        """
+        Record the status of a file
+
+        If the file no longer exists only the status of an existing record is
+        updated, keeping the identity it had when it was last seen.
+
+        Args:
+            file_path (str): Normalized path to the file
+            status (str): New status (detected, queued, uploading, completed, error, cancelled)
+            video_id (str, optional): YouTube video ID for completed uploads
+            st (os.stat_result, optional): Stat result if already available
+        """
+        self.record_many([(file_path, status, video_id, st)])
+
+    def record_many(self, records):
+        """
+        Record the status of several files in a single transaction
+
+        Args:
+            records (list): (file_path, status, video_id, stat_result) tuples;
+                video_id and stat_result may be None
+        """
+        now = time.time()
+        inserts = []
+        updates = []
+        for file_path, status, video_id, st in records:
+            st = self._stat(file_path, st)
+            if st is not None:
+                inserts.append((file_path, st.st_size, st.st_mtime_ns, st.st_ino,
+                                status, video_id, self.run_id, now))
+            else:
+                updates.append((status, video_id, self.run_id, now, file_path))
+
+        with self.lock:
+            try:
+                if inserts:
+                    self.conn.executemany(
+                        "INSERT INTO files "
+                        "(path, size, mtime_ns, inode, status, video_id, run_id, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT(path) DO UPDATE SET "
+                        # Fingerprints stay valid as long as the file is unchanged
+                        "fingerprint = CASE WHEN size = excluded.size AND mtime_ns = excluded.mtime_ns "
+                        "THEN fingerprint END, "
+                        "full_hash = CASE WHEN size = excluded.size AND mtime_ns = excluded.mtime_ns "
+                        "THEN full_hash END, "
+                        "size = excluded.size, mtime_ns = excluded.mtime_ns, inode = excluded.inode, "
+                        "status = excluded.status, video_id = COALESCE(excluded.video_id, video_id), "
+                        "run_id = excluded.run_id, updated_at = excluded.updated_at",
+                        inserts
+                    )
+                if updates:
+                    self.conn.executemany(
+                        "UPDATE files SET status = ?, video_id = COALESCE(?, video_id), "
+                        "run_id = ?, updated_at = ? WHERE path = ?",
+                        updates
+                    )
+                self.conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error recording status of {len(records)} file(s): {e}")
+            finally:
+                # Reload on next lookup
+                for record in records:
+                    self.cache.pop(record[0], None)
+
+    def set_fingerprint(self, file_path, fingerprint, full_hash=None):
+        """
+        Store the content fingerprint of a recorded file
+
+        Args:
+            file_path (str): Normalized path to the file
+            fingerprint (str): Quick fingerprint of the file
+            full_hash (str, optional): Full content hash of the file
+        """
+        with self.lock:
+            try:
+                self.conn.execute(
+                    "UPDATE files SET fingerprint = ?, full_hash = COALESCE(?, full_hash) WHERE path = ?",
+                    (fingerprint, full_hash, file_path)
+                )
+                self.conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error storing fingerprint for {file_path}: {e}")
+
+    def find_uploaded(self, fingerprint):
+        """
+        Find completed uploads with a given content fingerprint
+
+        Args:
+            fingerprint (str): Quick fingerprint to look for
+
+        Returns:
+            list: Dicts with path, video_id and full_hash of matching uploads
+        """
+        if not fingerprint:
+            return []
+
+        with self.lock:
+            cursor = self.conn.execute(
+                "SELECT path, video_id, full_hash FROM files "
+                "WHERE fingerprint = ? AND status = 'completed'",
+                (fingerprint,)
+            )
+            return [{'path': row[0], 'video_id': row[1], 'full_hash': row[2]}
+                    for row in cursor.fetchall()]
+
+    def claim(self, file_path, status='detected', st=None):
+        """
+        Record a file as processed unless it already is
+
+        Args:
+            file_path (str): Normalized path to the file
+            status (str): Status to record for a newly claimed file
+            st (os.stat_result, optional): Stat result if already available
+
+        Returns:
+            bool: True if the file was claimed, False if it was already processed
+        """
+        return bool(self.claim_many([file_path], status, {file_path: st} if st is not None else None))
+
+    def claim_many(self, file_paths, status='detected', stats=None):
+        """
+        Record several files as processed, skipping those that already are
+
+        Args:
+            file_paths (list): Normalized paths to the files
+            status (str): Status to record for newly claimed files
+            stats (dict, optional): file_path -> stat result if already available
+
+        Returns:
+            list: Paths that were claimed, in their original order
+        """
+        stats = stats or {}
+        candidates = [(file_path, self._stat(file_path, stats.get(file_path))) for file_path in file_paths]
+
+        with self.lock:
+            processed = self.get_statuses(candidates)
+            claimed = []
+            records = []
+            for file_path, st in candidates:
+                if file_path in processed or file_path in claimed:
+                    continue
+                claimed.append(file_path)
+                records.append((file_path, status, None, st))
+            if records:
+                self.record_many(records)
+            return claimed
+
+def get_index():
+    """
+    Get the shared file index, opening it on first use
+
+    Returns:
+        FileIndex: The shared index
+    """
+    global file_index
+
+    with file_index_lock:
+        if file_index is None:
+            app_config = config.load_config()
+            file_index = FileIndex(
+                INDEX_DB_FILE,
+                cache_size=app_config.get('file_index_cache_size', 10000)
+            )
+        return file_index
@@ -1,10 +1,30 @@
 """
-File system monitoring functionality for YouTube Auto Uploader - Single Scan Version
+File system monitoring functionality for YouTube Auto Uploader
+
+Existing files are picked up by an initial scan, new files are detected by a
+watchdog observer (inotify/FSEvents/ReadDirectoryChangesW where available,
+polling otherwise) for as long as monitoring is active.
+
+Besides the main watch folder, extra root folders can be configured in
+"watch_folders". Each root has its own rule: whether to descend into
+subfolders, how deep, and include/exclude glob patterns. Patterns containing
+a "/" are matched against the path relative to the root, others against the
+file or folder name.
 """
 import os
 import time
+import fnmatch
 import logging
 
+from watchdog.observers import Observer
+from watchdog.observers.polling import PollingObserver
+from watchdog.events import FileSystemEventHandler
+
+import config
+import file_index
+import metrics
+from stability_tracker import StabilityTracker
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -14,12 +34,259 @@ logger = logging.getLogger('file_monitor')
 is_monitoring = False
 current_watch_folder = None
 
+# Watch rules (root folder, depth and glob filters) of all monitored folders
+watch_rules = []
+
+# Recognized video file extensions (lowercase, including the dot)
+VIDEO_EXTENSIONS = frozenset([
+    '.mp4', '.avi', '.mov', '.wmv', '.mkv', '.flv',
+    '.webm', '.m4v', '.mpg', '.mpeg', '.3gp', '.3g2',
+    '.ts', '.mts', '.m2ts', '.vob', '.ogv', '.rm',
+    '.rmvb', '.asf', '.divx', '.f4v'
+])
+
+# Number of candidate files looked up in the file index at once during scans
+SCAN_BATCH_SIZE = 500
+
+# Statistics of the most recent folder scan
+last_scan_stats = {}
+
+# Metrics
+scan_duration = metrics.histogram('scan_duration_seconds', 'Duration of folder scans')
+scan_entries = metrics.counter('scan_entries_total', 'Directory entries visited by folder scans')
+scan_videos_found = metrics.counter('scan_new_videos_total', 'New video files found by folder scans')
+scan_errors = metrics.counter('scan_errors_total', 'Folder scans that failed')
+metrics.gauge('monitoring', '1 while the watch folders are monitored', function=lambda: 1 if is_monitoring else 0)
+
 # Function to be called when a video file is found
 # Will be set by the uploader module
 on_new_file_callback = None
 
-# Track files we've already seen to avoid duplicate processing
-processed_files = set()
+# Optional function called with a list of video files found together
+on_new_files_callback = None
+
+# Files we've already seen are tracked in the persistent file index
+# (file_index.get_index()) to avoid duplicate processing across restarts
+
+# Watchdog observer reporting new files
+observer = None
+
+# Tracks candidate files until they stop changing, shared by scans and events
+stability_tracker = None
+
+class VideoFileEventHandler(FileSystemEventHandler):
+    """
+    Forward watchdog events for new or finished files to the stability tracker
+    
+    Runs on the observer thread, so it only filters and queues paths and never
+    blocks on the file itself.
+    
+    Attributes:
+        rule (dict): Watch rule of the root folder this handler is scheduled for
+    """
+    def __init__(self, rule):
+        super().__init__()
+        self.rule = rule
+    
+    def on_created(self, event):
+        if not event.is_directory:
+            queue_event_file(event.src_path, self.rule)
+    
+    def on_moved(self, event):
+        # Recorders often write to a temp name and rename when done
+        if not event.is_directory:
+            queue_event_file(event.dest_path, self.rule)
+    
+    def on_closed(self, event):
+        # Only emitted by the inotify backend (IN_CLOSE_WRITE)
+        if not event.is_directory:
+            queue_event_file(event.src_path, self.rule, closed=True)
+
+def normalize_watch_rule(rule, app_config=None):
+    """
+    Build a complete watch rule from a "watch_folders" entry
+    
+    Args:
+        rule (str or dict): Folder path, or dict with path, recursive,
+            max_depth, include and exclude keys
+        app_config (dict, optional): Configuration providing the defaults
+        
+    Returns:
+        dict: Watch rule with a normalized path and all keys set
+    """
+    if app_config is None:
+        app_config = config.load_config()
+    
+    if isinstance(rule, str):
+        rule = {'path': rule}
+    
+    recursive = rule.get('recursive', app_config.get('watch_recursive', False))
+    max_depth = rule.get('max_depth', app_config.get('watch_max_depth'))
+    
+    return {
+        'path': os.path.abspath(os.path.expanduser(rule.get('path') or '')),
+        'recursive': bool(recursive),
+        # 0 means only the root folder itself, None means no limit
+        'max_depth': max_depth if recursive else 0,
+        'include': list(rule.get('include', app_config.get('watch_include')) or []),
+        'exclude': list(rule.get('exclude', app_config.get('watch_exclude')) or [])
+    }
+
+def get_watch_rules(watch_folder, app_config=None):
+    """
+    Get the watch rules for the main watch folder and all extra folders
+    
+    Args:
+        watch_folder (str): Main folder to monitor
+        app_config (dict, optional): Configuration providing "watch_folders"
+        
+    Returns:
+        list: Watch rules, one per distinct root folder
+    """
+    if app_config is None:
+        app_config = config.load_config()
+    
+    entries = [watch_folder] if watch_folder else []
+    entries.extend(app_config.get('watch_folders') or [])
+    
+    rules = []
+    seen_paths = set()
+    for entry in entries:
+        rule = normalize_watch_rule(entry, app_config)
+        if rule['path'] in seen_paths:
+            continue
+        seen_paths.add(rule['path'])
+        rules.append(rule)
+    
+    return rules
+
+def match_patterns(patterns, rel_path, name):
+    """
+    Check a path against a list of glob patterns
+    
+    Args:
+        patterns (list): Glob patterns
+        rel_path (str): Path relative to the watch root, "/" separated
+        name (str): File or folder name
+        
+    Returns:
+        bool: True if any pattern matches
+    """
+    for pattern in patterns:
+        target = rel_path if '/' in pattern else name
+        if fnmatch.fnmatch(target, pattern):
+            return True
+    return False
+
+def rule_allows_dir(rule, rel_path, name, depth):
+    """
+    Check whether a subfolder should be scanned under a watch rule
+    
+    Args:
+        rule (dict): Watch rule
+        rel_path (str): Folder path relative to the watch root
+        name (str): Folder name
+        depth (int): Depth of the folder below the root (1 for direct children)
+        
+    Returns:
+        bool: True if the folder should be scanned
+    """
+    if not rule['recursive']:
+        return False
+    if rule['max_depth'] is not None and depth > rule['max_depth']:
+        return False
+    return not match_patterns(rule['exclude'], rel_path, name)
+
+def rule_allows_file(rule, rel_path, name):
+    """
+    Check whether a file passes the include/exclude patterns of a watch rule
+    
+    Args:
+        rule (dict): Watch rule
+        rel_path (str): File path relative to the watch root
+        name (str): File name
+        
+    Returns:
+        bool: True if the file should be considered
+    """
+    if match_patterns(rule['exclude'], rel_path, name):
+        return False
+    if rule['include'] and not match_patterns(rule['include'], rel_path, name):
+        return False
+    return True
+
+def rule_matches_path(rule, file_path):
+    """
+    Check whether an absolute file path is covered by a watch rule
+    
+    Used for file system events, which report full paths rather than walking
+    the tree like a scan does.
+    
+    Args:
+        rule (dict): Watch rule
+        file_path (str): Absolute path to the file
+        
+    Returns:
+        bool: True if the file is inside the rule's root and passes its filters
+    """
+    try:
+        rel_path = os.path.relpath(file_path, rule['path'])
+    except ValueError:
+        # Different drive on Windows
+        return False
+    
+    parts = rel_path.split(os.sep)
+    if parts[0] == os.pardir:
+        return False
+    
+    for depth in range(1, len(parts)):
+        if not rule_allows_dir(rule, '/'.join(parts[:depth]), parts[depth - 1], depth):
+            return False
+    
+    return rule_allows_file(rule, '/'.join(parts), parts[-1])
+
+def iter_rule_files(rule, stats=None):
+    """
+    Walk the folders of a watch rule and yield the files it covers
+    
+    Each folder is read once with os.scandir, and the DirEntry objects are
+    yielded so callers can reuse their cached type and stat information.
+    
+    Args:
+        rule (dict): Watch rule
+        stats (dict, optional): Counters updated with "directories" and "entries"
+        
+    Yields:
+        os.DirEntry: Files that pass the rule's filters
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault('directories', 0)
+    stats.setdefault('entries', 0)
+    
+    # (folder path, path relative to the root, depth below the root)
+    pending_dirs = [(rule['path'], '', 0)]
+    
+    while pending_dirs:
+        dir_path, rel_dir, depth = pending_dirs.pop()
+        
+        try:
+            with os.scandir(dir_path) as entries:
+                stats['directories'] += 1
+                for entry in entries:
+                    stats['entries'] += 1
+                    rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if rule_allows_dir(rule, rel_path, entry.name, depth + 1):
+                                pending_dirs.append((entry.path, rel_path, depth + 1))
+                        elif entry.is_file() and rule_allows_file(rule, rel_path, entry.name):
+                            yield entry
+                    except OSError as e:
+                        logger.debug(f"Cannot read entry {entry.path}: {e}")
+        except OSError as e:
+            logger.warning(f"Cannot read directory {dir_path}: {e}")
 
 def wait_for_file_stability(file_path, check_interval=1, max_wait_time=30, size_change_threshold=0):
     """
@@ -126,104 +393,288 @@ def is_video_file(file_path):
     Returns:
         bool: True if the file is a video file, False otherwise
     """
-    # Expanded list of video extensions
-    video_extensions = [
-        '.mp4', '.avi', '.mov', '.wmv', '.mkv', '.flv', 
-        '.webm', '.m4v', '.mpg', '.mpeg', '.3gp', '.3g2',
-        '.ts', '.mts', '.m2ts', '.vob', '.ogv', '.rm',
-        '.rmvb', '.asf', '.divx', '.f4v'
-    ]
-    
     if not file_path:
         logger.warning("Empty file path provided to is_video_file")
         return False
-        
-    try:
-        is_video = any(file_path.lower().endswith(ext) for ext in video_extensions)
-        logger.info(f"File extension check for {file_path}: {'MATCH' if is_video else 'NO MATCH'}")
-        return is_video
-    except Exception as e:
-        logger.error(f"Error checking if file is video: {e}")
-        return False
+    
+    # Called for every directory entry during scans, so keep it to one lookup
+    dot = file_path.rfind('.')
+    return dot != -1 and file_path[dot:].lower() in VIDEO_EXTENSIONS
 
-def register_callback(callback_function):
+def register_callback(callback_function, batch_callback=None):
     """
     Register a callback function to be called when a video file is found
     
     Args:
         callback_function (function): Function to call with the file path
+        batch_callback (function, optional): Function to call with a list of
+            file paths when several files become ready at once
     """
-    global on_new_file_callback
+    global on_new_file_callback, on_new_files_callback
     on_new_file_callback = callback_function
+    on_new_files_callback = batch_callback
     logger.info(f"Callback function registered: {callback_function.__name__ if callback_function else None}")
 
-def scan_folder_for_videos(folder_path):
+def queue_event_file(file_path, rule=None, closed=False):
+    """
+    Queue a file reported by the observer for processing
+    
+    Args:
+        file_path (str): Path reported by the file system event
+        rule (dict, optional): Watch rule of the folder the event came from
+        closed (bool): Whether the event reports that a writer closed the file
+        
+    Returns:
+        bool: True if the file was queued, False if it was ignored
+    """
+    if not is_monitoring or not file_path or not stability_tracker:
+        return False
+    
+    file_path = os.path.abspath(file_path)
+    if not is_video_file(file_path):
+        return False
+    
+    if rule and not rule_matches_path(rule, file_path):
+        return False
+    
+    if file_index.get_index().is_processed(file_path):
+        return False
+    
+    queued = stability_tracker.track(file_path)
+    if closed:
+        # Lets the tracker report the file without waiting for another size check
+        stability_tracker.notify_closed(file_path)
+    return queued
+
+def process_video_file(file_path):
+    """
+    Record a stable video file as processed and hand it to the callback
+    
+    Args:
+        file_path (str): Path to the stable video file
+        
+    Returns:
+        bool: True if the file was handed to the callback, False otherwise
+    """
+    return process_video_files([file_path]) == 1
+
+def process_video_files(file_paths):
+    """
+    Record stable video files as processed and hand them to the callback
+    
+    The files are claimed in the file index in one transaction and delivered
+    with the batch callback if one is registered.
+    
+    Args:
+        file_paths (list): Paths to the stable video files
+        
+    Returns:
+        int: Number of files handed to the callback
+    """
+    # Scans and file system events can both report the same file
+    claimed = file_index.get_index().claim_many(file_paths, 'detected')
+    if not claimed:
+        return 0
+    
+    for file_path in claimed:
+        logger.info(f"Found stable video file: {file_path}")
+    
+    if on_new_files_callback:
+        try:
+            on_new_files_callback(claimed)
+            return len(claimed)
+        except Exception as e:
+            logger.error(f"Error processing {len(claimed)} files: {e}")
+            return 0
+    
+    if not on_new_file_callback:
+        logger.error("No callback function registered for file processing")
+        return 0
+    
+    delivered = 0
+    for file_path in claimed:
+        try:
+            on_new_file_callback(file_path)
+            delivered += 1
+        except Exception as e:
+            logger.error(f"Error processing file {file_path}: {e}")
+    return delivered
+
+def start_observer(rules):
+    """
+    Start a watchdog observer for the root folders of a list of watch rules
+    
+    Uses the platform's native observer unless polling is configured, and falls
+    back to polling if the native observer cannot be started (e.g. the inotify
+    watch limit is exhausted or the folder is on a network share).
+    
+    Args:
+        rules (list): Watch rules of the folders to watch
+        
+    Returns:
+        object: The running observer, or None if no observer could be started
+    """
+    app_config = config.load_config()
+    watcher_mode = app_config.get('watcher_mode', 'auto')
+    polling_interval = app_config.get('polling_interval', 5)
+    
+    if watcher_mode != 'polling':
+        native_observer = Observer()
+        try:
+            for rule in rules:
+                native_observer.schedule(VideoFileEventHandler(rule), rule['path'], recursive=rule['recursive'])
+            native_observer.start()
+            logger.info(f"Started {type(native_observer).__name__} for {len(rules)} folder(s)")
+            return native_observer
+        except Exception as e:
+            logger.warning(f"Native file observer unavailable, falling back to polling: {e}")
+            try:
+                native_observer.stop()
+            except Exception:
+                pass
+    
+    try:
+        polling_observer = PollingObserver(timeout=polling_interval)
+        for rule in rules:
+            polling_observer.schedule(VideoFileEventHandler(rule), rule['path'], recursive=rule['recursive'])
+        polling_observer.start()
+        logger.info(f"Started polling observer for {len(rules)} folder(s) (every {polling_interval}s)")
+        return polling_observer
+    except Exception as e:
+        logger.error(f"Error starting polling observer: {e}")
+        return None
+
+def stop_observer():
+    """Stop the watchdog observer and the stability tracker"""
+    global observer, stability_tracker
+    
+    if observer:
+        try:
+            observer.stop()
+            observer.join(timeout=5)
+        except Exception as e:
+            logger.error(f"Error stopping file observer: {e}")
+        observer = None
+    
+    if stability_tracker:
+        stability_tracker.stop()
+        stability_tracker = None
+
+def scan_folder_for_videos(folder_path, rule=None):
     """
     Scan a folder for video files and process them
     
+    New video files are handed to the stability tracker and processed as soon
+    as each one stops changing. Without a running tracker (e.g. when called
+    outside of monitoring) each file is waited for in turn.
+    
     Args:
         folder_path (str): Path to scan for videos
+        rule (dict, optional): Watch rule for the folder; defaults to the active
+            rule for this folder, or the configured defaults
         
     Returns:
-        int: Number of video files found and processed
+        int: Number of new video files found
     """
-    global processed_files
+    global last_scan_stats
     
     if not folder_path or not os.path.exists(folder_path) or not os.path.isdir(folder_path):
         logger.error(f"Invalid folder path for scanning: {folder_path}")
         return 0
     
-    logger.info(f"Scanning for video files in {folder_path}")
+    if rule is None:
+        folder_path = os.path.abspath(folder_path)
+        rule = next((r for r in watch_rules if r['path'] == folder_path), None) or normalize_watch_rule(folder_path)
+    
+    logger.info(f"Scanning for video files in {rule['path']}")
     
-    file_count = 0
     video_count = 0
+    stats = {'video_files': 0}
+    index = file_index.get_index()
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
+    start_time = time.perf_counter()
+    
+    def handle_candidates(candidates):
+        """Queue the candidates the index has no record of, return the count"""
+        processed = index.get_statuses(candidates)
+        found = 0
+        for file_path, st in candidates:
+            if file_path in processed:
+                continue
+            
+            if stability_tracker:
+                # Processed by the tracker once it stops changing
+                if stability_tracker.track(file_path, st):
+                    found += 1
+            elif wait_for_file_stability(file_path, max_wait_time=60):
+                # Only add to processed files if it's stable
+                if process_video_file(file_path):
+                    found += 1
+            else:
+                logger.warning(f"Skipping unstable video file: {file_path}")
+        return found
     
     try:
-        files = os.listdir(folder_path)
-        file_count = len(files)
-        logger.info(f"Found {file_count} files in directory")
-        
-        for filename in files:
-            file_path = os.path.join(folder_path, filename)
-            logger.info(f"Checking file: {file_path}")
+        candidates = []
+        for entry in iter_rule_files(rule, stats):
+            if not is_video_file(entry.name):
+                continue
+            
+            if debug_enabled:
+                logger.debug(f"Found video file: {entry.path}")
             
-            if os.path.isfile(file_path):
-                if is_video_file(file_path) and file_path not in processed_files:
-                    if wait_for_file_stability(file_path, max_wait_time=60):
-                        # Only add to processed files if it's stable
-                        video_count += 1
-                        logger.info(f"Found stable video file: {file_path}")
-                        processed_files.add(file_path)
-                        
-                        if on_new_file_callback:
-                            try:
-                                on_new_file_callback(file_path)
-                            except Exception as e:
-                                logger.error(f"Error processing file {file_path}: {e}")
-                        else:
-                            logger.error("No callback function registered for file processing")
-                    else:
-                        logger.warning(f"Skipping unstable video file: {file_path}")
+            try:
+                candidates.append((entry.path, entry.stat()))
+            except OSError as e:
+                logger.debug(f"Cannot stat {entry.path}: {e}")
+                continue
+            
+            if len(candidates) >= SCAN_BATCH_SIZE:
+                stats['video_files'] += len(candidates)
+                video_count += handle_candidates(candidates)
+                candidates = []
+        
+        if candidates:
+            stats['video_files'] += len(candidates)
+            video_count += handle_candidates(candidates)
+        
+        elapsed = time.perf_counter() - start_time
+        stats.update(
+            folder=rule['path'],
+            new_videos=video_count,
+            duration=round(elapsed, 4),
+            entries_per_second=round(stats['entries'] / elapsed) if elapsed > 0 else 0,
+            finished_at=time.time()
+        )
+        last_scan_stats = stats
+        scan_duration.observe(elapsed)
+        scan_entries.inc(stats['entries'])
+        scan_videos_found.inc(video_count)
         
-        logger.info(f"Scanned {file_count} files, found {video_count} stable videos")
+        logger.info(f"Scanned {stats['entries']} entries in {stats['directories']} folder(s) "
+                    f"in {elapsed:.2f}s ({stats['entries_per_second']} entries/s), "
+                    f"found {stats['video_files']} videos, {video_count} new")
         return video_count
         
     except Exception as e:
+        scan_errors.inc()
         logger.error(f"Error scanning folder: {e}")
         return 0
 
-def start_monitoring(watch_folder, check_existing=True):
+def start_monitoring(watch_folder, check_existing=True, watch_folders=None):
     """
     Start monitoring a folder for video files
     
     Args:
         watch_folder (str): Path to the folder to monitor
         check_existing (bool): Whether to check for existing files
+        watch_folders (list, optional): Extra folders (paths or rule dicts) to
+            monitor; defaults to "watch_folders" from the configuration
         
     Returns:
         bool: True if monitoring started successfully, False otherwise
     """
-    global is_monitoring, current_watch_folder, processed_files
+    global is_monitoring, current_watch_folder, watch_rules, observer, stability_tracker
     
     if is_monitoring:
         logger.warning(f"Already monitoring a folder: {current_watch_folder}")
@@ -255,19 +706,42 @@ def start_monitoring(watch_folder, check_existing=True):
     
     logger.info(f"Starting monitoring for folder: {watch_folder}")
     
-    # Reset the processed files when starting new monitoring
-    processed_files = set()
+    app_config = config.load_config()
+    if watch_folders is not None:
+        app_config = {**app_config, 'watch_folders': watch_folders}
+    
+    # The main folder was checked above, skip extra folders that can't be read
+    rules = []
+    for rule in get_watch_rules(watch_folder, app_config):
+        if rule['path'] != watch_folder and not (os.path.isdir(rule['path']) and os.access(rule['path'], os.R_OK)):
+            logger.error(f"Skipping inaccessible watch folder: {rule['path']}")
+            continue
+        rules.append(rule)
     
     # Mark as monitoring and set the current watch folder
     is_monitoring = True
     current_watch_folder = watch_folder
+    watch_rules = rules
+    
+    # Start watching before the initial scan so nothing created during it is missed
+    stability_tracker = StabilityTracker(
+        process_video_files,
+        check_interval=app_config.get('stability_check_interval', 1),
+        mode=app_config.get('stability_mode', 'auto')
+    )
+    stability_tracker.start()
+    
+    observer = start_observer(watch_rules)
+    if not observer:
+        logger.warning("No file observer running, new files will only be found by manual scans")
     
     # Scan for existing files if requested
     if check_existing and on_new_file_callback:
-        scan_count = scan_folder_for_videos(watch_folder)
-        logger.info(f"Initial scan complete: {scan_count} videos processed")
+        scan_count = sum(scan_folder_for_videos(rule['path'], rule) for rule in watch_rules)
+        logger.info(f"Initial scan complete: {scan_count} videos found")
     
-    logger.info(f"Successfully started monitoring folder: {watch_folder}")
+    logger.info(f"Successfully started monitoring {len(watch_rules)} folder(s): "
+                f"{', '.join(rule['path'] for rule in watch_rules)}")
     return True
 
 def stop_monitoring():
@@ -277,7 +751,7 @@ def stop_monitoring():
     Returns:
         bool: True if monitoring stopped successfully, False otherwise
     """
-    global is_monitoring, current_watch_folder
+    global is_monitoring, current_watch_folder, watch_rules
     
     if not is_monitoring:
         logger.warning("Not currently monitoring any folder")
@@ -286,6 +760,8 @@ def stop_monitoring():
     # Reset state
     is_monitoring = False
     current_watch_folder = None
+    watch_rules = []
+    stop_observer()
     logger.info("Successfully stopped monitoring")
     return True
 
@@ -307,15 +783,33 @@ def get_current_watch_folder():
     """
     return current_watch_folder
 
+def get_last_scan_stats():
+    """
+    Get statistics of the most recent folder scan
+    
+    Returns:
+        dict: Entry, folder and video counts, duration and entries per second
+    """
+    return dict(last_scan_stats)
+
+def get_watch_folders():
+    """
+    Get all monitored root folders
+    
+    Returns:
+        list: Paths of the monitored folders, empty if not monitoring
+    """
+    return [rule['path'] for rule in watch_rules]
+
 def manual_scan():
     """
-    Manually trigger a scan of the current watch folder
+    Manually trigger a scan of all monitored folders
     
     Returns:
         int: Number of new videos found and processed, or -1 if not monitoring
     """
-    if not is_monitoring or not current_watch_folder:
+    if not is_monitoring or not watch_rules:
         logger.warning("Not currently monitoring any folder")
         return -1
     
-    return scan_folder_for_videos(current_watch_folder)
\ No newline at end of file
+    return sum(scan_folder_for_videos(rule['path'], rule) for rule in watch_rules)
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""
+Content fingerprinting for YouTube Auto Uploader
+
+Identifies recordings by content rather than by path, so copies and
+re-exports of a clip that was already uploaded can be skipped.
+
+The quick fingerprint hashes the file size together with three blocks from
+the start, middle and end of the file, read through mmap. It costs three
+small reads regardless of file size. An optional full SHA-256 of the whole
+file can be computed in a background worker to confirm a match.
+"""
+import os
+import mmap
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('fingerprint')
+
+# Size of each sampled block for the quick fingerprint
+FINGERPRINT_BLOCK_SIZE = 64 * 1024
+
+# Read size for full hashes
+FULL_HASH_CHUNK_SIZE = 1024 * 1024
+
+# Number of files whose fingerprints are kept in memory
+FINGERPRINT_CACHE_SIZE = 1024
+
+# (device, inode, mtime, size) -> {'quick': str, 'full': str}
+fingerprint_cache = OrderedDict()
+fingerprint_cache_lock = threading.Lock()
+
+# Single worker so full hashes never compete with each other for the disk
+hash_executor = None
+hash_executor_lock = threading.Lock()
+
+def get_cache_key(st):
+    """
+    Get the cache key for a file's stat result
+
+    Args:
+        st (os.stat_result): Stat result of the file
+
+    Returns:
+        tuple: (device, inode, mtime_ns, size)
+    """
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+def _cache_get(key, kind):
+    """Get a cached fingerprint of the given kind, or None"""
+    with fingerprint_cache_lock:
+        entry = fingerprint_cache.get(key)
+        if entry is None:
+            return None
+        fingerprint_cache.move_to_end(key)
+        return entry.get(kind)
+
+def _cache_put(key, kind, value):
+    """Cache a fingerprint, evicting the least recently used files"""
+    with fingerprint_cache_lock:
+        entry = fingerprint_cache.setdefault(key, {})
+        entry[kind] = value
+        fingerprint_cache.move_to_end(key)
+        while len(fingerprint_cache) > FINGERPRINT_CACHE_SIZE:
+            fingerprint_cache.popitem(last=False)
+
+def compute_quick_fingerprint(file_path, st=None, block_size=FINGERPRINT_BLOCK_SIZE):
+    """
+    Compute a cheap fingerprint from the size and three sampled blocks
+
+    Args:
+        file_path (str): Path to the file
+        st (os.stat_result, optional): Stat result if already available
+        block_size (int): Size of each sampled block
+
+    Returns:
+        str: Fingerprint in the form "<size>-<hash>"
+    """
+    if st is None:
+        st = os.stat(file_path)
+
+    key = get_cache_key(st)
+    cached = _cache_get(key, 'quick')
+    if cached:
+        return cached
+
+    size = st.st_size
+    digest = hashlib.sha256(str(size).encode())
+
+    with open(file_path, 'rb') as f:
+        if size <= 3 * block_size:
+            # Small files are hashed completely (mmap can't map empty files)
+            digest.update(f.read())
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                middle = size // 2 - block_size // 2
+                for offset in (0, middle, size - block_size):
+                    digest.update(mapped[offset:offset + block_size])
+
+    fingerprint = f"{size}-{digest.hexdigest()[:32]}"
+    _cache_put(key, 'quick', fingerprint)
+    return fingerprint
+
+def compute_full_hash(file_path, st=None, chunk_size=FULL_HASH_CHUNK_SIZE):
+    """
+    Compute the SHA-256 of a whole file by streaming it
+
+    Args:
+        file_path (str): Path to the file
+        st (os.stat_result, optional): Stat result if already available
+        chunk_size (int): Number of bytes read at a time
+
+    Returns:
+        str: Hex digest of the file contents
+    """
+    if st is None:
+        st = os.stat(file_path)
+
+    key = get_cache_key(st)
+    cached = _cache_get(key, 'full')
+    if cached:
+        return cached
+
+    digest = hashlib.sha256()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(file_path, 'rb') as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            digest.update(view[:read])
+
+    full_hash = digest.hexdigest()
+    _cache_put(key, 'full', full_hash)
+    return full_hash
+
+def submit_full_hash(file_path, st=None):
+    """
+    Compute the full hash of a file in the background hashing worker
+
+    Args:
+        file_path (str): Path to the file
+        st (os.stat_result, optional): Stat result if already available
+
+    Returns:
+        concurrent.futures.Future: Resolves to the hex digest
+    """
+    global hash_executor
+
+    with hash_executor_lock:
+        if hash_executor is None:
+            hash_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fingerprint')
+
+    return hash_executor.submit(compute_full_hash, file_path, st)
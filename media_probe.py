@@ -0,0 +1,621 @@
+"""
+Lightweight media probing for YouTube Auto Uploader
+
+Reads duration, resolution and codecs straight from the container headers
+without spawning ffprobe:
+
+- MP4/MOV/M4V: the moov box (mvhd for the duration, tkhd for the frame
+  size, hdlr/stsd for the track type and codec)
+- Matroska/WebM: the EBML Segment (Info for the duration, Tracks for the
+  frame size and codecs)
+
+Files are memory-mapped, so only the header pages are actually read even
+when the moov box sits at the end of a multi-GB file. Results are cached
+per (path, mtime, size) and probes can run in a small thread pool.
+
+check_container() uses the same parsers to tell whether a file was written
+completely (e.g. an MP4 whose recorder crashed before writing the moov box),
+so broken files can be rejected before they are uploaded.
+"""
+import os
+import mmap
+import struct
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('media_probe')
+
+# File extensions handled by each parser
+MP4_EXTENSIONS = frozenset(['.mp4', '.mov', '.m4v', '.3gp', '.3g2', '.f4v'])
+MATROSKA_EXTENSIONS = frozenset(['.mkv', '.webm'])
+
+# Number of probe results kept in memory
+PROBE_CACHE_SIZE = 1024
+
+# (path, mtime_ns, size) -> media info dict (or None if the file could not be parsed)
+probe_cache = OrderedDict()
+probe_cache_lock = threading.Lock()
+
+# Thread pool for background probes
+probe_executor = None
+probe_executor_lock = threading.Lock()
+
+# Matroska element IDs (with their length marker bits)
+EBML_HEADER = 0x1A45DFA3
+MKV_DOCTYPE = 0x4282
+MKV_SEGMENT = 0x18538067
+MKV_INFO = 0x1549A966
+MKV_TIMESTAMP_SCALE = 0x2AD7B1
+MKV_DURATION = 0x4489
+MKV_TRACKS = 0x1654AE6B
+MKV_TRACK_ENTRY = 0xAE
+MKV_TRACK_TYPE = 0x83
+MKV_CODEC_ID = 0x86
+MKV_VIDEO = 0xE0
+MKV_PIXEL_WIDTH = 0xB0
+MKV_PIXEL_HEIGHT = 0xBA
+MKV_CLUSTER = 0x1F43B675
+MKV_SEEK_HEAD = 0x114D9B74
+MKV_SEEK = 0x4DBB
+MKV_SEEK_ID = 0x53AB
+MKV_SEEK_POSITION = 0x53AC
+MKV_CUES = 0x1C53BB6B
+
+# Box types that can start an MP4/MOV file
+MP4_LEADING_BOXES = frozenset(['ftyp', 'styp', 'moov', 'mdat', 'free', 'skip', 'wide', 'pnot', 'uuid'])
+
+class MediaProbeError(Exception):
+    """Raised when a container can't be parsed"""
+
+def empty_media_info(container):
+    """
+    Create a media info dict with all fields unset
+
+    Args:
+        container (str): Container name (mp4, mov, matroska, webm)
+
+    Returns:
+        dict: Media info
+    """
+    return {
+        'container': container,
+        'duration': None,  # seconds
+        'width': None,
+        'height': None,
+        'video_codec': None,
+        'audio_codec': None
+    }
+
+#-------------
+# MP4 parsing
+#-------------
+def iter_mp4_boxes(data, start, end):
+    """
+    Iterate over the ISO BMFF boxes between two offsets
+
+    Args:
+        data (mmap.mmap): Mapped file
+        start (int): Offset of the first box
+        end (int): Offset where the enclosing box ends
+
+    Yields:
+        tuple: (box type, payload start offset, box end offset)
+    """
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, offset)
+        header_size = 8
+        if size == 1:
+            if offset + 16 > end:
+                raise MediaProbeError("Truncated 64-bit box header")
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            # Box extends to the end of its parent
+            size = end - offset
+
+        if size < header_size:
+            raise MediaProbeError(f"Invalid box size {size} at offset {offset}")
+
+        box_end = offset + size
+        yield box_type.decode('latin-1'), offset + header_size, min(box_end, end)
+        offset = box_end
+
+def find_mp4_box(data, start, end, path):
+    """
+    Find a nested box by its path of box types
+
+    Args:
+        data (mmap.mmap): Mapped file
+        start (int): Offset to search from
+        end (int): Offset to search to
+        path (list): Box types, e.g. ['mdia', 'minf', 'stbl', 'stsd']
+
+    Returns:
+        tuple: (payload start, box end) of the box, or None if not found
+    """
+    for box_type, payload, box_end in iter_mp4_boxes(data, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return payload, box_end
+            return find_mp4_box(data, payload, box_end, path[1:])
+    return None
+
+def parse_mp4_track(data, start, end, info):
+    """Fill in frame size and codec from one trak box"""
+    handler = find_mp4_box(data, start, end, ['mdia', 'hdlr'])
+    # hdlr: version/flags (4), pre_defined (4), handler_type (4)
+    handler_type = bytes(data[handler[0] + 8:handler[0] + 12]) if handler else b''
+
+    codec = None
+    stsd = find_mp4_box(data, start, end, ['mdia', 'minf', 'stbl', 'stsd'])
+    # stsd: version/flags (4), entry_count (4), then size (4) + format (4) of the first entry
+    if stsd and stsd[0] + 16 <= stsd[1]:
+        codec = bytes(data[stsd[0] + 12:stsd[0] + 16]).decode('latin-1').strip()
+
+    if handler_type == b'vide':
+        tkhd = find_mp4_box(data, start, end, ['tkhd'])
+        if tkhd:
+            version = data[tkhd[0]]
+            # Width and height (16.16 fixed point) follow the matrix
+            size_offset = tkhd[0] + (88 if version == 1 else 76)
+            if size_offset + 8 <= tkhd[1]:
+                width, height = struct.unpack_from('>II', data, size_offset)
+                info['width'] = width >> 16
+                info['height'] = height >> 16
+        info['video_codec'] = info['video_codec'] or codec
+    elif handler_type == b'soun':
+        info['audio_codec'] = info['audio_codec'] or codec
+
+def parse_mp4(data):
+    """
+    Parse the moov box of an MP4/MOV file
+
+    Args:
+        data (mmap.mmap): Mapped file
+
+    Returns:
+        dict: Media info
+    """
+    moov = find_mp4_box(data, 0, len(data), ['moov'])
+    if not moov:
+        raise MediaProbeError("No moov box found")
+
+    info = empty_media_info('mp4')
+    moov_start, moov_end = moov
+
+    # QuickTime files declare the "qt  " major brand
+    ftyp = find_mp4_box(data, 0, min(len(data), moov_start), ['ftyp'])
+    if ftyp and bytes(data[ftyp[0]:ftyp[0] + 4]) == b'qt  ':
+        info['container'] = 'mov'
+
+    mvhd = find_mp4_box(data, moov_start, moov_end, ['mvhd'])
+    if mvhd:
+        version = data[mvhd[0]]
+        if version == 1:
+            timescale, duration = struct.unpack_from('>IQ', data, mvhd[0] + 20)
+        else:
+            timescale, duration = struct.unpack_from('>II', data, mvhd[0] + 12)
+        if timescale:
+            info['duration'] = round(duration / timescale, 3)
+
+    for box_type, payload, box_end in iter_mp4_boxes(data, moov_start, moov_end):
+        if box_type == 'trak':
+            parse_mp4_track(data, payload, box_end, info)
+
+    return info
+
+#------------------
+# Matroska parsing
+#------------------
+def read_ebml_id(data, offset):
+    """
+    Read an EBML element ID
+
+    Returns:
+        tuple: (element ID including marker bits, offset after the ID)
+    """
+    first = data[offset]
+    length = 1
+    mask = 0x80
+    while length <= 4 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 4:
+        raise MediaProbeError(f"Invalid EBML ID at offset {offset}")
+    return int.from_bytes(data[offset:offset + length], 'big'), offset + length
+
+def read_ebml_size(data, offset):
+    """
+    Read an EBML element data size
+
+    Returns:
+        tuple: (size, or None if unknown, offset after the size)
+    """
+    first = data[offset]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        raise MediaProbeError(f"Invalid EBML size at offset {offset}")
+
+    value = first & (mask - 1)
+    for byte in data[offset + 1:offset + length]:
+        value = (value << 8) | byte
+
+    # All value bits set means the size is unknown (e.g. live recordings)
+    if value == (1 << (7 * length)) - 1:
+        return None, offset + length
+    return value, offset + length
+
+def iter_ebml_elements(data, start, end):
+    """
+    Iterate over the EBML elements between two offsets
+
+    Yields:
+        tuple: (element ID, data start offset, element end offset)
+    """
+    offset = start
+    while offset < end:
+        element_id, offset = read_ebml_id(data, offset)
+        size, offset = read_ebml_size(data, offset)
+        element_end = end if size is None else min(offset + size, end)
+        yield element_id, offset, element_end
+        offset = element_end
+
+def read_ebml_uint(data, start, end):
+    """Read an unsigned integer element value"""
+    return int.from_bytes(data[start:end], 'big')
+
+def read_ebml_float(data, start, end):
+    """Read a float element value (4 or 8 bytes)"""
+    if end - start == 4:
+        return struct.unpack_from('>f', data, start)[0]
+    if end - start == 8:
+        return struct.unpack_from('>d', data, start)[0]
+    return None
+
+def parse_matroska_track(data, start, end, info):
+    """Fill in frame size and codec from one TrackEntry element"""
+    track_type = None
+    codec = None
+    width = height = None
+
+    for element_id, element_start, element_end in iter_ebml_elements(data, start, end):
+        if element_id == MKV_TRACK_TYPE:
+            track_type = read_ebml_uint(data, element_start, element_end)
+        elif element_id == MKV_CODEC_ID:
+            codec = bytes(data[element_start:element_end]).decode('ascii', 'replace').rstrip('\0')
+        elif element_id == MKV_VIDEO:
+            for video_id, video_start, video_end in iter_ebml_elements(data, element_start, element_end):
+                if video_id == MKV_PIXEL_WIDTH:
+                    width = read_ebml_uint(data, video_start, video_end)
+                elif video_id == MKV_PIXEL_HEIGHT:
+                    height = read_ebml_uint(data, video_start, video_end)
+
+    if track_type == 1 and not info['video_codec']:
+        info['video_codec'] = codec
+        info['width'] = width
+        info['height'] = height
+    elif track_type == 2 and not info['audio_codec']:
+        info['audio_codec'] = codec
+
+def parse_matroska(data):
+    """
+    Parse the Segment Info and Tracks of a Matroska/WebM file
+
+    Args:
+        data (mmap.mmap): Mapped file
+
+    Returns:
+        dict: Media info
+    """
+    end = len(data)
+    elements = iter_ebml_elements(data, 0, end)
+
+    header_id, header_start, header_end = next(elements)
+    if header_id != EBML_HEADER:
+        raise MediaProbeError("Missing EBML header")
+
+    info = empty_media_info('matroska')
+    for element_id, element_start, element_end in iter_ebml_elements(data, header_start, header_end):
+        if element_id == MKV_DOCTYPE:
+            info['container'] = bytes(data[element_start:element_end]).decode('ascii', 'replace').rstrip('\0')
+
+    segment = next((e for e in elements if e[0] == MKV_SEGMENT), None)
+    if not segment:
+        raise MediaProbeError("No Segment element found")
+
+    timestamp_scale = 1000000  # nanoseconds per tick, Matroska default
+    duration = None
+
+    for element_id, element_start, element_end in iter_ebml_elements(data, segment[1], segment[2]):
+        if element_id == MKV_INFO:
+            for info_id, info_start, info_end in iter_ebml_elements(data, element_start, element_end):
+                if info_id == MKV_TIMESTAMP_SCALE:
+                    timestamp_scale = read_ebml_uint(data, info_start, info_end)
+                elif info_id == MKV_DURATION:
+                    duration = read_ebml_float(data, info_start, info_end)
+        elif element_id == MKV_TRACKS:
+            for track_id, track_start, track_end in iter_ebml_elements(data, element_start, element_end):
+                if track_id == MKV_TRACK_ENTRY:
+                    parse_matroska_track(data, track_start, track_end, info)
+        elif element_id == MKV_CLUSTER:
+            # Headers come before the media data, no need to walk the clusters
+            break
+
+    if duration is not None:
+        info['duration'] = round(duration * timestamp_scale / 1e9, 3)
+
+    return info
+
+#----------------------
+# Completeness checks
+#----------------------
+def check_mp4_complete(data):
+    """
+    Check that an MP4/MOV file was written completely
+
+    Walks the top-level boxes without clamping them to the file size, so a
+    box that claims more bytes than the file holds is caught, and requires a
+    moov box with a movie header. Only box headers are read.
+
+    Args:
+        data (mmap.mmap): Mapped file
+
+    Raises:
+        MediaProbeError: Describing why the file is incomplete
+    """
+    size = len(data)
+    if size < 8 or bytes(data[4:8]).decode('latin-1') not in MP4_LEADING_BOXES:
+        raise MediaProbeError("Not an MP4/MOV file (unknown leading box)")
+
+    moov = None
+    offset = 0
+    while offset < size:
+        if offset + 8 > size:
+            raise MediaProbeError(f"Truncated box header at offset {offset}")
+        box_size, box_type = struct.unpack_from('>I4s', data, offset)
+        header_size = 8
+        if box_size == 1:
+            if offset + 16 > size:
+                raise MediaProbeError(f"Truncated box header at offset {offset}")
+            box_size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header_size = 16
+        elif box_size == 0:
+            box_size = size - offset
+
+        box_type = box_type.decode('latin-1')
+        if box_size < header_size:
+            raise MediaProbeError(f"Invalid {box_type!r} box size {box_size} at offset {offset}")
+        if offset + box_size > size:
+            raise MediaProbeError(f"Truncated {box_type!r} box: needs {offset + box_size} bytes, "
+                                  f"file has {size}")
+
+        if box_type == 'moov':
+            moov = (offset + header_size, offset + box_size)
+        offset += box_size
+
+    if moov is None:
+        raise MediaProbeError("No moov box found (recording was not finalized)")
+    if find_mp4_box(data, moov[0], moov[1], ['mvhd']) is None:
+        raise MediaProbeError("moov box has no movie header")
+
+def find_matroska_seek_position(data, start, end, wanted_id):
+    """
+    Look up the position of a top-level element in the SeekHead
+
+    Args:
+        data (mmap.mmap): Mapped file
+        start (int): Offset of the SeekHead data
+        end (int): Offset where the SeekHead ends
+        wanted_id (int): Element ID to look for
+
+    Returns:
+        int: Position relative to the Segment data, or None if not listed
+    """
+    for seek_id, seek_start, seek_end in iter_ebml_elements(data, start, end):
+        if seek_id != MKV_SEEK:
+            continue
+        element_id = position = None
+        for entry_id, entry_start, entry_end in iter_ebml_elements(data, seek_start, seek_end):
+            if entry_id == MKV_SEEK_ID:
+                element_id = read_ebml_uint(data, entry_start, entry_end)
+            elif entry_id == MKV_SEEK_POSITION:
+                position = read_ebml_uint(data, entry_start, entry_end)
+        if element_id == wanted_id:
+            return position
+    return None
+
+def check_matroska_complete(data):
+    """
+    Check that a Matroska/WebM file was written completely
+
+    A finalized file has a Segment whose size fits in the file. If the
+    Segment size was never written (live recording), the file is only
+    accepted when the SeekHead points at a Cues element, which muxers write
+    when they finish. Clusters are never walked.
+
+    Args:
+        data (mmap.mmap): Mapped file
+
+    Raises:
+        MediaProbeError: Describing why the file is incomplete
+    """
+    size = len(data)
+    if size < 4 or int.from_bytes(data[0:4], 'big') != EBML_HEADER:
+        raise MediaProbeError("Not a Matroska/WebM file (missing EBML header)")
+
+    _, offset = read_ebml_id(data, 0)
+    header_size, offset = read_ebml_size(data, offset)
+    if header_size is None or offset + header_size > size:
+        raise MediaProbeError("Truncated EBML header")
+    offset += header_size
+
+    # Skip Void elements and the like between the header and the Segment
+    while offset < size:
+        element_id, data_start = read_ebml_id(data, offset)
+        element_size, data_start = read_ebml_size(data, data_start)
+        if element_id == MKV_SEGMENT:
+            break
+        if element_size is None:
+            raise MediaProbeError(f"Element of unknown size before the Segment at offset {offset}")
+        offset = data_start + element_size
+    else:
+        raise MediaProbeError("No Segment element found")
+
+    if element_size is not None and data_start + element_size > size:
+        raise MediaProbeError(f"Truncated Segment: needs {data_start + element_size} bytes, "
+                              f"file has {size}")
+    segment_end = size if element_size is None else data_start + element_size
+
+    # The SeekHead, if any, is the first element of the Segment
+    cues_position = None
+    for element_id, element_start, element_end in iter_ebml_elements(data, data_start, segment_end):
+        if element_id == MKV_SEEK_HEAD:
+            cues_position = find_matroska_seek_position(data, element_start, element_end, MKV_CUES)
+        break
+
+    if cues_position is not None:
+        cues_offset = data_start + cues_position
+        if cues_offset + 4 > segment_end or read_ebml_id(data, cues_offset)[0] != MKV_CUES:
+            raise MediaProbeError("SeekHead points at missing Cues (file was truncated)")
+    elif element_size is None:
+        raise MediaProbeError("Segment has unknown size and no Cues (recording was not finalized)")
+
+#-------------
+# Public API
+#-------------
+def probe_file(file_path, st=None):
+    """
+    Read duration, resolution and codecs from a video file's headers
+
+    Args:
+        file_path (str): Path to the video file
+        st (os.stat_result, optional): Stat result if already available
+
+    Returns:
+        dict: Media info (container, duration, width, height, video_codec,
+            audio_codec), or None if the format is unsupported or unreadable
+    """
+    try:
+        if st is None:
+            st = os.stat(file_path)
+    except OSError as e:
+        logger.warning(f"Cannot probe {file_path}: {e}")
+        return None
+
+    key = (file_path, st.st_mtime_ns, st.st_size)
+    with probe_cache_lock:
+        if key in probe_cache:
+            probe_cache.move_to_end(key)
+            return probe_cache[key]
+
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in MP4_EXTENSIONS:
+        parser = parse_mp4
+    elif extension in MATROSKA_EXTENSIONS:
+        parser = parse_matroska
+    else:
+        return None
+
+    info = None
+    if st.st_size > 0:
+        try:
+            with open(file_path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    info = parser(data)
+            logger.debug(f"Probed {file_path}: {info}")
+        except (MediaProbeError, struct.error, IndexError, StopIteration, ValueError, OSError) as e:
+            logger.warning(f"Cannot read media info from {file_path}: {e}")
+
+    with probe_cache_lock:
+        probe_cache[key] = info
+        probe_cache.move_to_end(key)
+        while len(probe_cache) > PROBE_CACHE_SIZE:
+            probe_cache.popitem(last=False)
+
+    return info
+
+def check_container(file_path, st=None):
+    """
+    Check that a video file's container structure is complete
+
+    Only a few header pages of the memory-mapped file are read, so the
+    check takes milliseconds even for multi-GB recordings. Formats without a
+    structural check are assumed to be complete.
+
+    Args:
+        file_path (str): Path to the video file
+        st (os.stat_result, optional): Stat result if already available
+
+    Returns:
+        tuple: (bool whether the file looks complete, reason if it does not)
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in MP4_EXTENSIONS:
+        checker = check_mp4_complete
+    elif extension in MATROSKA_EXTENSIONS:
+        checker = check_matroska_complete
+    else:
+        return True, None
+
+    try:
+        if st is None:
+            st = os.stat(file_path)
+        if st.st_size == 0:
+            return False, "File is empty"
+        with open(file_path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                checker(data)
+    except (MediaProbeError, struct.error, IndexError, ValueError) as e:
+        return False, str(e) or "Truncated container"
+    except OSError as e:
+        return False, f"Cannot read file: {e}"
+
+    return True, None
+
+def submit_probe(file_path, st=None):
+    """
+    Probe a file in the background thread pool
+
+    Args:
+        file_path (str): Path to the video file
+        st (os.stat_result, optional): Stat result if already available
+
+    Returns:
+        concurrent.futures.Future: Resolves to the media info (or None)
+    """
+    global probe_executor
+
+    with probe_executor_lock:
+        if probe_executor is None:
+            probe_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='media_probe')
+
+    return probe_executor.submit(probe_file, file_path, st)
+
+def format_duration(seconds):
+    """
+    Format a duration for titles and descriptions
+
+    Args:
+        seconds (float): Duration in seconds
+
+    Returns:
+        str: Duration as H:MM:SS or M:SS, empty if unknown
+    """
+    if seconds is None:
+        return ''
+    seconds = int(round(seconds))
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
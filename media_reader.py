@@ -0,0 +1,502 @@
+"""
+Media sources for resumable uploads
+
+MediaFileUpload reads each chunk from disk right before sending it, into a
+fresh bytes object, so the disk latency of every chunk adds to its round
+trip and every chunk costs a new allocation. Two sources avoid this:
+
+- ReadAheadMediaUpload keeps two reusable buffers: while one chunk is on
+  the wire, a background thread reads the next one into the other buffer
+- MmapMediaUpload maps the whole file and hands out views of the mapping,
+  so chunks are never copied into the process at all; the kernel is asked
+  to read the next chunk ahead instead (used for large files)
+
+With both, a retried chunk is sent again from the same memory without
+reading the disk again. The HTTP layer reads the chunk through a stream, in
+small blocks paced by the bandwidth limiter (see bandwidth.py).
+"""
+import os
+import mmap
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from googleapiclient.http import MediaUpload
+
+import bandwidth
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('media_reader')
+
+class ChunkBuffer:
+    """
+    Reusable buffer holding one chunk of the file
+
+    Attributes:
+        begin (int): File offset of the chunk, None if unused
+        length (int): Number of bytes the buffer is meant to hold
+        filled (int): Number of bytes actually read
+        filled_begin (int): File offset the filled bytes were read from
+        future (Future): Pending read into the buffer, if any
+    """
+    def __init__(self):
+        """Create an empty buffer"""
+        self.data = bytearray()
+        self.begin = None
+        self.length = 0
+        self.filled = 0
+        self.filled_begin = None
+        self.future = None
+
+    def covers(self, begin, length):
+        """Check whether the buffer holds (or will hold) a range of the file"""
+        return self.begin == begin and self.length >= length
+
+    def view(self, start, end):
+        """Get a view of part of the buffer without copying"""
+        return memoryview(self.data)[start:end]
+
+class MappedChunk:
+    """
+    One chunk of a memory-mapped file
+
+    Attributes:
+        begin (int): File offset of the chunk
+        length (int): Number of bytes in the chunk
+        filled (int): Same as length, the mapping always holds the whole chunk
+    """
+    def __init__(self, mapping, begin, length):
+        """Describe the chunk of the mapping at begin"""
+        self.mapping = mapping
+        self.begin = begin
+        self.length = length
+        self.filled = length
+
+    def covers(self, begin, length):
+        """Check whether the chunk holds a range of the file"""
+        return self.begin == begin and self.length >= length
+
+    def view(self, start, end):
+        """Get a view of part of the chunk without copying"""
+        return self.mapping[self.begin + start:self.begin + end]
+
+class ChunkedMediaUpload(MediaUpload):
+    """
+    Base for resumable media uploads that serve chunks from memory
+
+    Subclasses implement load_chunk(); the stream returned to the HTTP layer
+    reads from the chunk it returns.
+
+    Attributes:
+        file_path (str): Path to the video file
+        task_bucket (TokenBucket): Per-upload bandwidth bucket, if any
+        meter (TransferMeter): Counts the bytes read by the HTTP layer, if any
+        mode (str): Name of the source, shown in the stats
+    """
+    mode = None
+
+    def __init__(self, file_path, mimetype, chunksize, task_bucket=None, meter=None):
+        """Open the file"""
+        self.file_path = file_path
+        self.task_bucket = task_bucket
+        self.meter = meter
+        self._mimetype = mimetype
+        self._chunksize = chunksize
+        self._fd = open(file_path, 'rb')
+        self._size = os.fstat(self._fd.fileno()).st_size
+        self._stream = ChunkStream(self)
+        self.chunks = 0
+
+    #-----------------------
+    # MediaUpload interface
+    #-----------------------
+    def chunksize(self):
+        return self._chunksize
+
+    def mimetype(self):
+        return self._mimetype
+
+    def size(self):
+        return self._size
+
+    def resumable(self):
+        return True
+
+    def has_stream(self):
+        return True
+
+    def stream(self):
+        return self._stream
+
+    def getbytes(self, begin, length):
+        """Get a range of the file as bytes (used by non-streaming callers)"""
+        buffer = self.load_chunk(begin)
+        return bytes(buffer.view(0, min(length, buffer.filled)))
+
+    def set_chunksize(self, chunksize):
+        """
+        Change the chunk size
+
+        Args:
+            chunksize (int): New chunk size in bytes
+        """
+        self._chunksize = chunksize
+
+    def load_chunk(self, begin):
+        """
+        Get the chunk that starts at begin
+
+        Args:
+            begin (int): File offset of the chunk
+
+        Returns:
+            ChunkBuffer: Object with begin, filled and view() for the chunk
+        """
+        raise NotImplementedError()
+
+    def stats(self):
+        """
+        Get the reader statistics for display
+
+        Returns:
+            dict: Source, chunk count and time spent waiting for bandwidth
+        """
+        return {
+            'mode': self.mode,
+            'chunks': self.chunks,
+            'throttled_seconds': round(self._stream.throttled_seconds, 3)
+        }
+
+    def close(self):
+        """Close the file"""
+        self._fd.close()
+
+class ReadAheadMediaUpload(ChunkedMediaUpload):
+    """
+    Resumable media upload that reads the next chunk while sending one
+    """
+    mode = 'read_ahead'
+
+    def __init__(self, file_path, mimetype, chunksize, task_bucket=None, meter=None):
+        """Open the file and start reading the first chunk"""
+        super().__init__(file_path, mimetype, chunksize, task_bucket, meter)
+
+        # The buffer being sent and the one being filled
+        self.current = ChunkBuffer()
+        self.next = ChunkBuffer()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='media-reader')
+
+        # Statistics
+        self.prefetch_hits = 0
+        self.disk_waits = 0
+        self.disk_wait_seconds = 0.0
+        self.read_seconds = 0.0
+
+        self._prefetch(0)
+
+    #-----------------
+    # Chunk buffering
+    #-----------------
+    def _read_into(self, buffer, begin, length):
+        """
+        Fill a buffer with a range of the file (runs on the reader thread)
+
+        Bytes already read for the same offset are kept, so a chunk that grew
+        only needs its new tail read.
+        """
+        started = time.monotonic()
+        filled = buffer.filled if buffer.filled_begin == begin else 0
+        if len(buffer.data) < length:
+            # Never resize in place, the HTTP layer may still hold views of the old data
+            data = bytearray(length)
+            data[:filled] = memoryview(buffer.data)[:filled]
+            buffer.data = data
+
+        view = memoryview(buffer.data)
+        while filled < length:
+            read = self._pread(view[filled:length], begin + filled)
+            if not read:
+                break
+            filled += read
+
+        buffer.filled = filled
+        buffer.filled_begin = begin
+        self.read_seconds += time.monotonic() - started
+        return buffer
+
+    def _pread(self, view, offset):
+        """Read into a view from a file offset"""
+        if hasattr(os, 'preadv'):
+            return os.preadv(self._fd.fileno(), [view], offset)
+        with self.lock:
+            self._fd.seek(offset)
+            return self._fd.readinto(view)
+
+    def _start_read(self, buffer, begin, length):
+        """Queue a read of a chunk into a buffer on the reader thread"""
+        buffer.begin = begin
+        buffer.length = length
+        # Reads run in order on one thread, so this one starts after any earlier read
+        buffer.future = self.executor.submit(self._read_into, buffer, begin, length)
+
+    def _prefetch(self, begin):
+        """Start reading the chunk at begin into the spare buffer"""
+        length = min(self._chunksize, self._size - begin)
+        if length <= 0 or self.next.covers(begin, length):
+            return
+        self._start_read(self.next, begin, length)
+
+    def set_chunksize(self, chunksize):
+        """
+        Change the chunk size, also for the chunk being read ahead
+
+        Args:
+            chunksize (int): New chunk size in bytes
+        """
+        self._chunksize = chunksize
+        if self.next.begin is not None and self.next.future is not None:
+            self._prefetch(self.next.begin)
+
+    def load_chunk(self, begin):
+        """
+        Get the buffer holding the chunk that starts at begin
+
+        Waits for the read-ahead if it is still running (or reads the chunk
+        now if it wasn't prefetched), then starts reading the chunk after it.
+
+        Args:
+            begin (int): File offset of the chunk
+
+        Returns:
+            ChunkBuffer: Buffer with the chunk
+        """
+        length = min(self._chunksize, self._size - begin)
+
+        # A retry of the chunk that was just sent
+        if self.current.covers(begin, length) and self.current.future is None:
+            return self.current
+
+        started = time.monotonic()
+        if self.next.covers(begin, length):
+            future = self.next.future
+            waited = future is not None and not future.done()
+            if future is not None:
+                future.result()
+            self.prefetch_hits += 1
+        else:
+            # The server asked for a different offset, read the chunk now
+            self._start_read(self.next, begin, length)
+            self.next.future.result()
+            waited = True
+
+        self.next.future = None
+        if waited:
+            self.disk_waits += 1
+            self.disk_wait_seconds += time.monotonic() - started
+
+        self.current, self.next = self.next, self.current
+        self.chunks += 1
+        self._prefetch(begin + min(length, self.current.filled))
+        return self.current
+
+    def stats(self):
+        """
+        Get the read-ahead statistics for display
+
+        Returns:
+            dict: Chunk count, prefetch hits and time spent waiting for the disk
+        """
+        return {
+            **super().stats(),
+            'prefetch_hits': self.prefetch_hits,
+            'disk_waits': self.disk_waits,
+            'disk_wait_seconds': round(self.disk_wait_seconds, 3),
+            'read_seconds': round(self.read_seconds, 3)
+        }
+
+    def close(self):
+        """Stop the reader thread and close the file"""
+        self.executor.shutdown(wait=True)
+        super().close()
+
+class MmapMediaUpload(ChunkedMediaUpload):
+    """
+    Resumable media upload serving chunks straight from a memory map
+
+    Chunks are views of the mapping, so sending one allocates nothing and
+    the file data only lives in the page cache. The file must not be
+    truncated while it is mapped; the uploader only maps files that
+    passed the stability and container checks.
+    """
+    mode = 'mmap'
+
+    def __init__(self, file_path, mimetype, chunksize, task_bucket=None, meter=None):
+        """
+        Map the file
+
+        Raises:
+            ValueError: If the file is empty
+            OSError: If the file can't be mapped
+        """
+        super().__init__(file_path, mimetype, chunksize, task_bucket, meter)
+        try:
+            self.map = mmap.mmap(self._fd.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._fd.close()
+            raise
+        self.mapping = memoryview(self.map)
+        self.current = None
+        self.retries = 0
+
+        self._advise(getattr(mmap, 'MADV_SEQUENTIAL', None), 0, self._size)
+        self._prefetch(0)
+
+    def _advise(self, option, begin, length):
+        """Pass a hint about a range of the mapping to the kernel, if supported"""
+        if option is None or not hasattr(self.map, 'madvise') or length <= 0:
+            return
+        # madvise needs a page aligned start
+        start = begin - begin % mmap.PAGESIZE
+        try:
+            self.map.madvise(option, start, min(length + begin - start, self._size - start))
+        except OSError as e:
+            logger.debug(f"madvise failed for {self.file_path}: {e}")
+
+    def _prefetch(self, begin):
+        """Ask the kernel to start reading the chunk at begin"""
+        self._advise(getattr(mmap, 'MADV_WILLNEED', None), begin,
+                     min(self._chunksize, self._size - begin))
+
+    def load_chunk(self, begin):
+        """
+        Get the chunk that starts at begin and read the next one ahead
+
+        Args:
+            begin (int): File offset of the chunk
+
+        Returns:
+            MappedChunk: The chunk
+        """
+        length = min(self._chunksize, self._size - begin)
+        if self.current is not None and self.current.covers(begin, length):
+            self.retries += 1
+            return self.current
+
+        self.current = MappedChunk(self.mapping, begin, length)
+        self.chunks += 1
+        self._prefetch(begin + length)
+        return self.current
+
+    def stats(self):
+        """
+        Get the reader statistics for display
+
+        Returns:
+            dict: Chunk count, chunks sent again and time spent waiting for bandwidth
+        """
+        return {
+            **super().stats(),
+            'retries': self.retries
+        }
+
+    def close(self):
+        """Unmap and close the file"""
+        self.current = None
+        self.mapping.release()
+        try:
+            self.map.close()
+        except BufferError:
+            # The HTTP layer still holds a view of the last chunk, the mapping
+            # is closed when it is garbage collected
+            logger.debug(f"Mapping of {self.file_path} still in use, leaving it to be collected")
+        super().close()
+
+def create_media_upload(file_path, mimetype, chunksize, task_bucket=None, mmap_min_size=None,
+                        meter=None):
+    """
+    Create the media source for an upload
+
+    Files of at least mmap_min_size bytes are served from a memory map,
+    smaller ones (or files that can't be mapped) by the read-ahead reader.
+
+    Args:
+        file_path (str): Path to the video file
+        mimetype (str): MIME type of the file
+        chunksize (int): First chunk size in bytes
+        task_bucket (TokenBucket, optional): Per-upload bandwidth bucket
+        mmap_min_size (int, optional): Smallest file size to map, None to never map
+        meter (TransferMeter, optional): Meter to feed with the bytes sent
+
+    Returns:
+        ChunkedMediaUpload: The media source
+    """
+    if mmap_min_size is not None and os.path.getsize(file_path) >= mmap_min_size:
+        try:
+            return MmapMediaUpload(file_path, mimetype, chunksize, task_bucket, meter)
+        except (ValueError, OSError, OverflowError) as e:
+            logger.warning(f"Can't map {file_path}, reading it instead: {e}")
+    return ReadAheadMediaUpload(file_path, mimetype, chunksize, task_bucket, meter)
+
+class ChunkStream:
+    """
+    Stream view of a ChunkedMediaUpload for the HTTP layer
+
+    Seeking to the start of a chunk switches to that chunk; reads
+    are served from the buffer, paced by the bandwidth limiter and
+    counted by the media's transfer meter. Bandwidth is taken from the
+    limiter in blocks of THROTTLE_BLOCK_SIZE and used up by the reads.
+
+    Attributes:
+        throttled_seconds (float): Total time spent waiting for bandwidth
+        credit (int): Bytes already paid for and not read yet
+    """
+    def __init__(self, media):
+        """Create a stream over the media's buffers"""
+        self.media = media
+        self.buffer = None
+        self.position = 0
+        self.throttled_seconds = 0.0
+        self.credit = 0
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += self.media.size()
+        self.position = offset
+        if self.media.meter is not None:
+            self.media.meter.seek(offset)
+        if offset < self.media.size():
+            self.buffer = self.media.load_chunk(offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def read(self, size=-1):
+        """Read up to size bytes of the current chunk, waiting for bandwidth first"""
+        buffer = self.buffer
+        if buffer is None:
+            return b''
+        start = self.position - buffer.begin
+        available = buffer.filled - start
+        if available <= 0:
+            return b''
+        if size is None or size < 0:
+            size = available
+        size = min(size, available, bandwidth.THROTTLE_BLOCK_SIZE)
+        if self.credit < size:
+            block = min(bandwidth.THROTTLE_BLOCK_SIZE, available) - self.credit
+            self.throttled_seconds += bandwidth.limiter.throttle(block, self.media.task_bucket)
+            self.credit += block
+        self.credit -= size
+
+        data = buffer.view(start, start + size)
+        self.position += size
+        if self.media.meter is not None:
+            self.media.meter.add(size, self.position)
+        return data
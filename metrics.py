@@ -0,0 +1,282 @@
+"""
+Metrics for YouTube Auto Uploader
+
+A small in-process registry of counters, gauges and histograms, rendered
+in the Prometheus text format by the /metrics route. Modules create their
+metrics once at import time and update them where things happen:
+
+    scan_duration = metrics.histogram('scan_duration_seconds', 'Duration of folder scans')
+    ...
+    scan_duration.observe(elapsed)
+
+Updating a metric takes one short lock and a dict lookup, so it is cheap
+enough for per-chunk and per-request use. Gauges whose value is already
+known elsewhere (e.g. the queue length) are read through a function when
+the metrics are rendered instead of being kept up to date.
+"""
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('metrics')
+
+# Prefix of all metric names
+METRIC_PREFIX = 'youtube_uploader_'
+
+# Default histogram buckets in seconds, from API calls to whole uploads
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+
+def format_value(value):
+    """Format a sample value for the text format"""
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def format_labels(names, values):
+    """Format label names and values as {name="value",...}"""
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+class Metric:
+    """
+    Base of all metric types
+
+    Attributes:
+        name (str): Full metric name
+        help (str): Description shown in the output
+        labelnames (tuple): Names of the labels, values are passed as keyword arguments
+    """
+    type_name = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        """Create a metric without samples"""
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        # label values -> sample
+        self.values = {}
+        if not self.labelnames:
+            # Report unlabelled metrics from the start, not only after the first update
+            self.values[()] = self._new_sample()
+
+    def _new_sample(self):
+        """Get the value of a sample that was never updated"""
+        return 0
+
+    def _key(self, labels):
+        """Get the label values in label name order"""
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """
+        Get the samples to render
+
+        Returns:
+            list: (suffix, label names, label values, value) tuples
+        """
+        with self.lock:
+            return [('', self.labelnames, key, value) for key, value in self.values.items()]
+
+    def render(self):
+        """Render the metric in the text format"""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+        for suffix, names, values, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(names, values)} {format_value(value)}")
+        return '\n'.join(lines)
+
+class Counter(Metric):
+    """Value that only goes up, e.g. uploads finished or bytes sent"""
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """
+        Add to the counter
+
+        Args:
+            amount (float): Amount to add, must not be negative
+            **labels: Label values
+        """
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """Value that goes up and down, set directly or read from a function"""
+    type_name = 'gauge'
+
+    def __init__(self, name, help_text, labelnames=(), function=None):
+        """Create a gauge, optionally read from a function when rendered"""
+        super().__init__(name, help_text, labelnames)
+        self.function = function
+
+    def set(self, value, **labels):
+        """Set the gauge to a value"""
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        """Add to the gauge"""
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        """Subtract from the gauge"""
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """
+        Read the gauge from a function when the metrics are rendered
+
+        Args:
+            function (function): Returns the value, or for labelled gauges
+                a dict of label value tuples to values
+        """
+        self.function = function
+
+    def samples(self):
+        if self.function is None:
+            return super().samples()
+        try:
+            value = self.function()
+        except Exception as e:
+            logger.debug(f"Error reading gauge {self.name}: {e}")
+            return []
+        if value is None:
+            return []
+        if not self.labelnames:
+            return [('', (), (), value)]
+        return [('', self.labelnames, tuple(str(v) for v in key), sample) for key, sample in value.items()]
+
+class Histogram(Metric):
+    """Distribution of observed values, e.g. request durations"""
+    type_name = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Create a histogram with the given upper bucket bounds"""
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames)
+
+    def _new_sample(self):
+        # Counts per bucket (not cumulative), sum, count
+        return [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+    def observe(self, value, **labels):
+        """
+        Record one observation
+
+        Args:
+            value (float): Observed value
+            **labels: Label values
+        """
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            sample = self.values.get(key)
+            if sample is None:
+                sample = self.values[key] = self._new_sample()
+            sample[0][index] += 1
+            sample[1] += value
+            sample[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a with block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self.lock:
+            values = [(key, list(sample[0]), sample[1], sample[2]) for key, sample in self.values.items()]
+
+        samples = []
+        names = self.labelnames + ('le',)
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', names, key + (format_value(float(bound)),), cumulative))
+            samples.append(('_sum', self.labelnames, key, round(total, 6)))
+            samples.append(('_count', self.labelnames, key, count))
+        return samples
+
+class Registry:
+    """
+    Collection of all metrics of the application
+
+    Metrics are created through the registry, asking for an existing name
+    returns the metric created before.
+    """
+    def __init__(self):
+        """Create an empty registry"""
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        """Get the metric with a name, creating it if needed"""
+        name = METRIC_PREFIX + name
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already exists as a {metric.type_name}")
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=(), function=None):
+        return self._get_or_create(Gauge, name, help_text, labelnames, function=function)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def render(self):
+        """
+        Render all metrics in the Prometheus text format
+
+        Returns:
+            str: The metrics, one block per metric
+        """
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+# Shared registry of the application
+registry = Registry()
+
+def counter(name, help_text, labelnames=()):
+    """Get or create a counter in the shared registry"""
+    return registry.counter(name, help_text, labelnames)
+
+def gauge(name, help_text, labelnames=(), function=None):
+    """Get or create a gauge in the shared registry"""
+    return registry.gauge(name, help_text, labelnames, function=function)
+
+def histogram(name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """Get or create a histogram in the shared registry"""
+    return registry.histogram(name, help_text, labelnames, buckets=buckets)
+
+def render():
+    """Render the shared registry in the Prometheus text format"""
+    return registry.render()
@@ -6,6 +6,8 @@ import time
 import logging
 from datetime import datetime
 
+import fingerprint
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -20,7 +22,7 @@ class UploadTask:
         filename (str): Basename of the file
         file_size (int): Size of the file in bytes
         id (str): Unique identifier for the task
-        status (str): Current status (pending, uploading, completed, error, cancelled)
+        status (str): Current status (pending, uploading, completed, error, cancelled, duplicate)
         progress (int): Upload progress percentage (0-100)
         video_id (str): YouTube video ID after successful upload
         video_url (str): YouTube video URL after successful upload
@@ -30,9 +32,30 @@ class UploadTask:
         cancel_requested (bool): Flag to indicate cancellation is requested
         delete_attempts (int): Number of attempts to delete the local file
         delete_success (bool): Whether file deletion was successful
+        delete_failed (bool): Whether file deletion was given up after all attempts
+        delete_next_attempt (float): Timestamp of the next deletion attempt, if one is scheduled
+        fingerprint (str): Quick content fingerprint (size and sampled blocks)
+        full_hash (str): Full content hash, if computed
+        duplicate_of (str): Path of the earlier upload with the same content
+        media_info (dict): Duration, resolution and codecs read from the file
+            headers, None until probed or if the format is unsupported
+        created_at (float): Timestamp when the task was created
+        resumable_uri (str): URI of the resumable upload session, once started
+        upload_project_id (str): API project the upload session was started with
+        uploaded_bytes (int): Bytes the server has confirmed receiving
+        chunk_stats (dict): Chunk size and throughput of the current upload
+        read_stats (dict): Read-ahead and disk wait statistics of the current upload
+        meter (TransferMeter): Byte progress, throughput and ETA while uploading
+        status_listener (function): Called with (task, old status, new status)
+            whenever the status changes, set by the task store
     """
+    # Attributes saved by to_state() in addition to those of to_dict()
+    STATE_ATTRIBUTES = ('full_hash', 'created_at', 'resumable_uri', 'upload_project_id')
+    
     def __init__(self, file_path):
         """Initialize a new upload task"""
+        self.status_listener = None
+        self._status = None
         try:
             # Normalize the file path
             self.file_path = os.path.abspath(os.path.expanduser(file_path))
@@ -51,6 +74,7 @@ class UploadTask:
             timestamp = int(time.time() * 1000)
             unique_suffix = hash(self.filename) % 10000  # Add some uniqueness based on filename
             self.id = f"{timestamp}_{unique_suffix}"
+            self.created_at = time.time()
             
             # Initialize other attributes
             self.status = "pending"
@@ -63,52 +87,158 @@ class UploadTask:
             self.cancel_requested = False
             self.delete_attempts = 0
             self.delete_success = False
+            self.delete_failed = False
+            self.delete_next_attempt = None
+            self.full_hash = None
+            self.duplicate_of = None
+            self.media_info = None
+            self.resumable_uri = None
+            self.upload_project_id = None
+            self.uploaded_bytes = 0
+            self.chunk_stats = None
+            self.read_stats = None
+            self.meter = None
+            
+            # Cheap content fingerprint used to skip re-uploads of the same clip
+            try:
+                self.fingerprint = fingerprint.compute_quick_fingerprint(self.file_path)
+            except Exception as e:
+                logger.warning(f"Error computing fingerprint for {self.file_path}: {e}")
+                self.fingerprint = None
             
             logger.info(f"Created upload task for {self.filename} with ID {self.id}")
         except Exception as e:
             logger.error(f"Error creating upload task: {e}")
             raise
     
+    @property
+    def status(self):
+        """Current status of the task"""
+        return self._status
+    
+    @status.setter
+    def status(self, value):
+        # The listener saves the task, so the mark_* methods set the other
+        # fields before the status
+        old_status = self._status
+        self._status = value
+        if self.status_listener and value != old_status:
+            self.status_listener(self, old_status, value)
+    
     def to_dict(self):
         """Convert the task to a dictionary for API responses"""
+        meter = self.meter
         return {
             'id': self.id,
             'filename': self.filename,
             'file_path': self.file_path,  # Include full path for debugging
             'file_size': self.file_size,
             'status': self.status,
-            'progress': self.progress,
+            'progress': round(meter.percent(), 1) if meter else self.progress,
             'video_id': self.video_id,
             'video_url': self.video_url,
             'error': self.error,
             'start_time': self.start_time,
             'end_time': self.end_time,
             'delete_success': self.delete_success,
-            'delete_attempts': self.delete_attempts
+            'delete_attempts': self.delete_attempts,
+            'delete_failed': self.delete_failed,
+            'delete_next_attempt': self.delete_next_attempt,
+            'fingerprint': self.fingerprint,
+            'duplicate_of': self.duplicate_of,
+            'media_info': self.media_info,
+            'uploaded_bytes': self.uploaded_bytes,
+            'chunk_stats': self.chunk_stats,
+            'read_stats': self.read_stats,
+            'transfer': meter.stats() if meter else None
         }
     
+    def to_state(self):
+        """Convert the task to a dictionary that from_state() can restore"""
+        state = self.to_dict()
+        # Live transfer figures only matter while the upload runs
+        state.pop('transfer', None)
+        state['progress'] = self.progress
+        for name in self.STATE_ATTRIBUTES:
+            state[name] = getattr(self, name)
+        return state
+    
+    @classmethod
+    def from_state(cls, state):
+        """
+        Restore a task saved with to_state() without reading the file again
+        
+        Args:
+            state (dict): Saved task state
+            
+        Returns:
+            UploadTask: The restored task
+        """
+        task = cls.__new__(cls)
+        task.status_listener = None
+        task._status = None
+        
+        # Defaults for attributes that older saved states may not have
+        task.cancel_requested = False
+        task.full_hash = None
+        task.duplicate_of = None
+        task.media_info = None
+        task.fingerprint = None
+        task.created_at = None
+        task.resumable_uri = None
+        task.upload_project_id = None
+        task.uploaded_bytes = 0
+        task.chunk_stats = None
+        task.read_stats = None
+        task.meter = None
+        task.delete_failed = False
+        task.delete_next_attempt = None
+        
+        for name, value in state.items():
+            setattr(task, name, value)
+        task.filename = os.path.basename(task.file_path)
+        return task
+    
     def mark_uploading(self):
-        """Mark task as uploading"""
-        self.status = "uploading"
-        self.progress = 0
+        """Mark task as uploading, keeping the progress of a session being resumed"""
+        if not self.resumable_uri:
+            self.progress = 0
         self.start_time = time.time()
+        self.status = "uploading"
         logger.info(f"Task {self.id} ({self.filename}) marked as uploading")
         
     def mark_completed(self, video_id):
         """Mark task as completed"""
         self.video_id = video_id
         self.video_url = f"https://youtu.be/{video_id}"
-        self.status = "completed"
         self.progress = 100
         self.end_time = time.time()
+        self.status = "completed"
         logger.info(f"Task {self.id} ({self.filename}) marked as completed, video ID: {video_id}")
         
     def mark_error(self, error_message):
         """Mark task as error"""
-        self.status = "error"
         self.error = error_message
+        self.status = "error"
         logger.error(f"Task {self.id} ({self.filename}) marked as error: {error_message}")
         
+    def mark_duplicate(self, video_id, duplicate_of):
+        """Mark task as a duplicate of an earlier upload"""
+        self.video_id = video_id
+        self.video_url = f"https://youtu.be/{video_id}" if video_id else None
+        self.duplicate_of = duplicate_of
+        self.end_time = time.time()
+        self.status = "duplicate"
+        logger.info(f"Task {self.id} ({self.filename}) marked as duplicate of {duplicate_of}, video ID: {video_id}")
+        
+    def mark_pending(self):
+        """Put the task back in the queue, keeping the upload session if one was started"""
+        self.error = None
+        if not self.resumable_uri:
+            self.progress = 0
+        self.status = "pending"
+        logger.info(f"Task {self.id} ({self.filename}) marked as pending")
+        
     def mark_cancelled(self):
         """Mark task as cancelled"""
         self.status = "cancelled"
@@ -0,0 +1,445 @@
+"""
+API quota accounting for YouTube Auto Uploader
+
+Every Google Cloud project gets a daily budget of YouTube API units
+(10,000 unless a higher quota was granted). Each request costs units
+whether it succeeds or not: reads like channels.list cost 1, a
+videos.insert costs 1600. The budget resets at midnight Pacific time.
+
+The ledger counts the units each project has spent in the current quota
+day and keeps the count in SQLite, so it survives restarts. Before an
+upload starts, the uploader asks it for the authenticated project with
+the most quota left. A project without enough units for another insert
+is not used until the next reset, so a large transfer is never started
+on a project that will reject it. The units of an insert are charged when
+the server opens the upload session; until then they are reserved, so
+several uploads starting at once can't spend the same units.
+
+A quotaExceeded or uploadLimitExceeded error marks a project as used up
+for the rest of the quota day. This covers units spent by other
+applications that share the project.
+
+Daily limits are configured in units:
+
+    "quota_daily_limit": 10000,
+    "quota_project_limits": {"my-project": 50000}
+"""
+import os
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+import config
+import metrics
+from file_index import DATA_DIR
+
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TIMEZONE = ZoneInfo('America/Los_Angeles')
+except Exception:
+    # No time zone database (e.g. Windows without the tzdata package):
+    # use Pacific standard time, the reset is an hour late during DST
+    QUOTA_TIMEZONE = timezone(timedelta(hours=-8), 'PST')
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('quota_ledger')
+
+# Location of the ledger database
+QUOTA_DB_FILE = os.path.join(DATA_DIR, 'quota.db')
+
+# Units per API method (method IDs as used by the client library)
+METHOD_COSTS = {
+    'youtube.videos.insert': 1600,
+    'youtube.videos.update': 50,
+    'youtube.videos.delete': 50,
+    'youtube.videos.rate': 50,
+    'youtube.thumbnails.set': 50,
+    'youtube.playlists.insert': 50,
+    'youtube.playlistItems.insert': 50,
+    'youtube.captions.insert': 400,
+    'youtube.search.list': 100
+}
+
+# Units of methods not listed above (list calls and other reads)
+DEFAULT_METHOD_COST = 1
+
+# Units of one video upload
+UPLOAD_COST = METHOD_COSTS['youtube.videos.insert']
+
+# Default daily quota of a project
+DEFAULT_DAILY_LIMIT = 10000
+
+# Quota days kept in the database
+HISTORY_DAYS = 30
+
+# Shared ledger instance, opened on first use
+quota_ledger = None
+quota_ledger_lock = threading.Lock()
+
+def get_method_cost(method):
+    """
+    Get the quota units an API request costs
+
+    Args:
+        method (str): Method ID, e.g. youtube.channels.list
+
+    Returns:
+        int: Units
+    """
+    return METHOD_COSTS.get(method, DEFAULT_METHOD_COST)
+
+def get_quota_day(now=None):
+    """
+    Get the quota day a point in time belongs to
+
+    Args:
+        now (datetime, optional): Point in time (aware), defaults to now
+
+    Returns:
+        str: Date in Pacific time as YYYY-MM-DD
+    """
+    now = now or datetime.now(timezone.utc)
+    return now.astimezone(QUOTA_TIMEZONE).strftime('%Y-%m-%d')
+
+def get_next_reset(now=None):
+    """
+    Get the time the daily quota resets next
+
+    Args:
+        now (datetime, optional): Point in time (aware), defaults to now
+
+    Returns:
+        datetime: Next midnight Pacific time, as a naive local time like the
+            other times shown in the interface
+    """
+    now = now or datetime.now(timezone.utc)
+    pacific = now.astimezone(QUOTA_TIMEZONE)
+    tomorrow = pacific.date() + timedelta(days=1)
+    reset = datetime(tomorrow.year, tomorrow.month, tomorrow.day, tzinfo=QUOTA_TIMEZONE)
+    return reset.astimezone().replace(tzinfo=None)
+
+def get_daily_limit(project_id, app_config=None):
+    """
+    Get the daily quota of a project
+
+    Args:
+        project_id (str): ID of the API project
+        app_config (dict, optional): Application configuration if already loaded
+
+    Returns:
+        int: Units per day
+    """
+    app_config = app_config or config.load_config()
+    limits = app_config.get('quota_project_limits') or {}
+    limit = limits.get(project_id) or app_config.get('quota_daily_limit') or DEFAULT_DAILY_LIMIT
+    try:
+        return max(0, int(limit))
+    except (TypeError, ValueError):
+        return DEFAULT_DAILY_LIMIT
+
+class QuotaLedger:
+    """
+    SQLite-backed count of the API units spent per project and quota day
+
+    The counts of the current quota day are kept in memory, the database
+    is only read when the day changes.
+
+    Attributes:
+        db_path (str): Path to the SQLite database
+        day (str): Quota day of the counts in memory
+        usage (dict): project ID -> units spent today
+        reserved (dict): project ID -> units held for uploads that are
+            starting and not charged yet
+        exhausted (dict): project ID -> reason, for projects the API
+            reported as out of quota today
+    """
+    def __init__(self, db_path=QUOTA_DB_FILE):
+        """Open (and create if needed) the ledger database"""
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.day = None
+        self.usage = {}
+        self.reserved = {}
+        self.exhausted = {}
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS quota_usage (
+                project_id TEXT,
+                day TEXT,
+                method TEXT,
+                units INTEGER,
+                calls INTEGER,
+                PRIMARY KEY (project_id, day, method)
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS quota_exhausted (
+                project_id TEXT,
+                day TEXT,
+                reason TEXT,
+                reported_at REAL,
+                PRIMARY KEY (project_id, day)
+            )
+        """)
+
+        # Forget old quota days
+        oldest = (datetime.now(QUOTA_TIMEZONE) - timedelta(days=HISTORY_DAYS)).strftime('%Y-%m-%d')
+        self.conn.execute("DELETE FROM quota_usage WHERE day < ?", (oldest,))
+        self.conn.execute("DELETE FROM quota_exhausted WHERE day < ?", (oldest,))
+        self.conn.commit()
+        logger.info(f"Opened quota ledger: {db_path}")
+
+    def close(self):
+        """Close the database connection"""
+        with self.lock:
+            self.conn.close()
+
+    def _roll_over(self):
+        """Load the counts of the current quota day if it changed, caller holds the lock"""
+        day = get_quota_day()
+        if day == self.day:
+            return day
+
+        if self.day is not None:
+            logger.info(f"API quota reset for quota day {day}")
+        self.day = day
+        self.usage = {
+            project_id: units for project_id, units in self.conn.execute(
+                "SELECT project_id, SUM(units) FROM quota_usage WHERE day = ? GROUP BY project_id", (day,)
+            )
+        }
+        self.exhausted = {
+            project_id: reason for project_id, reason in self.conn.execute(
+                "SELECT project_id, reason FROM quota_exhausted WHERE day = ?", (day,)
+            )
+        }
+        return day
+
+    def charge(self, project_id, method, units=None):
+        """
+        Record an API request
+
+        Args:
+            project_id (str): ID of the API project that sent it
+            method (str): Method ID, e.g. youtube.videos.insert
+            units (int, optional): Units, defaults to the cost of the method
+        """
+        if project_id is None:
+            return
+        units = get_method_cost(method) if units is None else units
+
+        with self.lock:
+            day = self._roll_over()
+            self.usage[project_id] = self.usage.get(project_id, 0) + units
+            try:
+                self.conn.execute(
+                    "INSERT INTO quota_usage (project_id, day, method, units, calls) VALUES (?, ?, ?, ?, 1) "
+                    "ON CONFLICT(project_id, day, method) DO UPDATE SET "
+                    "units = units + excluded.units, calls = calls + 1",
+                    (project_id, day, method, units)
+                )
+                self.conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error recording {units} quota units for project {project_id}: {e}")
+
+    def mark_exhausted(self, project_id, reason):
+        """
+        Stop using a project until the next quota reset
+
+        Args:
+            project_id (str): ID of the API project
+            reason (str): Error reason reported by the API
+        """
+        if project_id is None:
+            return
+
+        with self.lock:
+            day = self._roll_over()
+            self.exhausted[project_id] = reason
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO quota_exhausted (project_id, day, reason, reported_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (project_id, day, reason, time.time())
+                )
+                self.conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error recording exhausted quota of project {project_id}: {e}")
+        logger.warning(f"API project {project_id} is out of quota ({reason}) until {get_next_reset():%Y-%m-%d %H:%M}")
+
+    def reserve(self, project_id, units=UPLOAD_COST, app_config=None):
+        """
+        Hold units for a request that is about to be sent
+
+        Args:
+            project_id (str): ID of the API project
+            units (int): Units to hold, defaults to the cost of an upload
+            app_config (dict, optional): Application configuration if already loaded
+
+        Returns:
+            bool: True if the units were reserved, False if the project
+                doesn't have them left
+        """
+        limit = get_daily_limit(project_id, app_config)
+        with self.lock:
+            self._roll_over()
+            if project_id in self.exhausted:
+                return False
+            reserved = self.reserved.get(project_id, 0)
+            if limit - self.usage.get(project_id, 0) - reserved < units:
+                return False
+            self.reserved[project_id] = reserved + units
+            return True
+
+    def release(self, project_id, units=UPLOAD_COST):
+        """
+        Give back units held by reserve(), after charging them or if the
+        request was never sent
+
+        Args:
+            project_id (str): ID of the API project
+            units (int): Units to give back
+        """
+        with self.lock:
+            reserved = self.reserved.get(project_id, 0) - units
+            if reserved > 0:
+                self.reserved[project_id] = reserved
+            else:
+                self.reserved.pop(project_id, None)
+
+    def used(self, project_id):
+        """
+        Get the units a project has spent in the current quota day
+
+        Returns:
+            int: Units
+        """
+        with self.lock:
+            self._roll_over()
+            return self.usage.get(project_id, 0)
+
+    def is_exhausted(self, project_id):
+        """Check whether the API reported a project as out of quota today"""
+        with self.lock:
+            self._roll_over()
+            return project_id in self.exhausted
+
+    def remaining(self, project_id, app_config=None):
+        """
+        Get the units a project has left in the current quota day
+
+        Args:
+            project_id (str): ID of the API project
+            app_config (dict, optional): Application configuration if already loaded
+
+        Returns:
+            int: Units not spent or reserved, 0 if the project is out of quota
+        """
+        limit = get_daily_limit(project_id, app_config)
+        with self.lock:
+            self._roll_over()
+            if project_id in self.exhausted:
+                return 0
+            return max(0, limit - self.usage.get(project_id, 0) - self.reserved.get(project_id, 0))
+
+    def uploads_left(self, project_id, app_config=None):
+        """
+        Predict how many more videos a project can upload today
+
+        Returns:
+            int: Number of videos.insert requests the remaining units pay for
+        """
+        return self.remaining(project_id, app_config) // UPLOAD_COST
+
+    def choose_project(self, project_ids, app_config=None):
+        """
+        Pick the project to start the next upload with
+
+        Args:
+            project_ids (list): IDs of the authenticated projects
+            app_config (dict, optional): Application configuration if already loaded
+
+        Returns:
+            str: ID of the project with the most remaining units, or None if
+                none has enough left for an upload
+        """
+        app_config = app_config or config.load_config()
+        best_id, best_remaining = None, UPLOAD_COST - 1
+        for project_id in project_ids:
+            remaining = self.remaining(project_id, app_config)
+            if remaining > best_remaining:
+                best_id, best_remaining = project_id, remaining
+        return best_id
+
+    def stats(self, project_ids, app_config=None):
+        """
+        Get the quota of projects for display
+
+        Args:
+            project_ids (list): IDs of the projects
+            app_config (dict, optional): Application configuration if already loaded
+
+        Returns:
+            dict: project ID -> used, limit, remaining, uploads_left, exhausted
+                and resets_at
+        """
+        app_config = app_config or config.load_config()
+        resets_at = get_next_reset().isoformat()
+        with self.lock:
+            self._roll_over()
+            usage = dict(self.usage)
+            reserved = dict(self.reserved)
+            exhausted = dict(self.exhausted)
+
+        stats = {}
+        for project_id in project_ids:
+            limit = get_daily_limit(project_id, app_config)
+            used = usage.get(project_id, 0)
+            remaining = 0 if project_id in exhausted else max(0, limit - used - reserved.get(project_id, 0))
+            stats[project_id] = {
+                'used': used,
+                'limit': limit,
+                'remaining': remaining,
+                'uploads_left': remaining // UPLOAD_COST,
+                'exhausted': exhausted.get(project_id),
+                'resets_at': resets_at
+            }
+        return stats
+
+def get_ledger():
+    """
+    Get the shared quota ledger, opening it on first use
+
+    Returns:
+        QuotaLedger: The shared ledger
+    """
+    global quota_ledger
+
+    with quota_ledger_lock:
+        if quota_ledger is None:
+            quota_ledger = QuotaLedger(QUOTA_DB_FILE)
+        return quota_ledger
+
+def _remaining_units():
+    """Get the remaining units of the projects used today, for the metrics"""
+    ledger = get_ledger()
+    with ledger.lock:
+        ledger._roll_over()
+        project_ids = set(ledger.usage) | set(ledger.exhausted)
+    app_config = config.load_config()
+    return {(project_id,): ledger.remaining(project_id, app_config) for project_id in project_ids}
+
+# Metrics
+quota_remaining = metrics.gauge('api_quota_remaining_units', 'YouTube API quota units left today, by project',
+                                ['project'], function=_remaining_units)
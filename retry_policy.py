@@ -0,0 +1,417 @@
+"""
+Retry policy for YouTube API requests and upload chunks
+
+One place decides whether a failed request is worth repeating and how long
+to wait first:
+
+- errors are classified by HTTP status and exception type, not by the
+  wording of the message: server errors (5xx), 429 Too Many Requests,
+  connection resets, timeouts and TLS errors are retried; other 4xx
+  responses and programming errors never are
+- the wait grows exponentially up to a cap, with full jitter so workers
+  that failed together don't retry together
+- a Retry-After header from the server wins over the computed wait
+
+Each API project also has a circuit breaker. After several transient
+failures in a row the breaker opens, and requests for that project fail
+right away (and workers leave its uploads queued) until the reset time has
+passed. The next request then probes the endpoint: success closes the
+breaker, another failure opens it again.
+
+The policy settings are read from the configuration once and reloaded by
+reload_policy() when they change, not on every request.
+"""
+import ssl
+import time
+import errno
+import random
+import socket
+import logging
+import threading
+import http.client
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+from googleapiclient.errors import HttpError
+
+import config
+import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('retry_policy')
+
+# HTTP statuses worth retrying besides 5xx
+RETRYABLE_STATUSES = frozenset([429])
+
+# Socket errors that mean the connection, not the request, failed
+RETRYABLE_ERRNOS = frozenset([
+    errno.ECONNRESET, errno.ECONNABORTED, errno.ECONNREFUSED, errno.EPIPE,
+    errno.ETIMEDOUT, errno.ENETDOWN, errno.ENETUNREACH, errno.EHOSTUNREACH
+])
+
+# Longest Retry-After honoured, in seconds
+MAX_RETRY_AFTER = 900
+
+# Circuit breakers by API project ID
+circuit_breakers = {}
+circuit_breakers_lock = threading.Lock()
+
+# Shared policy, loaded on first use
+retry_policy = None
+
+# Metrics
+metrics.gauge(
+    'circuit_breaker_open', '1 while requests to a project are paused by its circuit breaker', ['project'],
+    function=lambda: {(name,): 1 if breaker.is_open() else 0 for name, breaker in list(circuit_breakers.items())}
+)
+
+def _transport_errors():
+    """Get the exception types of failed transports from the optional HTTP libraries"""
+    errors = [ConnectionError, TimeoutError, socket.timeout, ssl.SSLError,
+              http.client.IncompleteRead, http.client.RemoteDisconnected]
+    try:
+        import httplib2
+        errors.append(httplib2.ServerNotFoundError)
+    except ImportError:
+        pass
+    try:
+        from google.auth.exceptions import TransportError
+        errors.append(TransportError)
+    except ImportError:
+        pass
+    return tuple(errors)
+
+TRANSPORT_ERRORS = _transport_errors()
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while the project's circuit breaker is open"""
+
+class RetryDecision:
+    """
+    Result of classifying an error
+
+    Attributes:
+        retryable (bool): Whether repeating the request can succeed
+        reason (str): Short label for logs and metrics, e.g. "http_503" or "connection"
+        status (int): HTTP status, None for transport errors
+        retry_after (float): Seconds the server asked to wait, if any
+    """
+    def __init__(self, retryable, reason, status=None, retry_after=None):
+        """Create a decision"""
+        self.retryable = retryable
+        self.reason = reason
+        self.status = status
+        self.retry_after = retry_after
+
+    def __repr__(self):
+        return f"RetryDecision({self.reason}, retryable={self.retryable})"
+
+def parse_retry_after(value, now=None):
+    """
+    Parse a Retry-After header
+
+    Args:
+        value (str): Seconds or an HTTP date
+        now (datetime, optional): Current time for HTTP dates
+
+    Returns:
+        float: Seconds to wait (capped at MAX_RETRY_AFTER), or None if missing or invalid
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        seconds = (retry_at - (now or datetime.now(timezone.utc))).total_seconds()
+    return min(MAX_RETRY_AFTER, max(0.0, seconds))
+
+def classify_error(error):
+    """
+    Decide whether a failed request should be retried
+
+    Args:
+        error (Exception): The error raised by the request
+
+    Returns:
+        RetryDecision: The classification
+    """
+    if isinstance(error, HttpError):
+        status = error.resp.status if error.resp is not None else None
+        retry_after = None
+        if error.resp is not None:
+            retry_after = parse_retry_after(error.resp.get('retry-after'))
+        if status is not None and (status >= 500 or status in RETRYABLE_STATUSES):
+            return RetryDecision(True, f"http_{status}", status, retry_after)
+        return RetryDecision(False, f"http_{status}", status, retry_after)
+
+    if isinstance(error, CircuitOpenError):
+        return RetryDecision(False, "circuit_open")
+
+    if isinstance(error, TRANSPORT_ERRORS):
+        reason = "timeout" if isinstance(error, (TimeoutError, socket.timeout)) else \
+                 "tls" if isinstance(error, ssl.SSLError) else "connection"
+        return RetryDecision(True, reason)
+
+    if isinstance(error, OSError) and error.errno in RETRYABLE_ERRNOS:
+        return RetryDecision(True, "connection")
+
+    return RetryDecision(False, type(error).__name__)
+
+class RetryPolicy:
+    """
+    Capped exponential backoff with full jitter
+
+    Attributes:
+        max_retries (int): Retries after the first attempt
+        base_delay (float): Upper bound of the first wait in seconds
+        max_delay (float): Largest wait in seconds
+        breaker_threshold (int): Transient failures in a row that open a
+            project's circuit breaker
+        breaker_reset (float): Seconds a breaker stays open
+    """
+    def __init__(self, max_retries=3, base_delay=1.0, max_delay=60.0,
+                 breaker_threshold=5, breaker_reset=120.0):
+        """Create a policy, invalid values are clamped to sensible bounds"""
+        self.max_retries = max(0, int(max_retries))
+        self.base_delay = max(0.0, float(base_delay))
+        self.max_delay = max(self.base_delay, float(max_delay))
+        self.breaker_threshold = max(1, int(breaker_threshold))
+        self.breaker_reset = max(0.0, float(breaker_reset))
+
+    @classmethod
+    def from_config(cls, app_config):
+        """
+        Create a policy with the settings from the application configuration
+
+        Args:
+            app_config (dict): Application configuration
+
+        Returns:
+            RetryPolicy: The new policy
+        """
+        return cls(
+            max_retries=app_config.get('max_retries', 3),
+            base_delay=app_config.get('retry_base_delay', 1),
+            max_delay=app_config.get('retry_max_delay', 60),
+            breaker_threshold=app_config.get('circuit_breaker_threshold', 5),
+            breaker_reset=app_config.get('circuit_breaker_reset', 120)
+        )
+
+    def backoff(self, attempt):
+        """
+        Get a random wait for a retry
+
+        Args:
+            attempt (int): Number of the retry, starting at 0
+
+        Returns:
+            float: Seconds between 0 and min(max_delay, base_delay * 2 ** attempt)
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** min(attempt, 30)))
+
+    def delay(self, attempt, decision=None):
+        """
+        Get the wait before a retry, honouring Retry-After
+
+        Args:
+            attempt (int): Number of the retry, starting at 0
+            decision (RetryDecision, optional): Classification of the error
+
+        Returns:
+            float: Seconds to wait
+        """
+        if decision is not None and decision.retry_after is not None:
+            return decision.retry_after
+        return self.backoff(attempt)
+
+    def call(self, function, breaker=None, on_attempt=None, on_retry=None, sleep=time.sleep):
+        """
+        Call a function, retrying it according to the policy
+
+        Args:
+            function (function): Sends the request, called without arguments
+            breaker (CircuitBreaker, optional): Breaker of the request's project
+            on_attempt (function, optional): Called with (error, decision,
+                seconds) after every attempt; error and decision are None
+                after a success
+            on_retry (function, optional): Called with (error, decision, wait)
+                before waiting for a retry
+            sleep (function): Used to wait between attempts
+
+        Returns:
+            The function's return value
+
+        Raises:
+            CircuitOpenError: If the breaker is open
+            Exception: The last error if it is not retryable or retries ran out
+        """
+        attempt = 0
+        while True:
+            if breaker is not None and breaker.is_open():
+                raise CircuitOpenError(
+                    f"Circuit breaker for project {breaker.name} is open, "
+                    f"retry in {breaker.retry_in():.0f}s"
+                )
+
+            started = time.perf_counter()
+            try:
+                result = function()
+            except Exception as e:
+                decision = classify_error(e)
+                if on_attempt:
+                    on_attempt(e, decision, time.perf_counter() - started)
+                if breaker is not None:
+                    breaker.record(decision)
+                if not decision.retryable or attempt >= self.max_retries:
+                    raise
+                if breaker is not None and breaker.is_open():
+                    raise
+
+                wait = self.delay(attempt, decision)
+                attempt += 1
+                if on_retry:
+                    on_retry(e, decision, wait)
+                logger.warning(f"Request failed ({decision.reason}), retry {attempt}/{self.max_retries} "
+                               f"in {wait:.1f}s: {e}")
+                sleep(wait)
+                continue
+
+            if on_attempt:
+                on_attempt(None, None, time.perf_counter() - started)
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a project after repeated transient failures
+
+    Attributes:
+        name (str): Project the breaker belongs to
+        failures (int): Transient failures in a row
+        opened_at (float): Monotonic time the breaker opened, None while closed
+    """
+    def __init__(self, name):
+        """Create a closed breaker"""
+        self.name = name
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+
+    def _policy(self):
+        """Get the policy with the breaker settings"""
+        return get_policy()
+
+    def is_open(self):
+        """
+        Check whether requests must not be sent right now
+
+        Returns:
+            bool: True until the reset time has passed after opening
+        """
+        with self.lock:
+            return self.opened_at is not None and \
+                time.monotonic() - self.opened_at < self._policy().breaker_reset
+
+    def retry_in(self):
+        """
+        Get the time until requests may be sent again
+
+        Returns:
+            float: Seconds, 0 if the breaker is closed
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self._policy().breaker_reset - (time.monotonic() - self.opened_at))
+
+    def record(self, decision):
+        """
+        Record a failed request
+
+        Only transient failures count; a 4xx response shows the endpoint is
+        working and counts as a success.
+
+        Args:
+            decision (RetryDecision): Classification of the error
+        """
+        if decision.retryable:
+            self.record_failure()
+        elif decision.status is not None:
+            self.record_success()
+
+    def record_success(self):
+        """Close the breaker after a request got an answer"""
+        with self.lock:
+            if self.opened_at is not None:
+                logger.info(f"Circuit breaker for project {self.name} closed")
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        """Count a transient failure, opening the breaker at the threshold"""
+        policy = self._policy()
+        with self.lock:
+            self.failures += 1
+            # A failure while probing after the reset time opens the breaker again
+            if self.opened_at is not None or self.failures >= policy.breaker_threshold:
+                self.opened_at = time.monotonic()
+                logger.warning(f"Circuit breaker for project {self.name} opened after "
+                               f"{self.failures} failures, pausing for {policy.breaker_reset:.0f}s")
+
+    def stats(self):
+        """
+        Get the breaker state for display
+
+        Returns:
+            dict: State, failures in a row and seconds until it closes
+        """
+        is_open = self.is_open()
+        return {
+            'state': 'open' if is_open else 'half_open' if self.opened_at is not None else 'closed',
+            'failures': self.failures,
+            'retry_in': round(self.retry_in()) if is_open else 0
+        }
+
+def get_policy():
+    """
+    Get the shared retry policy, loading it from the configuration on first use
+
+    Returns:
+        RetryPolicy: The policy
+    """
+    global retry_policy
+    if retry_policy is None:
+        retry_policy = RetryPolicy.from_config(config.load_config())
+    return retry_policy
+
+def reload_policy():
+    """Load the retry settings again after they changed"""
+    global retry_policy
+    retry_policy = RetryPolicy.from_config(config.load_config())
+
+def get_breaker(project_id):
+    """
+    Get the circuit breaker of an API project
+
+    Args:
+        project_id (str): ID of the project, None for the default client
+
+    Returns:
+        CircuitBreaker: The project's breaker
+    """
+    name = project_id or 'default'
+    with circuit_breakers_lock:
+        breaker = circuit_breakers.get(name)
+        if breaker is None:
+            breaker = circuit_breakers[name] = CircuitBreaker(name)
+        return breaker
@@ -12,6 +12,9 @@ import config
 import youtube_api
 import uploader
 import file_monitor
+import bandwidth
+import retry_policy
+import quota_ledger
 
 #----------------
 # Settings routes
@@ -71,9 +74,48 @@ def settings():
                     'error': f"Failed to create or access folder: {str(e)}"
                 })
         
+        # Normalize the paths of extra watch folders (plain paths or rule dicts)
+        if isinstance(data.get('watch_folders'), list):
+            watch_folders = []
+            for entry in data['watch_folders']:
+                rule = dict(entry) if isinstance(entry, dict) else {'path': entry}
+                if not rule.get('path'):
+                    continue
+                rule['path'] = os.path.abspath(os.path.expanduser(rule['path']))
+                watch_folders.append(rule)
+            data['watch_folders'] = watch_folders
+        
+        # Check the bandwidth schedule before saving it
+        if 'bandwidth_schedule' in data:
+            try:
+                data['bandwidth_schedule'] = bandwidth.validate_schedule(data['bandwidth_schedule'])
+            except (ValueError, TypeError, AttributeError) as e:
+                return jsonify({
+                    'success': False,
+                    'error': f"Invalid bandwidth schedule: {str(e)}"
+                })
+        
         # Update config
         updated_config = config.update_config(data)
         
+        # Apply new bandwidth limits to running uploads right away
+        if any(key.startswith('bandwidth_') for key in data):
+            bandwidth.limiter.refresh(force=True)
+        
+        # Retry settings are cached by the retry policy
+        if any(key in data for key in ('max_retries', 'retry_base_delay', 'retry_max_delay',
+                                       'circuit_breaker_threshold', 'circuit_breaker_reset')):
+            retry_policy.reload_policy()
+        
+        # Workers waiting for quota may be able to upload with the new limits
+        if any(key.startswith('quota_') for key in data):
+            uploader.upload_queue.notify()
+        
+        # Start or stop upload workers if the concurrency changed
+        if 'max_concurrent_uploads' in data or 'max_concurrent_uploads_per_project' in data:
+            uploader.ensure_upload_workers_running()
+            uploader.upload_queue.notify()
+        
         return jsonify({
             'success': True,
             'config': updated_config
@@ -232,7 +274,8 @@ def api_get_queue():
         'queue': queue_data,
         'is_monitoring': file_monitor.get_monitoring_status(),
         'upload_limit_reached': limit_reached,
-        'upload_limit_reset_time': limit_reset_time.isoformat() if limit_reset_time else None
+        'upload_limit_reset_time': limit_reset_time.isoformat() if limit_reset_time else None,
+        'bandwidth_limit_mbps': bandwidth.get_current_limit()
     })
 
 @api_bp.route('/queue/clear-completed', methods=['POST'])
@@ -536,6 +579,7 @@ def api_select_channel():
 def api_get_projects():
     """Get all available API projects"""
     projects = youtube_api.get_available_api_projects()
+    quota = quota_ledger.get_ledger().stats([project['id'] for project in projects])
     
     # Check which ones are authenticated
     authenticated_projects = []
@@ -558,7 +602,9 @@ def api_get_projects():
             'id': project['id'],
             'name': project_name,
             'is_authenticated': is_authenticated,
-            'is_active': project['id'] == youtube_api.active_client_id
+            'is_active': project['id'] == youtube_api.active_client_id,
+            'quota': quota.get(project['id']),
+            'uploading': uploader.project_upload_counts.get(project['id'], 0)
         })
     
     return jsonify({
@@ -714,7 +760,9 @@ def api_manual_scan():
             return jsonify({
                 'success': True,
                 'videos_found': scan_count,
-                'folder': file_monitor.get_current_watch_folder()
+                'folder': file_monitor.get_current_watch_folder(),
+                'folders': file_monitor.get_watch_folders(),
+                'scan_stats': file_monitor.get_last_scan_stats()
             })
         else:
             return jsonify({
@@ -75,9 +75,7 @@ def oauth2callback():
     # Build the service
     client_builder = youtube_api.get_youtube_api_with_retry()
     youtube = client_builder(youtube_api.API_SERVICE_NAME, youtube_api.API_VERSION, credentials=credentials)
-    youtube_api.youtube_clients[project['id']] = youtube
-    youtube_api.active_client_id = project['id']
-    youtube_api.youtube = youtube
+    youtube_api.activate_client(project['id'], youtube, credentials)
     
     return redirect('/')
 
@@ -139,10 +137,8 @@ def oauth2callback_project(project_id):
     # Build and store the service
     client_builder = youtube_api.get_youtube_api_with_retry()
     client = client_builder(youtube_api.API_SERVICE_NAME, youtube_api.API_VERSION, credentials=credentials)
-    youtube_api.youtube_clients[project_id] = client
     
-    # Set as active client
-    youtube_api.youtube = client
-    youtube_api.active_client_id = project_id
+    # Store and set as active client
+    youtube_api.activate_client(project_id, client, credentials)
     
     return redirect('/')
@@ -1,11 +1,12 @@
 """
 Main routes for the YouTube Auto Uploader web interface
 """
-from flask import render_template
+from flask import render_template, Response
 from . import main_bp
 import youtube_api
 import file_monitor
 import config
+import metrics
 
 @main_bp.route('/')
 def index():
@@ -22,3 +23,8 @@ def index():
                           config=app_config,
                           upload_limit_reached=upload_limit_reached,
                           upload_limit_reset_time=upload_limit_reset_time)
+
+@main_bp.route('/metrics')
+def metrics_page():
+    """Metrics of the monitor, uploader and API client in the Prometheus text format"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
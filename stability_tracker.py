@@ -0,0 +1,369 @@
+"""
+File stability tracking for YouTube Auto Uploader
+
+Tracks every candidate video file in a single background thread and reports
+each one as soon as it has stopped changing, so a file that is still being
+recorded never delays the detection of other files. Files that become stable
+in the same check are reported together.
+
+On Linux the tracker can also use close-write information: a file that some
+process still has open for writing (seen in /proc/*/fd) is never considered
+stable, and a file is reported right away once an IN_CLOSE_WRITE event
+arrives for it. Without such an event the size and modification time must
+also have stopped changing, because writers in another PID namespace (a
+container or its host), on a network share, or on another machine never
+show up in /proc. Elsewhere only the size and modification time are
+compared.
+"""
+import os
+import sys
+import time
+import logging
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('stability_tracker')
+
+# Stability detection modes
+MODE_SIZE = 'size'
+MODE_CLOSE_WRITE = 'close_write'
+
+def close_write_supported():
+    """
+    Check whether close-write based detection can be used on this system
+    
+    Returns:
+        bool: True on Linux with a readable /proc
+    """
+    return sys.platform.startswith('linux') and os.path.isdir('/proc/self/fd')
+
+def resolve_mode(mode):
+    """
+    Resolve a configured stability mode to the mode that will be used
+    
+    Args:
+        mode (str): "auto", "size" or "close_write"
+        
+    Returns:
+        str: MODE_CLOSE_WRITE if requested (or auto) and supported, otherwise MODE_SIZE
+    """
+    if mode in ('auto', MODE_CLOSE_WRITE) and close_write_supported():
+        return MODE_CLOSE_WRITE
+    if mode == MODE_CLOSE_WRITE:
+        logger.warning("Close-write detection is not supported here, using file size checks")
+    return MODE_SIZE
+
+def find_open_for_writing(file_paths):
+    """
+    Find which files are currently open for writing by any process
+    
+    Scans /proc/<pid>/fd of every process. Processes whose file descriptors
+    can't be read (e.g. owned by another user) are skipped, in which case the
+    result is incomplete: a file that is not reported may still be written.
+    
+    Args:
+        file_paths (iterable): Paths to look for
+        
+    Returns:
+        tuple: (set of paths open for writing, bool whether every process could be checked)
+    """
+    # Compare resolved paths, /proc reports the real location of the file
+    wanted = {os.path.realpath(path): path for path in file_paths}
+    open_for_writing = set()
+    complete = True
+    
+    try:
+        pids = [name for name in os.listdir('/proc') if name.isdigit()]
+    except OSError:
+        return open_for_writing, False
+    
+    for pid in pids:
+        fd_dir = f"/proc/{pid}/fd"
+        try:
+            fds = os.listdir(fd_dir)
+        except FileNotFoundError:
+            # Process exited while scanning
+            continue
+        except OSError:
+            complete = False
+            continue
+        
+        for fd in fds:
+            try:
+                target = os.readlink(f"{fd_dir}/{fd}")
+            except OSError:
+                continue
+            
+            path = wanted.get(target)
+            if path is None or path in open_for_writing:
+                continue
+            
+            try:
+                with open(f"/proc/{pid}/fdinfo/{fd}") as fdinfo:
+                    for line in fdinfo:
+                        if line.startswith('flags:'):
+                            # Access mode is in the lowest two bits: 1 = O_WRONLY, 2 = O_RDWR
+                            if int(line.split()[1], 8) & 3:
+                                open_for_writing.add(path)
+                            break
+            except (OSError, ValueError):
+                # Can't tell how it was opened, assume it may be written
+                open_for_writing.add(path)
+    
+    return open_for_writing, complete
+
+class StabilityTracker:
+    """
+    Watches a set of files and calls a function for each file that stabilizes
+
+    A file is stable once its size and modification time have not changed
+    between two samples taken check_interval seconds apart. A file that keeps
+    changing is tracked for as long as it changes, however long the recording
+    takes. Files that disappear, stay empty, or can no longer be read are
+    dropped.
+    
+    In close-write mode a file that is open for writing is never stable, and a
+    file is stable as soon as a close event for it arrives. A file with no
+    writer in /proc still needs one unchanged interval, since its writer may
+    not be visible from here.
+
+    Attributes:
+        on_stable (function): Called with a list of file paths that became stable
+        check_interval (float): Seconds between samples of the same file
+        empty_wait_time (float): Seconds to give an empty file to get content
+        mode (str): MODE_SIZE or MODE_CLOSE_WRITE
+    """
+    def __init__(self, on_stable, check_interval=1, empty_wait_time=3, mode='auto'):
+        """Initialize the tracker, call start() to begin checking files"""
+        self.on_stable = on_stable
+        self.check_interval = check_interval
+        self.empty_wait_time = empty_wait_time
+        self.mode = resolve_mode(mode)
+
+        # path -> sample dict (first_seen, size, mtime, sampled_at, next_check, closed)
+        self.files = {}
+        self.condition = threading.Condition()
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        """Start the background thread that samples tracked files"""
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        logger.info(f"Stability tracker started ({self.mode} mode)")
+
+    def stop(self):
+        """Stop the background thread and forget all tracked files"""
+        with self.condition:
+            self.running = False
+            self.files.clear()
+            self.condition.notify_all()
+
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+        self.thread = None
+        logger.info("Stability tracker stopped")
+
+    def track(self, file_path, st=None):
+        """
+        Start tracking a file until it becomes stable
+
+        Args:
+            file_path (str): Path to the file
+            st (os.stat_result, optional): Current stat result if already available
+
+        Returns:
+            bool: True if the file is now tracked, False if it already was or
+                could not be read
+        """
+        sample = (st.st_size, st.st_mtime_ns) if st is not None else self._sample(file_path)
+        if sample is None:
+            logger.debug(f"Cannot track missing file: {file_path}")
+            return False
+
+        size, mtime = sample
+        now = time.monotonic()
+        wait = self.empty_wait_time if size == 0 else self.check_interval
+
+        with self.condition:
+            if file_path in self.files:
+                return False
+
+            self.files[file_path] = {
+                'first_seen': now,
+                'size': size,
+                'mtime': mtime,
+                'sampled_at': now,
+                'next_check': now + wait,
+                'closed': False
+            }
+            self.condition.notify_all()
+
+        logger.debug(f"Tracking file for stability: {file_path} ({size} bytes)")
+        return True
+
+    def notify_closed(self, file_path):
+        """
+        Report that a writer closed a tracked file (e.g. from IN_CLOSE_WRITE)
+        
+        Args:
+            file_path (str): Path to the file
+            
+        Returns:
+            bool: True if the file is tracked and will be checked right away
+        """
+        if self.mode != MODE_CLOSE_WRITE:
+            return False
+        
+        with self.condition:
+            entry = self.files.get(file_path)
+            if entry is None:
+                return False
+            entry['closed'] = True
+            entry['next_check'] = time.monotonic()
+            self.condition.notify_all()
+        
+        logger.debug(f"Writer closed file: {file_path}")
+        return True
+
+    def untrack(self, file_path):
+        """
+        Stop tracking a file
+
+        Args:
+            file_path (str): Path to the file
+        """
+        with self.condition:
+            self.files.pop(file_path, None)
+
+    def is_tracked(self, file_path):
+        """
+        Check whether a file is currently being tracked
+
+        Args:
+            file_path (str): Path to the file
+
+        Returns:
+            bool: True if the file is waiting to become stable
+        """
+        with self.condition:
+            return file_path in self.files
+
+    def pending_count(self):
+        """
+        Get the number of files waiting to become stable
+
+        Returns:
+            int: Number of tracked files
+        """
+        with self.condition:
+            return len(self.files)
+
+    def _sample(self, file_path):
+        """Return (size, mtime_ns) for a file, or None if it cannot be read"""
+        try:
+            st = os.stat(file_path)
+            return st.st_size, st.st_mtime_ns
+        except OSError:
+            return None
+
+    def _check_due_files(self, now):
+        """
+        Sample all files whose check time has come
+
+        Returns:
+            list: Paths of files that became stable
+        """
+        with self.condition:
+            due = [(path, dict(entry)) for path, entry in self.files.items() if entry['next_check'] <= now]
+
+        writers = set()
+        if due and self.mode == MODE_CLOSE_WRITE:
+            writers, _ = find_open_for_writing(path for path, _ in due)
+
+        stable = []
+        for file_path, entry in due:
+            sample = self._sample(file_path)
+
+            with self.condition:
+                # The file may have been untracked while we were sampling
+                current = self.files.get(file_path)
+                if current is None:
+                    continue
+
+                if sample is None:
+                    logger.warning(f"File no longer exists: {file_path}")
+                    del self.files[file_path]
+                    continue
+
+                size, mtime = sample
+                if size == 0:
+                    if entry['size'] == 0 and now - entry['first_seen'] >= self.empty_wait_time:
+                        logger.warning(f"File is still empty after waiting: {file_path}")
+                        del self.files[file_path]
+                    else:
+                        current.update(size=0, mtime=mtime, sampled_at=now,
+                                       next_check=now + self.empty_wait_time)
+                    continue
+
+                if self.mode == MODE_CLOSE_WRITE:
+                    if file_path in writers:
+                        # Still being written, however long the recording takes
+                        logger.debug(f"File still open for writing: {file_path}")
+                        current.update(size=size, mtime=mtime, sampled_at=now, closed=False,
+                                       next_check=now + self.check_interval)
+                        continue
+
+                    if current['closed']:
+                        logger.info(f"File closed by its writer at {size} bytes: {file_path}")
+                        del self.files[file_path]
+                        stable.append(file_path)
+                        continue
+
+                if now - entry['sampled_at'] < self.check_interval:
+                    # Checked early after a close event, compare sizes after a full interval
+                    current['next_check'] = entry['sampled_at'] + self.check_interval
+                    continue
+
+                if size == entry['size'] and mtime == entry['mtime']:
+                    logger.info(f"File size has stabilized at {size} bytes: {file_path}")
+                    del self.files[file_path]
+                    stable.append(file_path)
+                else:
+                    logger.debug(f"File still changing: {file_path} ({size - entry['size']} bytes)")
+                    current.update(size=size, mtime=mtime, sampled_at=now,
+                                   next_check=now + self.check_interval)
+
+        return stable
+
+    def _run(self):
+        """Sample tracked files on one timer and report the stable ones"""
+        while True:
+            with self.condition:
+                if not self.running:
+                    break
+
+                if not self.files:
+                    self.condition.wait()
+                    continue
+
+                next_check = min(entry['next_check'] for entry in self.files.values())
+                delay = next_check - time.monotonic()
+                if delay > 0:
+                    self.condition.wait(timeout=delay)
+                    continue
+
+            stable_files = self._check_due_files(time.monotonic())
+            if stable_files:
+                try:
+                    self.on_stable(stable_files)
+                except Exception as e:
+                    logger.error(f"Error handling {len(stable_files)} stable files: {e}")
@@ -8,6 +8,7 @@ let uploadLimitResetTime = null;
 let currentTheme = "light";
 let refreshInterval;
 let processedTaskIds = new Set(); // Track which tasks we've already displayed
+const STALLED_SECONDS = 30; // Uploads with no data sent for this long are shown as stalled
 
 // DOM Ready
 document.addEventListener('DOMContentLoaded', function() {
@@ -253,6 +254,12 @@ function updateQueueUI() {
                 statusIcon = '<i class="bi bi-x-circle-fill"></i>';
                 actionButton = '';
                 break;
+            case 'duplicate':
+                statusClass = 'text-muted';
+                statusIcon = '<i class="bi bi-files"></i>';
+                actionButton = task.video_url ?
+                    `<a href="${task.video_url}" target="_blank" class="btn btn-sm btn-outline-primary" title="Already uploaded from ${task.duplicate_of}"><i class="bi bi-youtube"></i> View</a>` : '';
+                break;
         }
         
         const progressBar = task.status === 'uploading' ? 
@@ -267,10 +274,30 @@ function updateQueueUI() {
         
         const fileSize = formatFileSize(task.file_size);
         
-        const deleteStatus = task.status === 'completed' ? 
-            `<div class="small ${task.delete_success ? 'text-success' : 'text-warning'}">
-                ${task.delete_success ? '<i class="bi bi-trash-fill me-1"></i> File deleted' : '<i class="bi bi-arrow-repeat me-1"></i> Attempting to delete file...'}
-            </div>` : '';
+        let transferInfo = '';
+        if (task.status === 'uploading' && task.transfer) {
+            const transfer = task.transfer;
+            if (transfer.idle_seconds >= STALLED_SECONDS) {
+                transferInfo = ` · <span class="text-warning">stalled for ${formatDuration(transfer.idle_seconds)}</span>`;
+            } else if (transfer.throughput > 0) {
+                transferInfo = ` · ${formatFileSize(transfer.throughput)}/s`;
+                if (transfer.eta_seconds !== null) {
+                    transferInfo += ` · ${formatDuration(transfer.eta_seconds)} left`;
+                }
+            }
+        }
+        
+        let deleteStatus = '';
+        if (task.status === 'completed' && task.delete_success) {
+            deleteStatus = `<div class="small text-success"><i class="bi bi-trash-fill me-1"></i> File deleted</div>`;
+        } else if (task.status === 'completed' && task.delete_failed) {
+            deleteStatus = `<div class="small text-danger"><i class="bi bi-exclamation-circle me-1"></i> Could not delete file after ${task.delete_attempts} attempts</div>`;
+        } else if (task.status === 'completed' && task.delete_next_attempt) {
+            const retryIn = Math.max(0, Math.round(task.delete_next_attempt - Date.now() / 1000));
+            deleteStatus = `<div class="small text-warning"><i class="bi bi-arrow-repeat me-1"></i> ${task.delete_attempts
+                ? `File in use, retrying deletion${retryIn ? ` in ${formatDuration(retryIn)}` : ''} (attempt ${task.delete_attempts + 1})`
+                : 'Deleting file...'}</div>`;
+        }
         
         itemEl.innerHTML = `
             <div class="d-flex justify-content-between align-items-center">
@@ -278,7 +305,7 @@ function updateQueueUI() {
                     <span class="${statusClass} me-3 fs-4">${statusIcon}</span>
                     <div>
                         <div class="fw-bold">${task.filename}</div>
-                        <div class="small text-muted">${fileSize}</div>
+                        <div class="small text-muted">${fileSize}${transferInfo}</div>
                         ${deleteStatus}
                     </div>
                 </div>
@@ -310,6 +337,13 @@ function formatFileSize(bytes) {
     return parseFloat((bytes / Math.pow(k, i)).toFixed(2)) + ' ' + sizes[i];
 }
 
+function formatDuration(seconds) {
+    seconds = Math.round(seconds);
+    if (seconds < 60) return `${seconds}s`;
+    if (seconds < 3600) return `${Math.floor(seconds / 60)}m ${seconds % 60}s`;
+    return `${Math.floor(seconds / 3600)}h ${Math.floor((seconds % 3600) / 60)}m`;
+}
+
 function capitalizeFirstLetter(string) {
     return string.charAt(0).toUpperCase() + string.slice(1);
 }
@@ -521,7 +555,7 @@ function saveSettings() {
         delete_after_upload: document.getElementById('deleteAfterUpload').checked,
         check_existing_files: document.getElementById('checkExistingFiles').checked,
         max_retries: parseInt(document.getElementById('maxRetries').value),
-        upload_limit_duration: parseInt(document.getElementById('uploadLimitDuration').value),
+        quota_daily_limit: parseInt(document.getElementById('quotaDailyLimit').value),
         delete_retry_count: parseInt(document.getElementById('deleteRetryCount').value),
         delete_retry_delay: parseInt(document.getElementById('deleteRetryDelay').value)
     };
@@ -741,6 +775,7 @@ function loadApiProjects() {
                                     <tr>
                                         <th>Project</th>
                                         <th>Status</th>
+                                        <th>Quota Today</th>
                                         <th>Actions</th>
                                     </tr>
                                 </thead>
@@ -755,6 +790,10 @@ function loadApiProjects() {
                         const activeBadge = project.is_active
                             ? `<span class="badge bg-primary ms-2">Active</span>`
                             : '';
+                        
+                        const uploadingBadge = project.uploading
+                            ? `<span class="badge bg-info text-dark ms-2">Uploading ${project.uploading}</span>`
+                            : '';
                             
                         const authButton = project.is_authenticated
                             ? ``
@@ -768,10 +807,18 @@ function loadApiProjects() {
                                </button>`
                             : '';
                         
+                        const quota = project.quota;
+                        const quotaInfo = !quota ? ''
+                            : quota.exhausted
+                                ? `<span class="text-danger">Used up (${quota.exhausted})</span>`
+                                : `${quota.remaining.toLocaleString()} / ${quota.limit.toLocaleString()} units
+                                   <div class="small text-muted">${quota.uploads_left} upload${quota.uploads_left === 1 ? '' : 's'} left</div>`;
+                        
                         listEl.innerHTML += `
                             <tr>
                                 <td>${project.name || project.id}</td>
-                                <td>${statusBadge}${activeBadge}</td>
+                                <td>${statusBadge}${activeBadge}${uploadingBadge}</td>
+                                <td>${quotaInfo}</td>
                                 <td>
                                     ${authButton}
                                     ${selectButton}
@@ -0,0 +1,212 @@
+"""
+Durable upload queue for YouTube Auto Uploader
+
+Keeps a copy of every upload task in SQLite so the queue survives crashes,
+restarts after an update, and reboots. The uploader saves a task whenever
+it changes; saves are collected in memory and written by one background
+thread, so a burst of changes costs a single transaction:
+
+- status changes are written within a fraction of a second
+- progress updates are written at most every flush_interval seconds
+
+Tasks removed from the queue are deleted from the journal as well.
+"""
+import os
+import json
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+
+import config
+from file_index import DATA_DIR
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('task_journal')
+
+# Location of the journal database
+JOURNAL_DB_FILE = os.path.join(DATA_DIR, 'upload_queue.db')
+
+# Seconds to collect status changes before writing them
+URGENT_FLUSH_DELAY = 0.2
+
+# Shared journal instance, opened on first use
+task_journal = None
+task_journal_lock = threading.Lock()
+
+class TaskJournal:
+    """
+    SQLite-backed journal of upload tasks with batched writes
+
+    Attributes:
+        db_path (str): Path to the SQLite database
+        flush_interval (float): Maximum seconds a non-urgent change waits
+            before it is written
+    """
+    def __init__(self, db_path=JOURNAL_DB_FILE, flush_interval=5):
+        """Open (and create if needed) the journal database"""
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+
+        # task ID -> state dict to write, or None to delete the task
+        self.dirty = {}
+        self.flush_due = None
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY,
+                file_path TEXT,
+                status TEXT,
+                created_at REAL,
+                updated_at REAL,
+                state TEXT
+            )
+        """)
+        self.conn.commit()
+
+        self.thread = threading.Thread(target=self._run, name='task-journal')
+        self.thread.daemon = True
+        self.thread.start()
+        logger.info(f"Opened upload queue journal: {db_path}")
+
+    def save(self, task, urgent=False):
+        """
+        Schedule a task's current state to be written
+
+        Args:
+            task (UploadTask): The task
+            urgent (bool): True for status changes, which are written right
+                away instead of with the next periodic flush
+        """
+        state = task.to_state()
+        with self.condition:
+            self.dirty[task.id] = state
+            self._schedule(urgent)
+
+    def delete(self, task_id):
+        """
+        Schedule a task to be removed from the journal
+
+        Args:
+            task_id (str): ID of the task
+        """
+        with self.condition:
+            self.dirty[task_id] = None
+            self._schedule(True)
+
+    def _schedule(self, urgent):
+        """Move the next flush forward if needed, caller holds the condition"""
+        due = time.monotonic() + (URGENT_FLUSH_DELAY if urgent else self.flush_interval)
+        if self.flush_due is None or due < self.flush_due:
+            self.flush_due = due
+            self.condition.notify()
+
+    def load(self):
+        """
+        Read all tasks from the journal
+
+        Returns:
+            list: State dicts of the stored tasks, oldest first
+        """
+        with self.write_lock:
+            cursor = self.conn.execute("SELECT state FROM tasks ORDER BY created_at, id")
+            rows = cursor.fetchall()
+
+        states = []
+        for (state,) in rows:
+            try:
+                states.append(json.loads(state))
+            except ValueError as e:
+                logger.warning(f"Skipping unreadable task in journal: {e}")
+        return states
+
+    def flush(self):
+        """Write all scheduled changes in one transaction"""
+        with self.condition:
+            dirty, self.dirty = self.dirty, {}
+            self.flush_due = None
+        if not dirty:
+            return
+
+        now = time.time()
+        upserts = []
+        deletes = []
+        for task_id, state in dirty.items():
+            if state is None:
+                deletes.append((task_id,))
+            else:
+                upserts.append((task_id, state.get('file_path'), state.get('status'),
+                                state.get('created_at') or now, now, json.dumps(state)))
+
+        with self.write_lock:
+            try:
+                if upserts:
+                    # Keep created_at of existing rows so the queue order survives
+                    self.conn.executemany(
+                        "INSERT INTO tasks (id, file_path, status, created_at, updated_at, state) "
+                        "VALUES (?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT(id) DO UPDATE SET file_path = excluded.file_path, "
+                        "status = excluded.status, updated_at = excluded.updated_at, "
+                        "state = excluded.state",
+                        upserts
+                    )
+                if deletes:
+                    self.conn.executemany("DELETE FROM tasks WHERE id = ?", deletes)
+                self.conn.commit()
+                logger.debug(f"Wrote {len(upserts)} task(s), deleted {len(deletes)} from journal")
+            except sqlite3.Error as e:
+                logger.error(f"Error writing {len(dirty)} task(s) to journal: {e}")
+
+    def close(self):
+        """Write pending changes and close the database"""
+        self.flush()
+        with self.write_lock:
+            self.conn.close()
+
+    def _run(self):
+        """Write scheduled changes when their flush time comes"""
+        while True:
+            with self.condition:
+                while self.flush_due is None:
+                    self.condition.wait()
+                delay = self.flush_due - time.monotonic()
+                if delay > 0:
+                    self.condition.wait(timeout=delay)
+                    continue
+
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing task journal: {e}")
+
+def get_journal():
+    """
+    Get the shared task journal, opening it on first use
+
+    Returns:
+        TaskJournal: The shared journal
+    """
+    global task_journal
+
+    with task_journal_lock:
+        if task_journal is None:
+            app_config = config.load_config()
+            task_journal = TaskJournal(
+                JOURNAL_DB_FILE,
+                flush_interval=app_config.get('queue_flush_interval', 5)
+            )
+            # Don't lose the last changes on a normal exit
+            atexit.register(task_journal.flush)
+        return task_journal
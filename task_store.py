@@ -0,0 +1,303 @@
+"""
+Upload task store for YouTube Auto Uploader
+
+Holds the upload tasks of the current run, indexed by task ID, by file path
+and by status, so adding, looking up and cancelling a task take constant
+time however long the queue gets. All changes happen under one lock, and
+readers get an immutable snapshot of the queue instead of the live
+collection, so an API request never sees a half-updated queue.
+
+Tasks report their own status changes to the store (see
+UploadTask.status_listener), which keeps the status index current no
+matter which thread changes a task. Every change also wakes the threads
+waiting on the store's condition, so workers don't need to poll.
+"""
+import os
+import logging
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('task_store')
+
+def normalize_task_path(file_path):
+    """
+    Normalize a file path for duplicate checks
+
+    Resolves symlinks and, on case-insensitive systems, the case of the
+    path, so different spellings of the same file map to the same key.
+
+    Args:
+        file_path (str): Path to the file
+
+    Returns:
+        str: Normalized path
+    """
+    return os.path.normcase(os.path.realpath(os.path.expanduser(file_path)))
+
+class TaskStore:
+    """
+    Thread-safe collection of upload tasks in the order they were added
+
+    Attributes:
+        lock (threading.RLock): Lock guarding the store, can be held by
+            callers to make several operations atomic
+        condition (threading.Condition): Notified whenever a task is added,
+            removed or changes status
+        listeners (list): Functions called with (task, event) after a change,
+            event is "added", "removed" or "status"
+    """
+    def __init__(self):
+        """Create an empty store"""
+        self.lock = threading.RLock()
+        self.condition = threading.Condition(self.lock)
+
+        # task ID -> task, in insertion order
+        self.tasks = {}
+        # normalized path -> task ID
+        self.paths = {}
+        # status -> {task ID: None}, dicts keep the tasks in insertion order
+        self.statuses = {}
+
+        # Cached snapshot, rebuilt after a change
+        self._snapshot = None
+
+        self.listeners = []
+
+    def __len__(self):
+        with self.lock:
+            return len(self.tasks)
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def __contains__(self, task_id):
+        with self.lock:
+            return task_id in self.tasks
+
+    def _index_status(self, task_id, old_status, new_status):
+        """Move a task between status indexes"""
+        if old_status is not None:
+            ids = self.statuses.get(old_status)
+            if ids is not None:
+                ids.pop(task_id, None)
+                if not ids:
+                    del self.statuses[old_status]
+        if new_status is not None:
+            self.statuses.setdefault(new_status, {})[task_id] = None
+        self._snapshot = None
+        self.condition.notify_all()
+
+    def _on_status_change(self, task, old_status, new_status):
+        """Keep the status index in sync, called by the task itself"""
+        with self.lock:
+            if self.tasks.get(task.id) is task:
+                # Index the status the task has now, another thread may have
+                # changed it again before this notification got the lock
+                self._index_status(task.id, old_status, task.status)
+                self._notify_listeners(task, 'status')
+
+    def _notify_listeners(self, task, event):
+        """Call the change listeners, caller holds the lock"""
+        for listener in self.listeners:
+            try:
+                listener(task, event)
+            except Exception as e:
+                logger.error(f"Error in task store listener for {task.id}: {e}")
+
+    def add_listener(self, callback):
+        """
+        Register a function to call after every change of the store
+
+        Listeners run while the store lock is held and must be quick.
+
+        Args:
+            callback (function): Called with (task, event)
+        """
+        with self.lock:
+            if callback not in self.listeners:
+                self.listeners.append(callback)
+
+    def notify(self):
+        """Wake all threads waiting for a change, e.g. after an outside event"""
+        with self.lock:
+            self.condition.notify_all()
+
+    def wait(self, timeout=None):
+        """
+        Wait until the store changes or notify() is called
+
+        Args:
+            timeout (float, optional): Maximum number of seconds to wait
+
+        Returns:
+            bool: False if the timeout expired
+        """
+        with self.lock:
+            return self.condition.wait(timeout)
+
+    def add(self, task):
+        """
+        Add a task unless its file is already in the store
+
+        Args:
+            task (UploadTask): The task to add
+
+        Returns:
+            bool: True if the task was added, False if a task for the same
+                file (or with the same ID) already exists
+        """
+        path_key = normalize_task_path(task.file_path)
+
+        with self.lock:
+            if task.id in self.tasks or path_key in self.paths:
+                return False
+
+            self.tasks[task.id] = task
+            self.paths[path_key] = task.id
+            self._index_status(task.id, None, task.status)
+            task.status_listener = self._on_status_change
+            self._notify_listeners(task, 'added')
+            return True
+
+    def get(self, task_id):
+        """
+        Get a task by its ID
+
+        Args:
+            task_id (str): ID of the task
+
+        Returns:
+            UploadTask: The task, or None if it is not in the store
+        """
+        with self.lock:
+            return self.tasks.get(task_id)
+
+    def get_by_path(self, file_path):
+        """
+        Get the task for a file
+
+        Args:
+            file_path (str): Path to the video file
+
+        Returns:
+            UploadTask: The task, or None if the file has no task
+        """
+        path_key = normalize_task_path(file_path)
+        with self.lock:
+            task_id = self.paths.get(path_key)
+            return self.tasks.get(task_id) if task_id else None
+
+    def remove(self, task_id):
+        """
+        Remove a task from the store
+
+        Args:
+            task_id (str): ID of the task
+
+        Returns:
+            UploadTask: The removed task, or None if it was not in the store
+        """
+        with self.lock:
+            task = self.tasks.pop(task_id, None)
+            if task is None:
+                return None
+
+            path_key = normalize_task_path(task.file_path)
+            if self.paths.get(path_key) == task_id:
+                del self.paths[path_key]
+            self._index_status(task_id, task.status, None)
+            task.status_listener = None
+            self._notify_listeners(task, 'removed')
+            return task
+
+    def remove_where(self, predicate, status=None):
+        """
+        Remove all tasks matching a condition
+
+        Args:
+            predicate (function): Called with each task, True to remove it
+            status (str, optional): Only consider tasks in this status
+
+        Returns:
+            list: The removed tasks
+        """
+        with self.lock:
+            candidates = self.with_status(status) if status else list(self.tasks.values())
+            removed = [task for task in candidates if predicate(task)]
+            for task in removed:
+                self.remove(task.id)
+            return removed
+
+    def with_status(self, status):
+        """
+        Get the tasks in a status, oldest first
+
+        Args:
+            status (str): Task status
+
+        Returns:
+            list: Matching tasks
+        """
+        with self.lock:
+            return [self.tasks[task_id] for task_id in self.statuses.get(status, ())]
+
+    def first_with_status(self, status, predicate=None):
+        """
+        Get the oldest task in a status
+
+        Args:
+            status (str): Task status
+            predicate (function, optional): Called with each task, only
+                tasks it returns True for are considered
+
+        Returns:
+            UploadTask: The task, or None if no task matches
+        """
+        with self.lock:
+            for task_id in self.statuses.get(status, ()):
+                task = self.tasks[task_id]
+                if predicate is None or predicate(task):
+                    return task
+            return None
+
+    def count(self, status=None):
+        """
+        Count tasks, optionally only those in one status
+
+        Args:
+            status (str, optional): Task status
+
+        Returns:
+            int: Number of tasks
+        """
+        with self.lock:
+            if status is None:
+                return len(self.tasks)
+            return len(self.statuses.get(status, ()))
+
+    def status_counts(self):
+        """
+        Count the tasks in each status
+
+        Returns:
+            dict: status -> number of tasks
+        """
+        with self.lock:
+            return {status: len(ids) for status, ids in self.statuses.items()}
+
+    def snapshot(self):
+        """
+        Get all tasks as they are right now
+
+        The snapshot is shared between readers until the next change, so
+        repeated reads of an unchanged queue cost nothing.
+
+        Returns:
+            tuple: Tasks in the order they were added
+        """
+        with self.lock:
+            if self._snapshot is None:
+                self._snapshot = tuple(self.tasks.values())
+            return self._snapshot
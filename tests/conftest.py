@@ -0,0 +1,12 @@
+"""
+Shared setup of the unit tests
+
+The application modules live at the top of the repository, so the tests
+import them from there. Run from the repository root:
+
+    python -m pytest -q
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,107 @@
+"""Tests of the file index: status upserts, fingerprints and claims"""
+import os
+
+import pytest
+
+from file_index import FileIndex
+
+def write(path, data=b'x' * 1024, mode='ab'):
+    with open(path, mode) as f:
+        f.write(data)
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'index.db')
+
+@pytest.fixture
+def index(db_path):
+    index = FileIndex(db_path)
+    yield index
+    index.close()
+
+@pytest.fixture
+def clip(tmp_path):
+    path = str(tmp_path / 'clip.mp4')
+    write(path)
+    return path
+
+def stored(index, file_path):
+    """Read a row straight from the database, bypassing the cache"""
+    cursor = index.conn.execute(
+        "SELECT size, status, video_id, fingerprint, full_hash FROM files WHERE path = ?", (file_path,)
+    )
+    return cursor.fetchone()
+
+def test_record_and_status(index, clip):
+    assert index.get_status(clip) is None
+    index.record(clip, 'queued')
+    assert index.get_status(clip) == 'queued'
+    assert index.is_processed(clip)
+
+def test_status_update_keeps_the_fingerprints(index, clip):
+    index.record(clip, 'completed', 'video1')
+    index.set_fingerprint(clip, 'quick', 'full')
+
+    index.record(clip, 'queued')
+    assert stored(index, clip)[1:] == ('queued', 'video1', 'quick', 'full')
+
+def test_status_update_keeps_the_video_id(index, clip):
+    index.record(clip, 'completed', 'video1')
+    index.record_many([(clip, 'completed', None, None)])
+    assert index.get_record(clip)['video_id'] == 'video1'
+
+    index.record(clip, 'completed', 'video2')
+    assert index.get_record(clip)['video_id'] == 'video2'
+
+def test_changed_file_loses_its_fingerprints(index, clip):
+    index.record(clip, 'completed', 'video1')
+    index.set_fingerprint(clip, 'quick', 'full')
+    write(clip)
+
+    # The old record no longer describes the file
+    assert index.get_status(clip) is None
+
+    index.record(clip, 'queued')
+    size, status, _, fingerprint, full_hash = stored(index, clip)
+    assert (size, status, fingerprint, full_hash) == (2048, 'queued', None, None)
+    assert index.get_status(clip) == 'queued'
+
+def test_deleted_file_keeps_its_identity(index, clip):
+    index.record(clip, 'uploading')
+    os.remove(clip)
+
+    index.record(clip, 'completed', 'video1')
+    assert stored(index, clip)[:3] == (1024, 'completed', 'video1')
+    assert index.get_status(clip) == 'completed'
+
+def test_find_uploaded_by_fingerprint(index, clip):
+    index.record(clip, 'uploading')
+    index.set_fingerprint(clip, 'quick')
+    assert index.find_uploaded('quick') == []
+
+    index.record(clip, 'completed', 'video1')
+    assert index.find_uploaded('quick') == [{'path': clip, 'video_id': 'video1', 'full_hash': None}]
+
+def test_only_final_statuses_survive_a_restart(db_path, tmp_path):
+    done = str(tmp_path / 'done.mp4')
+    busy = str(tmp_path / 'busy.mp4')
+    write(done)
+    write(busy)
+
+    index = FileIndex(db_path)
+    index.record_many([(done, 'completed', 'video1', None), (busy, 'uploading', None, None)])
+    index.close()
+
+    index = FileIndex(db_path)
+    assert index.get_status(done) == 'completed'
+    assert index.get_status(busy) is None
+    index.close()
+
+def test_claim_each_file_once(index, clip, tmp_path):
+    other = str(tmp_path / 'other.mp4')
+    write(other)
+
+    assert index.claim_many([clip, other, clip]) == [clip, other]
+    assert index.claim_many([clip, other]) == []
+    assert not index.claim(clip)
+    assert index.get_status(clip) == 'detected'
@@ -0,0 +1,96 @@
+"""Tests of the quota day, the Pacific-midnight reset and the per-project ledger"""
+from datetime import datetime, timezone
+
+import pytest
+
+import quota_ledger
+from quota_ledger import UPLOAD_COST, QuotaLedger, get_next_reset, get_quota_day
+
+CONFIG = {'quota_daily_limit': 10000, 'quota_project_limits': {'big': 50000}}
+
+has_dst = not isinstance(quota_ledger.QUOTA_TIMEZONE, timezone)
+
+def local(utc_time):
+    """Convert an aware UTC time to the naive local time get_next_reset returns"""
+    return utc_time.astimezone().replace(tzinfo=None)
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = QuotaLedger(str(tmp_path / 'quota.db'))
+    yield ledger
+    ledger.close()
+
+def test_quota_day_follows_pacific_time():
+    # 07:59 UTC is still the previous day in California (PST, UTC-8)
+    assert get_quota_day(datetime(2024, 1, 15, 7, 59, tzinfo=timezone.utc)) == '2024-01-14'
+    assert get_quota_day(datetime(2024, 1, 15, 8, 0, tzinfo=timezone.utc)) == '2024-01-15'
+
+def test_reset_is_at_pacific_midnight():
+    now = datetime(2024, 1, 15, 7, 59, tzinfo=timezone.utc)
+    assert get_next_reset(now) == local(datetime(2024, 1, 15, 8, 0, tzinfo=timezone.utc))
+
+def test_reset_right_after_midnight_is_a_day_later():
+    now = datetime(2024, 1, 15, 8, 0, tzinfo=timezone.utc)
+    assert get_next_reset(now) == local(datetime(2024, 1, 16, 8, 0, tzinfo=timezone.utc))
+
+@pytest.mark.skipif(not has_dst, reason="no time zone database, Pacific time is fixed at UTC-8")
+def test_reset_follows_daylight_saving_time():
+    # Midnight PDT is 07:00 UTC
+    now = datetime(2024, 7, 1, 6, 59, tzinfo=timezone.utc)
+    assert get_quota_day(now) == '2024-06-30'
+    assert get_next_reset(now) == local(datetime(2024, 7, 1, 7, 0, tzinfo=timezone.utc))
+
+def test_charges_count_against_the_daily_limit(ledger):
+    ledger.charge('a', 'youtube.videos.insert')
+    ledger.charge('a', 'youtube.channels.list')
+    assert ledger.used('a') == UPLOAD_COST + 1
+    assert ledger.remaining('a', CONFIG) == 10000 - UPLOAD_COST - 1
+    assert ledger.uploads_left('a', CONFIG) == 5
+    assert ledger.remaining('big', CONFIG) == 50000
+
+def test_usage_resets_with_the_quota_day(ledger, monkeypatch):
+    monkeypatch.setattr(quota_ledger, 'get_quota_day', lambda now=None: '2024-01-14')
+    ledger.charge('a', 'youtube.videos.insert')
+    ledger.mark_exhausted('b', 'quotaExceeded')
+    assert ledger.used('a') == UPLOAD_COST
+    assert ledger.remaining('b', CONFIG) == 0
+
+    monkeypatch.setattr(quota_ledger, 'get_quota_day', lambda now=None: '2024-01-15')
+    assert ledger.used('a') == 0
+    assert not ledger.is_exhausted('b')
+    assert ledger.remaining('b', CONFIG) == 10000
+
+def test_usage_survives_a_restart(tmp_path):
+    path = str(tmp_path / 'quota.db')
+    ledger = QuotaLedger(path)
+    ledger.charge('a', 'youtube.videos.insert')
+    ledger.mark_exhausted('b', 'uploadLimitExceeded')
+    ledger.close()
+
+    ledger = QuotaLedger(path)
+    assert ledger.used('a') == UPLOAD_COST
+    assert ledger.is_exhausted('b')
+    ledger.close()
+
+def test_reservations_hold_units_until_released(ledger):
+    ledger.charge('a', 'youtube.videos.insert', 10000 - 2 * UPLOAD_COST)
+    assert ledger.reserve('a', UPLOAD_COST, CONFIG)
+    assert ledger.reserve('a', UPLOAD_COST, CONFIG)
+    assert not ledger.reserve('a', UPLOAD_COST, CONFIG)
+    assert ledger.uploads_left('a', CONFIG) == 0
+
+    ledger.release('a', UPLOAD_COST)
+    assert ledger.uploads_left('a', CONFIG) == 1
+
+def test_exhausted_projects_cannot_reserve(ledger):
+    ledger.mark_exhausted('a', 'quotaExceeded')
+    assert not ledger.reserve('a', UPLOAD_COST, CONFIG)
+
+def test_choose_project_with_the_most_quota_left(ledger):
+    ledger.charge('a', 'youtube.videos.insert', 5000)
+    assert ledger.choose_project(['a', 'b'], CONFIG) == 'b'
+    assert ledger.choose_project(['a', 'b', 'big'], CONFIG) == 'big'
+
+    ledger.mark_exhausted('big', 'quotaExceeded')
+    ledger.charge('b', 'youtube.videos.insert', 10000 - UPLOAD_COST + 1)
+    assert ledger.choose_project(['b', 'big'], CONFIG) is None
@@ -0,0 +1,158 @@
+"""Tests of error classification, Retry-After handling and circuit breakers"""
+import socket
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+import retry_policy
+from retry_policy import CircuitBreaker, CircuitOpenError, RetryPolicy, classify_error, parse_retry_after
+
+def http_error(status, **headers):
+    """Create an HttpError as the client library raises it"""
+    info = {'status': status}
+    info.update(headers)
+    return HttpError(httplib2.Response(info), b'{}')
+
+@pytest.fixture
+def policy(monkeypatch):
+    """Use a policy that opens breakers after two failures"""
+    policy = RetryPolicy(max_retries=3, base_delay=1, max_delay=8, breaker_threshold=2, breaker_reset=60)
+    monkeypatch.setattr(retry_policy, 'retry_policy', policy)
+    return policy
+
+@pytest.mark.parametrize('status', [500, 503, 429])
+def test_server_errors_and_rate_limits_are_retried(status):
+    decision = classify_error(http_error(status))
+    assert decision.retryable
+    assert decision.reason == f"http_{status}"
+    assert decision.status == status
+
+@pytest.mark.parametrize('status', [400, 401, 403, 404])
+def test_client_errors_are_not_retried(status):
+    assert not classify_error(http_error(status)).retryable
+
+def test_transport_errors_are_retried():
+    assert classify_error(ConnectionResetError()).reason == "connection"
+    assert classify_error(socket.timeout()).reason == "timeout"
+    assert classify_error(TimeoutError()).retryable
+
+def test_programming_errors_are_not_retried():
+    decision = classify_error(ValueError("bad"))
+    assert not decision.retryable
+    assert decision.reason == "ValueError"
+
+def test_open_circuit_is_not_retried():
+    assert not classify_error(CircuitOpenError("open")).retryable
+
+def test_retry_after_in_seconds():
+    assert parse_retry_after("7") == 7
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+
+def test_retry_after_is_capped_and_never_negative():
+    assert parse_retry_after(str(retry_policy.MAX_RETRY_AFTER * 10)) == retry_policy.MAX_RETRY_AFTER
+    assert parse_retry_after("-5") == 0
+
+def test_retry_after_as_http_date():
+    now = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+    value = format_datetime(now + timedelta(seconds=30), usegmt=True)
+    assert parse_retry_after(value, now=now) == 30
+
+def test_retry_after_header_wins_over_backoff(policy):
+    decision = classify_error(http_error(503, **{'retry-after': '12'}))
+    assert decision.retry_after == 12
+    assert policy.delay(0, decision) == 12
+
+def test_backoff_stays_below_the_cap(policy):
+    for attempt in range(10):
+        assert 0 <= policy.backoff(attempt) <= min(policy.max_delay, policy.base_delay * 2 ** attempt)
+
+def test_call_retries_transient_errors(policy):
+    attempts = []
+    waits = []
+
+    def request():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise http_error(503)
+        return 'ok'
+
+    assert policy.call(request, sleep=waits.append) == 'ok'
+    assert len(attempts) == 3
+    assert len(waits) == 2
+
+def test_call_gives_up_on_client_errors(policy):
+    attempts = []
+
+    def request():
+        attempts.append(1)
+        raise http_error(400)
+
+    with pytest.raises(HttpError):
+        policy.call(request, sleep=lambda seconds: None)
+    assert len(attempts) == 1
+
+def test_call_gives_up_after_max_retries(policy):
+    attempts = []
+
+    def request():
+        attempts.append(1)
+        raise ConnectionResetError()
+
+    with pytest.raises(ConnectionResetError):
+        policy.call(request, sleep=lambda seconds: None)
+    assert len(attempts) == policy.max_retries + 1
+
+def test_breaker_opens_at_the_threshold(policy):
+    breaker = CircuitBreaker('test')
+    breaker.record(classify_error(http_error(503)))
+    assert not breaker.is_open()
+    breaker.record(classify_error(http_error(503)))
+    assert breaker.is_open()
+    assert 0 < breaker.retry_in() <= policy.breaker_reset
+    assert breaker.stats()['state'] == 'open'
+
+def test_client_errors_close_the_breaker(policy):
+    breaker = CircuitBreaker('test')
+    breaker.record(classify_error(http_error(503)))
+    breaker.record(classify_error(http_error(404)))
+    breaker.record(classify_error(http_error(503)))
+    assert not breaker.is_open()
+
+def test_breaker_probes_after_the_reset_time(policy):
+    breaker = CircuitBreaker('test')
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.opened_at -= policy.breaker_reset + 1
+    assert not breaker.is_open()
+    assert breaker.stats()['state'] == 'half_open'
+
+    # A failed probe opens the breaker again right away
+    breaker.record_failure()
+    assert breaker.is_open()
+
+    breaker.opened_at -= policy.breaker_reset + 1
+    breaker.record_success()
+    assert breaker.stats()['state'] == 'closed'
+
+def test_open_breaker_stops_calls(policy):
+    breaker = CircuitBreaker('test')
+    breaker.record_failure()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        policy.call(lambda: 'ok', breaker=breaker)
+
+def test_call_stops_retrying_when_the_breaker_opens(policy):
+    breaker = CircuitBreaker('test')
+    attempts = []
+
+    def request():
+        attempts.append(1)
+        raise http_error(502)
+
+    with pytest.raises(HttpError):
+        policy.call(request, breaker=breaker, sleep=lambda seconds: None)
+    assert len(attempts) == policy.breaker_threshold
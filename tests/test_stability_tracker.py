@@ -0,0 +1,218 @@
+"""Tests of stability detection in size and close-write mode"""
+import os
+import time
+
+import pytest
+
+import stability_tracker
+from stability_tracker import MODE_CLOSE_WRITE, MODE_SIZE, StabilityTracker
+
+INTERVAL = 10
+
+def write(path, data=b'x' * 1024, mode='ab'):
+    with open(path, mode) as f:
+        f.write(data)
+
+@pytest.fixture
+def stable():
+    """Collects the files the tracker reports"""
+    return []
+
+@pytest.fixture
+def tracker(stable):
+    """Size-mode tracker checked by the tests, its thread is not started"""
+    return StabilityTracker(stable.extend, check_interval=INTERVAL, empty_wait_time=INTERVAL, mode=MODE_SIZE)
+
+def test_unchanged_file_is_stable_after_one_interval(tmp_path, tracker):
+    path = str(tmp_path / 'clip.mp4')
+    write(path)
+    assert tracker.track(path)
+    start = time.monotonic()
+
+    assert tracker._check_due_files(start + INTERVAL / 2) == []
+    assert tracker._check_due_files(start + INTERVAL) == [path]
+    assert not tracker.is_tracked(path)
+
+def test_file_is_tracked_once(tmp_path, tracker):
+    path = str(tmp_path / 'clip.mp4')
+    write(path)
+    assert tracker.track(path)
+    assert not tracker.track(path)
+    assert tracker.pending_count() == 1
+
+def test_growing_file_is_never_reported(tmp_path, tracker):
+    path = str(tmp_path / 'clip.mp4')
+    write(path)
+    tracker.track(path)
+    now = time.monotonic()
+
+    # However long the recording takes
+    for _ in range(100):
+        now += INTERVAL
+        write(path)
+        assert tracker._check_due_files(now) == []
+    assert tracker.is_tracked(path)
+
+    now += INTERVAL
+    assert tracker._check_due_files(now) == [path]
+
+def test_empty_file_is_dropped(tmp_path, tracker):
+    path = str(tmp_path / 'clip.mp4')
+    write(path, b'', 'wb')
+    tracker.track(path)
+    start = time.monotonic()
+
+    assert tracker._check_due_files(start + INTERVAL) == []
+    assert not tracker.is_tracked(path)
+
+def test_empty_file_that_gets_content_is_tracked(tmp_path, tracker):
+    path = str(tmp_path / 'clip.mp4')
+    write(path, b'', 'wb')
+    tracker.track(path)
+    start = time.monotonic()
+
+    write(path)
+    assert tracker._check_due_files(start + INTERVAL) == []
+    assert tracker._check_due_files(start + 2 * INTERVAL) == [path]
+
+def test_deleted_file_is_dropped(tmp_path, tracker):
+    path = str(tmp_path / 'clip.mp4')
+    write(path)
+    tracker.track(path)
+    start = time.monotonic()
+
+    os.remove(path)
+    assert tracker._check_due_files(start + INTERVAL) == []
+    assert not tracker.is_tracked(path)
+
+def test_missing_file_is_not_tracked(tmp_path, tracker):
+    assert not tracker.track(str(tmp_path / 'missing.mp4'))
+
+def test_close_events_are_ignored_in_size_mode(tmp_path, tracker):
+    path = str(tmp_path / 'clip.mp4')
+    write(path)
+    tracker.track(path)
+    assert not tracker.notify_closed(path)
+
+def test_files_stable_together_are_reported_together(tmp_path, tracker):
+    paths = [str(tmp_path / f'clip{i}.mp4') for i in range(3)]
+    for path in paths:
+        write(path)
+        tracker.track(path)
+    start = time.monotonic()
+
+    assert sorted(tracker._check_due_files(start + INTERVAL)) == sorted(paths)
+
+def test_background_thread_reports_stable_files(tmp_path, stable):
+    tracker = StabilityTracker(stable.extend, check_interval=0.05, empty_wait_time=0.05, mode=MODE_SIZE)
+    path = str(tmp_path / 'clip.mp4')
+    write(path)
+    tracker.start()
+    try:
+        tracker.track(path)
+        deadline = time.monotonic() + 5
+        while not stable and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        tracker.stop()
+    assert stable == [path]
+
+def test_unsupported_close_write_falls_back_to_size(monkeypatch):
+    monkeypatch.setattr(stability_tracker, 'close_write_supported', lambda: False)
+    assert stability_tracker.resolve_mode('close_write') == MODE_SIZE
+    assert stability_tracker.resolve_mode('auto') == MODE_SIZE
+
+requires_close_write = pytest.mark.skipif(not stability_tracker.close_write_supported(),
+                                          reason="close-write detection needs Linux with /proc")
+
+@pytest.fixture
+def writers(monkeypatch):
+    """Files the close-write tracker sees as open for writing"""
+    writers = set()
+    monkeypatch.setattr(stability_tracker, 'find_open_for_writing',
+                        lambda paths: ({path for path in paths if path in writers}, True))
+    return writers
+
+@pytest.fixture
+def close_write_tracker(stable, writers, monkeypatch):
+    """Close-write tracker checked by the tests, its thread is not started"""
+    monkeypatch.setattr(stability_tracker, 'close_write_supported', lambda: True)
+    tracker = StabilityTracker(stable.extend, check_interval=INTERVAL, empty_wait_time=INTERVAL,
+                               mode=MODE_CLOSE_WRITE)
+    assert tracker.mode == MODE_CLOSE_WRITE
+    return tracker
+
+def test_file_open_for_writing_is_never_stable(tmp_path, close_write_tracker, writers):
+    path = str(tmp_path / 'clip.mp4')
+    write(path)
+    writers.add(path)
+    close_write_tracker.track(path)
+    now = time.monotonic()
+
+    # Unchanged, but the recorder still has it open
+    for _ in range(10):
+        now += INTERVAL
+        assert close_write_tracker._check_due_files(now) == []
+    assert close_write_tracker.is_tracked(path)
+
+    writers.discard(path)
+    now += INTERVAL
+    assert close_write_tracker._check_due_files(now) == [path]
+
+def test_close_event_reports_the_file_right_away(tmp_path, close_write_tracker):
+    path = str(tmp_path / 'clip.mp4')
+    write(path)
+    close_write_tracker.track(path)
+
+    assert close_write_tracker.notify_closed(path)
+    assert close_write_tracker._check_due_files(time.monotonic()) == [path]
+
+def test_close_event_is_ignored_while_another_writer_remains(tmp_path, close_write_tracker, writers):
+    path = str(tmp_path / 'clip.mp4')
+    write(path)
+    close_write_tracker.track(path)
+    writers.add(path)
+
+    close_write_tracker.notify_closed(path)
+    assert close_write_tracker._check_due_files(time.monotonic()) == []
+    assert close_write_tracker.is_tracked(path)
+
+def test_growing_file_without_visible_writer_is_not_reported(tmp_path, close_write_tracker):
+    # A writer in another PID namespace or on another machine never shows up in /proc
+    path = str(tmp_path / 'clip.mp4')
+    write(path)
+    close_write_tracker.track(path)
+    now = time.monotonic()
+
+    for _ in range(10):
+        now += INTERVAL
+        write(path)
+        assert close_write_tracker._check_due_files(now) == []
+
+    now += INTERVAL
+    assert close_write_tracker._check_due_files(now) == [path]
+
+def test_file_without_writer_needs_one_unchanged_interval(tmp_path, close_write_tracker):
+    path = str(tmp_path / 'clip.mp4')
+    write(path)
+    close_write_tracker.track(path)
+    start = time.monotonic()
+
+    assert close_write_tracker._check_due_files(start + INTERVAL / 2) == []
+    assert close_write_tracker._check_due_files(start + INTERVAL) == [path]
+
+def test_close_event_for_untracked_file_is_ignored(tmp_path, close_write_tracker):
+    assert not close_write_tracker.notify_closed(str(tmp_path / 'other.mp4'))
+
+@requires_close_write
+def test_writers_are_found_in_proc(tmp_path):
+    path = str(tmp_path / 'clip.mp4')
+    other = str(tmp_path / 'other.mp4')
+    write(other)
+    with open(path, 'ab') as f:
+        f.write(b'x')
+        writers, _ = stability_tracker.find_open_for_writing([path, other])
+        assert writers == {path}
+
+    writers, _ = stability_tracker.find_open_for_writing([path, other])
+    assert writers == set()
@@ -0,0 +1,177 @@
+"""
+Transfer progress measurement for YouTube Auto Uploader
+
+The upload API only reports progress when a whole chunk has been accepted,
+which with large chunks leaves the queue showing the same percentage for
+minutes. A TransferMeter is fed by the upload stream every time the HTTP
+layer reads a block, so it knows how many bytes of the file are on their
+way at any moment. From that it derives:
+
+- byte-accurate progress
+- throughput over a rolling window of recent seconds
+- the estimated time left at that throughput
+- how long ago data last moved, to tell a slow link from a stalled upload
+
+The round trip time of the last few chunks is kept in a ring buffer.
+"""
+import time
+import threading
+from collections import deque
+
+# Seconds of history used for the throughput
+THROUGHPUT_WINDOW = 10
+
+# Width of one history bucket in seconds
+BUCKET_SECONDS = 0.25
+
+# Number of chunk round trips kept
+LATENCY_SAMPLES = 20
+
+class TransferMeter:
+    """
+    Byte counter with rolling throughput for one upload
+
+    Attributes:
+        total_bytes (int): Size of the file
+        position (int): File offset up to which data has been handed to the
+            HTTP layer (the server has confirmed everything before the
+            current chunk)
+        sent_bytes (int): Bytes handed to the HTTP layer, including chunks
+            that were sent again
+        chunk_latencies (deque): Recent chunks as dicts with bytes, seconds
+            and ok, oldest first
+    """
+    def __init__(self, total_bytes, start_bytes=0, window_seconds=THROUGHPUT_WINDOW,
+                 latency_samples=LATENCY_SAMPLES):
+        """Create a meter for an upload that continues at start_bytes"""
+        self.lock = threading.Lock()
+        self.total_bytes = total_bytes
+        self.start_bytes = start_bytes
+        self.position = start_bytes
+        self.sent_bytes = 0
+        self.window_seconds = window_seconds
+
+        # [bucket start time, bytes] of recent activity, oldest first
+        self.buckets = deque()
+        self.started_at = time.monotonic()
+        self.last_activity = self.started_at
+
+        self.chunk_latencies = deque(maxlen=latency_samples)
+        self.chunk_started_at = None
+
+    def add(self, amount, position):
+        """
+        Count bytes handed to the HTTP layer
+
+        Args:
+            amount (int): Number of bytes
+            position (int): File offset after these bytes
+        """
+        now = time.monotonic()
+        with self.lock:
+            self.sent_bytes += amount
+            self.position = position
+            self.last_activity = now
+            if self.buckets and now - self.buckets[-1][0] < BUCKET_SECONDS:
+                self.buckets[-1][1] += amount
+            else:
+                self.buckets.append([now, amount])
+            self._prune(now)
+
+    def seek(self, position):
+        """
+        Note that sending restarts at a file offset (a new or retried chunk)
+
+        Args:
+            position (int): File offset
+        """
+        with self.lock:
+            self.position = position
+
+    def _prune(self, now):
+        """Drop buckets older than the window, caller holds the lock"""
+        while self.buckets and now - self.buckets[0][0] > self.window_seconds:
+            self.buckets.popleft()
+
+    def chunk_started(self):
+        """Note the start time of a chunk request"""
+        self.chunk_started_at = time.monotonic()
+
+    def chunk_finished(self, confirmed_bytes, ok=True):
+        """
+        Record the round trip of a chunk request
+
+        Args:
+            confirmed_bytes (int): Bytes the server confirmed for the chunk
+            ok (bool): False if the request failed
+        """
+        if self.chunk_started_at is None:
+            return
+        seconds = time.monotonic() - self.chunk_started_at
+        self.chunk_started_at = None
+        with self.lock:
+            self.chunk_latencies.append({
+                'bytes': confirmed_bytes,
+                'seconds': round(seconds, 3),
+                'ok': ok
+            })
+
+    def throughput(self):
+        """
+        Get the throughput over the rolling window
+
+        Returns:
+            float: Bytes per second, 0 if nothing was sent recently
+        """
+        now = time.monotonic()
+        with self.lock:
+            self._prune(now)
+            sent = sum(amount for _, amount in self.buckets)
+            # Don't divide by the full window right after the start
+            elapsed = min(self.window_seconds, now - self.started_at)
+        return sent / elapsed if elapsed > 0 else 0.0
+
+    def eta(self):
+        """
+        Estimate the seconds left at the current throughput
+
+        Returns:
+            float: Seconds, or None if nothing is moving
+        """
+        rate = self.throughput()
+        if rate <= 0:
+            return None
+        return max(0, self.total_bytes - self.position) / rate
+
+    def percent(self):
+        """
+        Get the progress in percent of the file
+
+        Returns:
+            float: Progress between 0 and 100
+        """
+        if not self.total_bytes:
+            return 0.0
+        return min(100.0, self.position * 100.0 / self.total_bytes)
+
+    def stats(self):
+        """
+        Get the transfer figures for display
+
+        Returns:
+            dict: Position, throughput, ETA, idle time and recent chunk round trips
+        """
+        rate = self.throughput()
+        eta = self.eta()
+        with self.lock:
+            latencies = list(self.chunk_latencies)
+            idle = time.monotonic() - self.last_activity
+        return {
+            'sent_bytes': self.position,
+            'total_bytes': self.total_bytes,
+            'resent_bytes': max(0, self.sent_bytes - (self.position - self.start_bytes)),
+            'throughput': round(rate),
+            'eta_seconds': round(eta) if eta is not None else None,
+            'idle_seconds': round(idle, 1),
+            'chunk_latencies': latencies
+        }
@@ -3,15 +3,29 @@ Video upload functionality for YouTube Auto Uploader - Debug Version
 """
 import os
 import time
+import shutil
+import mimetypes
 import logging
 import threading
 from datetime import datetime, timedelta
-from googleapiclient.http import MediaFileUpload
 from googleapiclient.errors import HttpError
 
 from models import UploadTask
+from task_store import TaskStore
 import youtube_api
 import config
+import file_index
+import fingerprint
+import media_probe
+import task_journal
+from chunk_sizer import ChunkSizer
+import bandwidth
+import media_reader
+import metrics
+import retry_policy
+import quota_ledger
+import file_deleter
+from transfer_meter import TransferMeter
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
@@ -19,8 +33,67 @@ logging.basicConfig(level=logging.INFO,
 logger = logging.getLogger('uploader')
 
 # Upload queue
-upload_queue = []
-upload_thread = None
+upload_queue = TaskStore()
+
+# Upload worker threads, by (API project ID, worker number)
+upload_workers = {}
+
+# Number of uploads in progress per API project
+project_upload_counts = {}
+
+# API project holding the quota units of each starting upload, by task ID
+quota_reservations = {}
+
+# Seconds a completed and deleted task stays visible in the queue
+COMPLETED_TASK_RETENTION = 3600
+
+# Seconds a finished task is kept in the task journal, older ones are dropped on restore
+JOURNAL_TASK_RETENTION = 7 * 24 * 3600
+
+# Statuses in which a task is no longer worked on
+TERMINAL_STATUSES = ('completed', 'error', 'duplicate', 'cancelled')
+
+# Seconds between attempts to load the YouTube clients that failed to load
+SERVICE_RETRY_INTERVAL = 30
+
+# Timer of the next attempt to load the missing YouTube clients
+service_retry_timer = None
+
+# File index statuses that mean a file must not be queued again
+INDEXED_SKIP_STATUSES = ('queued', 'uploading', 'completed', 'cancelled', 'duplicate', 'quarantined')
+
+# Full content hashes being computed in the background, by task ID. A task
+# is not uploaded before its hash is done, so the duplicate check never waits
+full_hash_futures = {}
+
+# Metrics
+queue_tasks = metrics.gauge(
+    'upload_queue_tasks', 'Tasks in the upload queue', ['status'],
+    function=lambda: {(status,): count for status, count in upload_queue.status_counts().items()}
+)
+worker_count = metrics.gauge('upload_workers', 'Running upload workers', function=lambda: len(upload_workers))
+project_uploads = metrics.gauge('project_uploads', 'Uploads in progress, by API project', ['project'],
+                                function=lambda: {(project_id,): count for project_id, count in project_upload_counts.items()})
+tasks_added = metrics.counter('upload_tasks_added_total', 'Tasks added to the upload queue')
+files_quarantined = metrics.counter('files_quarantined_total', 'Incomplete video files kept out of the queue')
+queue_wait = metrics.histogram('upload_queue_wait_seconds', 'Time tasks waited in the queue before a worker took them')
+uploads_finished = metrics.counter('uploads_total', 'Tasks finished by the upload workers, by final status', ['status'])
+upload_duration = metrics.histogram('upload_duration_seconds', 'Duration of upload attempts, by final status', ['status'])
+uploaded_bytes = metrics.counter('upload_bytes_total', 'Bytes confirmed by the upload server')
+chunk_duration = metrics.histogram('upload_chunk_duration_seconds', 'Round trip time of successful upload chunks')
+chunk_failures = metrics.counter('upload_chunk_failures_total', 'Upload chunks that failed')
+upload_retries = metrics.counter('upload_retries_total', 'Upload chunks retried after a network or server error')
+
+def record_task_status(task):
+    """
+    Store the current status of a task in the persistent file index
+    
+    Args:
+        task (UploadTask): The upload task
+    """
+    # A task put back to pending (e.g. after switching API client) is queued again
+    status = "queued" if task.status == "pending" else task.status
+    file_index.get_index().record(task.file_path, status, video_id=task.video_id)
 
 def add_to_upload_queue(file_path):
     """
@@ -32,8 +105,52 @@ def add_to_upload_queue(file_path):
     Returns:
         UploadTask: The created upload task
     """
-    global upload_queue
+    tasks = add_files_to_upload_queue([file_path])
+    return tasks[0] if tasks else None
+
+def add_files_to_upload_queue(file_paths):
+    """
+    Add several files to the upload queue at once
+    
+    The new tasks are recorded in the file index in one transaction and the
+    upload thread is woken once for the whole batch.
+    
+    Args:
+        file_paths (list): Paths to the video files
+        
+    Returns:
+        list: The created upload tasks
+    """
+    tasks = []
+    for file_path in file_paths:
+        task = create_upload_task(file_path)
+        if task:
+            if not upload_queue.add(task):
+                logger.warning(f"File already in queue: {task.file_path}")
+                discard_full_hash(task)
+                continue
+            tasks.append(task)
+            tasks_added.inc()
+            logger.info(f"Added to queue: {task.filename} (ID: {task.id})")
     
+    if tasks:
+        file_index.get_index().record_many([(t.file_path, "queued", None, None) for t in tasks])
+        
+        # Start processing if not already running
+        ensure_upload_workers_running()
+    
+    return tasks
+
+def create_upload_task(file_path):
+    """
+    Validate a file and create an upload task for it
+    
+    Args:
+        file_path (str): Path to the video file
+        
+    Returns:
+        UploadTask: The new task, or None if the file cannot or should not be queued
+    """
     # Normalize the file path to ensure consistent handling
     try:
         file_path = os.path.abspath(os.path.expanduser(file_path))
@@ -61,14 +178,28 @@ def add_to_upload_queue(file_path):
     except Exception as e:
         logger.error(f"Error checking file size: {e}")
         return None
+    
+    # Check if this file was already queued or uploaded, also in earlier runs
+    indexed_status = file_index.get_index().get_status(file_path)
+    if indexed_status in INDEXED_SKIP_STATUSES:
+        logger.warning(f"File already processed: {file_path}, status: {indexed_status}")
+        return None
+    
+    # Reject recordings that were never finished before spending bandwidth and quota on them
+    app_config = config.load_config()
+    if app_config.get("check_container_integrity", True):
+        complete, reason = media_probe.check_container(file_path)
+        if not complete:
+            quarantine_file(file_path, reason, app_config.get("quarantine_folder"))
+            return None
         
     # Check if this file is already in the queue
-    for task in upload_queue:
-        if os.path.samefile(task.file_path, file_path):
-            logger.warning(f"File already in queue: {file_path}, status: {task.status}")
-            return None
+    queued_task = upload_queue.get_by_path(file_path)
+    if queued_task:
+        logger.warning(f"File already in queue: {file_path}, status: {queued_task.status}")
+        return None
         
-    # Add to queue
+    # Create the task
     try:
         task = UploadTask(file_path)
         
@@ -76,110 +207,419 @@ def add_to_upload_queue(file_path):
         if not task or not task.id:
             logger.error(f"Failed to create task for file: {file_path}")
             return None
-            
-        upload_queue.append(task)
-        logger.info(f"Added to queue: {task.filename} (ID: {task.id})")
         
-        # Start processing if not already running
-        ensure_upload_thread_running()
+        # Read duration and resolution in the background
+        probe = media_probe.submit_probe(task.file_path)
+        probe.add_done_callback(lambda future: setattr(task, 'media_info', future.result()))
+        
+        # Optionally hash the whole file in the background for exact duplicate checks
+        if app_config.get("fingerprint_full_hash"):
+            future = fingerprint.submit_full_hash(task.file_path)
+            full_hash_futures[task.id] = future
+            # Wake the workers, the task can be uploaded now
+            future.add_done_callback(lambda _: upload_queue.notify())
         
         return task
     except Exception as e:
         logger.error(f"Error adding file to queue: {e}")
         return None
 
-def ensure_upload_thread_running():
-    """Ensure that the upload queue processing thread is running"""
-    global upload_thread
+def quarantine_file(file_path, reason, quarantine_folder=None):
+    """
+    Keep a broken video file out of the upload queue
+    
+    The file is recorded as quarantined in the file index, so it is not
+    picked up again unless it changes, and moved to the quarantine folder
+    if one is configured.
+    
+    Args:
+        file_path (str): Normalized path to the video file
+        reason (str): Why the file was rejected
+        quarantine_folder (str, optional): Folder to move the file to
+        
+    Returns:
+        str: The path of the file after quarantining
+    """
+    logger.error(f"Quarantining incomplete video file: {file_path} ({reason})")
+    files_quarantined.inc()
+    file_index.get_index().record(file_path, "quarantined")
+    
+    if not quarantine_folder:
+        return file_path
+    
+    try:
+        quarantine_folder = os.path.abspath(os.path.expanduser(quarantine_folder))
+        os.makedirs(quarantine_folder, exist_ok=True)
+        
+        name, extension = os.path.splitext(os.path.basename(file_path))
+        target = os.path.join(quarantine_folder, name + extension)
+        counter = 1
+        while os.path.exists(target):
+            target = os.path.join(quarantine_folder, f"{name}_{counter}{extension}")
+            counter += 1
+        
+        shutil.move(file_path, target)
+        logger.info(f"Moved quarantined file to: {target}")
+        return target
+    except Exception as e:
+        logger.error(f"Error moving file to quarantine folder: {e}")
+        return file_path
+
+def find_duplicate_upload(task):
+    """
+    Find an earlier upload with the same content as a task's file
+    
+    Matches on the quick fingerprint. If the full hash is enabled, it is also
+    compared when both files have one, so only exact copies are matched.
+    
+    Args:
+        task (UploadTask): The upload task
+        
+    Returns:
+        dict: The matching upload (path, video_id, full_hash), or None
+    """
+    if not task.fingerprint:
+        return None
+    
+    future = full_hash_futures.pop(task.id, None)
+    if future:
+        try:
+            task.full_hash = future.result()
+        except Exception as e:
+            logger.warning(f"Error computing full hash for {task.filename}: {e}")
+    
+    for upload in file_index.get_index().find_uploaded(task.fingerprint):
+        if upload['path'] == task.file_path:
+            continue
+        if task.full_hash and upload['full_hash'] and task.full_hash != upload['full_hash']:
+            continue
+        return upload
+    
+    return None
+
+def is_hash_ready(task):
+    """
+    Check whether a task's background full hash is done, if it has one
+    
+    Args:
+        task (UploadTask): The upload task
+        
+    Returns:
+        bool: True if the task can be checked for duplicates without waiting
+    """
+    future = full_hash_futures.get(task.id)
+    return future is None or future.done()
+
+def discard_full_hash(task):
+    """
+    Forget the background full hash of a task, cancelling it if it has not started
+    
+    Args:
+        task (UploadTask): The upload task
+    """
+    future = full_hash_futures.pop(task.id, None)
+    if future:
+        future.cancel()
+
+def get_max_concurrent_uploads(app_config=None):
+    """
+    Get the number of videos that may be uploaded at the same time
+    
+    Args:
+        app_config (dict, optional): Application configuration if already loaded
+        
+    Returns:
+        int: Number of uploads across all API projects, at least 1
+    """
+    app_config = app_config or config.load_config()
+    try:
+        return max(1, int(app_config.get("max_concurrent_uploads", 2)))
+    except (TypeError, ValueError):
+        return 1
+
+def get_project_worker_count(app_config=None):
+    """
+    Get the number of upload workers of each API project
+    
+    Args:
+        app_config (dict, optional): Application configuration if already loaded
+        
+    Returns:
+        int: The per-project limit if one is set, else the overall limit
+    """
+    app_config = app_config or config.load_config()
+    max_uploads = get_max_concurrent_uploads(app_config)
+    try:
+        per_project_limit = int(app_config.get("max_concurrent_uploads_per_project") or max_uploads)
+    except (TypeError, ValueError):
+        per_project_limit = max_uploads
+    return max(1, min(per_project_limit, max_uploads))
+
+def ensure_upload_workers_running():
+    """
+    Ensure that every authenticated API project runs its upload workers
+    
+    Projects whose client can't be loaded (e.g. the token refresh failed
+    while offline) are tried again after SERVICE_RETRY_INTERVAL seconds.
+    """
+    global service_retry_timer
+    
+    # Load the clients outside the queue lock, refreshing a token takes a request
+    project_ids = youtube_api.load_project_clients()
+    authenticated = [project['id'] for project in youtube_api.get_available_api_projects()
+                     if os.path.exists(project['token_path'])]
+    worker_count = get_project_worker_count()
+    
+    with upload_queue.lock:
+        for project_id in project_ids:
+            for worker_id in range(worker_count):
+                worker = upload_workers.get((project_id, worker_id))
+                if worker is None or not worker.is_alive():
+                    logger.info(f"Starting upload worker {worker_id + 1}/{worker_count} for API project {project_id}")
+                    worker = threading.Thread(target=process_upload_queue, args=(project_id, worker_id),
+                                              name=f"upload-worker-{project_id}-{worker_id + 1}")
+                    worker.daemon = True
+                    upload_workers[(project_id, worker_id)] = worker
+                    worker.start()
+        
+        if len(project_ids) < len(authenticated) and (service_retry_timer is None or
+                                                      not service_retry_timer.is_alive()):
+            service_retry_timer = threading.Timer(SERVICE_RETRY_INTERVAL, ensure_upload_workers_running)
+            service_retry_timer.daemon = True
+            service_retry_timer.start()
+
+def get_idle_projects(app_config):
+    """
+    Get the API projects that could start an upload right now
+    
+    Caller holds the queue lock.
+    
+    Args:
+        app_config (dict): Application configuration
+        
+    Returns:
+        list: IDs of the projects with a running worker, a free worker slot
+            and a closed circuit breaker
+    """
+    worker_count = get_project_worker_count(app_config)
+    project_ids = {project_id for (project_id, _), worker in upload_workers.items() if worker.is_alive()}
+    return [project_id for project_id in project_ids
+            if project_upload_counts.get(project_id, 0) < worker_count and
+            not retry_policy.get_breaker(project_id).is_open()]
+
+def claim_next_task(app_config, project_id):
+    """
+    Take the next pending task for upload
+    
+    The task is marked as uploading while the queue lock is held, so no
+    other worker can pick it as well. Uploads start on the project with
+    the most quota left: while an idle project can upload more videos
+    today than this one, the task is left to that project's workers.
+    
+    Args:
+        app_config (dict): Application configuration
+        project_id (str): API project to upload the task with
+        
+    Returns:
+        tuple: (UploadTask, API project ID), or (None, None) if there is no
+            pending task, no free upload slot or not enough quota
+    """
+    with upload_queue.lock:
+        if sum(project_upload_counts.values()) >= get_max_concurrent_uploads(app_config):
+            return None, None
+        
+        # Tasks whose full hash is still computed wait, so no slot is held while hashing
+        task = upload_queue.first_with_status("pending", is_hash_ready)
+        if task is None:
+            return None, None
+        
+        ledger = quota_ledger.get_ledger()
+        best_id = ledger.choose_project(get_idle_projects(app_config), app_config)
+        if best_id not in (None, project_id) and (ledger.uploads_left(best_id, app_config) >
+                                                  ledger.uploads_left(project_id, app_config)):
+            return None, None
+        
+        # Hold the units of the insert until the session starts (continuing this
+        # project's own session costs nothing)
+        if not (task.resumable_uri and task.upload_project_id == project_id):
+            if not ledger.reserve(project_id, quota_ledger.UPLOAD_COST, app_config):
+                return None, None
+            quota_reservations[task.id] = project_id
+        
+        task.mark_uploading()
+        project_upload_counts[project_id] = project_upload_counts.get(project_id, 0) + 1
+        return task, project_id
+
+def release_quota_reservation(task):
+    """
+    Give back the quota units claim_next_task reserved for a task's upload
     
-    if upload_thread is None or not upload_thread.is_alive():
-        logger.info("Starting upload queue processing thread")
-        upload_thread = threading.Thread(target=process_upload_queue)
-        upload_thread.daemon = True
-        upload_thread.start()
+    Args:
+        task (UploadTask): The upload task
+    """
+    project_id = quota_reservations.pop(task.id, None)
+    if project_id is not None:
+        quota_ledger.get_ledger().release(project_id, quota_ledger.UPLOAD_COST)
 
-def process_upload_queue():
-    """Process the upload queue in a background thread"""
-    logger.info("Upload queue processing thread started")
+def release_task(project_id, task=None):
+    """
+    Free the upload slot taken by claim_next_task
+    
+    Args:
+        project_id (str): API project ID the task was claimed for
+        task (UploadTask, optional): The claimed task, its quota reservation
+            is given back if the upload session never started
+    """
+    if task is not None:
+        release_quota_reservation(task)
+    
+    with upload_queue.lock:
+        count = project_upload_counts.get(project_id, 0) - 1
+        if count > 0:
+            project_upload_counts[project_id] = count
+        else:
+            project_upload_counts.pop(project_id, None)
+        
+        # Wake workers waiting for a free upload slot
+        upload_queue.notify()
+
+def process_upload_queue(project_id, worker_id=0):
+    """
+    Process the upload queue in a background worker thread
+    
+    Every authenticated API project runs its own workers, each uploading
+    one video at a time with the project's client and quota, so uploads
+    are spread across all projects. Each upload starts on the idle project
+    with the most quota left. Between uploads a worker sleeps on the
+    queue's condition until something happens: a task is added or
+    finishes, or the project's quota resets.
+    
+    Args:
+        project_id (str): API project this worker uploads with
+        worker_id (int): Number of this worker within the project, workers
+            above the configured concurrency exit
+    """
+    name = f"Upload worker {worker_id + 1} of API project {project_id}"
+    logger.info(f"{name} started")
+    ledger = quota_ledger.get_ledger()
+    breaker = retry_policy.get_breaker(project_id)
     
     while True:
         try:
+            app_config = config.load_config()
+            
+            # Stop workers that are no longer needed after a settings change
+            if worker_id >= get_project_worker_count(app_config):
+                with upload_queue.lock:
+                    if upload_workers.get((project_id, worker_id)) is threading.current_thread():
+                        del upload_workers[(project_id, worker_id)]
+                logger.info(f"{name} stopped")
+                return
+            
             # Log current queue status
-            pending_count = len([t for t in upload_queue if t.status == "pending"])
-            uploading_count = len([t for t in upload_queue if t.status == "uploading"])
-            completed_count = len([t for t in upload_queue if t.status == "completed"])
-            error_count = len([t for t in upload_queue if t.status == "error"])
+            counts = upload_queue.status_counts()
+            logger.debug(f"Queue status: {sum(counts.values())} total, {counts.get('pending', 0)} pending, " + 
+                         f"{counts.get('uploading', 0)} uploading, {counts.get('completed', 0)} completed, " +
+                         f"{counts.get('error', 0)} error")
             
-            logger.debug(f"Queue status: {len(upload_queue)} total, {pending_count} pending, " + 
-                         f"{uploading_count} uploading, {completed_count} completed, {error_count} error")
+            # Sleep until a task is added (or the next cleanup is due)
+            with upload_queue.lock:
+                if not upload_queue.count("pending"):
+                    logger.debug("No pending tasks in queue")
+                    upload_queue.wait(timeout=cleanup_tasks())
+                    continue
             
-            if not youtube_api.get_youtube_service():
-                logger.warning("YouTube service not available, waiting...")
-                time.sleep(5)
+            # Leave the uploads to the other projects until the quota resets
+            if ledger.uploads_left(project_id, app_config) < 1:
+                reset_time = quota_ledger.get_next_reset()
+                logger.info(f"API project {project_id} has no quota left for an upload, "
+                            f"waiting until {reset_time.strftime('%Y-%m-%d %H:%M:%S')}")
+                upload_queue.wait(timeout=max(1, (reset_time - datetime.now()).total_seconds()))
                 continue
             
-            # Check upload limit status
-            limit_reached, limit_reset_time = youtube_api.get_upload_limit_status()
-            if limit_reached:
-                if limit_reset_time:
-                    reset_time_str = limit_reset_time.strftime('%Y-%m-%d %H:%M:%S')
-                    logger.warning(f"Upload limit reached, reset time: {reset_time_str}")
-                else:
-                    logger.warning("Upload limit reached, no reset time available")
+            # Leave uploads queued while the API project keeps failing
+            if breaker.is_open():
+                logger.debug(f"Circuit breaker for project {breaker.name} is open, waiting")
+                upload_queue.wait(timeout=breaker.retry_in())
+                continue
             
-            # Find next pending task
-            next_task = next((t for t in upload_queue if t.status == "pending"), None)
+            # Take the next pending task
+            with upload_queue.lock:
+                next_task, _ = claim_next_task(app_config, project_id)
+                if not next_task:
+                    # Another worker took it, all upload slots are in use, or a project
+                    # with more quota left takes it
+                    upload_queue.wait(timeout=SERVICE_RETRY_INTERVAL)
+                    continue
             
-            if next_task and not limit_reached:
-                logger.info(f"Processing task: {next_task.filename} (ID: {next_task.id})")
-                # Process this task
-                upload_video(next_task)
-                
-                # If this task failed due to upload limit, set a timer
-                if next_task.status == "error" and next_task.error and "uploadLimitExceeded" in next_task.error:
-                    app_config = config.load_config()
-                    reset_hours = app_config.get("upload_limit_duration", 24)
-                    logger.warning(f"Upload limit detected, setting reset timer for {reset_hours} hours")
-                    youtube_api.set_upload_limit_reached(reset_hours)
-            elif next_task and limit_reached:
-                logger.info("Pending task exists but upload limit reached, waiting...")
-            else:
-                # No pending tasks
-                logger.debug("No pending tasks in queue")
+            logger.info(f"{name} processing task: {next_task.filename} (ID: {next_task.id})")
+            if next_task.created_at:
+                queue_wait.observe(max(0, time.time() - next_task.created_at))
             
-            # Clean up completed tasks
-            cleanup_tasks()
+            try:
+                # Skip copies of recordings that were already uploaded
+                duplicate = None
+                if app_config.get("skip_duplicate_uploads", True):
+                    duplicate = find_duplicate_upload(next_task)
+                
+                if duplicate:
+                    next_task.mark_duplicate(duplicate['video_id'], duplicate['path'])
+                    record_task_status(next_task)
+                    uploads_finished.inc(status=next_task.status)
+                    continue
+                
+                # Process this task
+                file_index.get_index().record(next_task.file_path, "uploading")
+                upload_started = time.monotonic()
+                upload_video(next_task, project_id)
+                upload_duration.observe(time.monotonic() - upload_started, status=next_task.status)
+                uploads_finished.inc(status=next_task.status)
+                record_task_status(next_task)
+            finally:
+                release_task(project_id, next_task)
             
-            # Short delay
-            time.sleep(1)
+            if next_task.status == "completed":
+                file_index.get_index().set_fingerprint(
+                    next_task.file_path, next_task.fingerprint, next_task.full_hash
+                )
         except Exception as e:
             logger.error(f"Error in upload queue processing: {e}")
             time.sleep(5)
 
 def cleanup_tasks():
-    """Clean up tasks that have been completed and deleted"""
-    global upload_queue
+    """
+    Clean up tasks that have been completed and deleted
     
-    # Keep tasks that don't meet cleanup criteria
-    old_count = len(upload_queue)
-    upload_queue = [t for t in upload_queue if not (
-        t.status == "completed" and 
-        t.delete_success and
-        (datetime.now() - datetime.fromtimestamp(t.end_time or 0)).total_seconds() > 3600
-    )]
+    Returns:
+        float: Seconds until the next task is due for cleanup, or None if no
+            task is waiting to be cleaned up
+    """
+    now = time.time()
     
-    new_count = len(upload_queue)
-    if old_count != new_count:
-        logger.info(f"Cleaned up {old_count - new_count} completed tasks")
+    # Remove tasks that meet cleanup criteria
+    removed = upload_queue.remove_where(
+        lambda t: t.delete_success and now - (t.end_time or 0) > COMPLETED_TASK_RETENTION,
+        status="completed"
+    )
+    
+    if removed:
+        logger.info(f"Cleaned up {len(removed)} completed tasks")
+    
+    due = [(t.end_time or 0) + COMPLETED_TASK_RETENTION - now
+           for t in upload_queue.with_status("completed") if t.delete_success]
+    return max(0, min(due)) if due else None
 
-def upload_video(task):
+def upload_video(task, project_id=None):
     """
     Upload a video to YouTube
     
     Args:
         task (UploadTask): The upload task
+        project_id (str, optional): API project to upload with, defaults to the active one
     """
-    youtube = youtube_api.youtube
+    project_id = project_id or youtube_api.active_client_id
+    youtube = youtube_api.youtube_clients.get(project_id) or youtube_api.youtube
+    media = None
     
     if not youtube:
         task.mark_error("YouTube service not available")
@@ -187,15 +627,27 @@ def upload_video(task):
         return
         
     try:
-        task.mark_uploading()
+        # Workers claim tasks by marking them as uploading
+        if task.status != "uploading":
+            task.mark_uploading()
         logger.info(f"Starting upload for {task.filename}")
         
         # Load app configuration
         app_config = config.load_config()
         
+        # Make sure media info is available for the title (cached if already probed)
+        if task.media_info is None:
+            task.media_info = media_probe.probe_file(task.file_path)
+        media_info = task.media_info or {}
+        
         # Prepare metadata
+        width, height = media_info.get('width'), media_info.get('height')
         video_title = app_config.get("title_template", "").format(
-            filename=os.path.splitext(task.filename)[0]
+            filename=os.path.splitext(task.filename)[0],
+            duration=media_probe.format_duration(media_info.get('duration')),
+            resolution=f"{width}x{height}" if width and height else '',
+            height=f"{height}p" if height else '',
+            codec=media_info.get('video_codec') or ''
         )
         
         tags_list = []
@@ -225,15 +677,27 @@ def upload_video(task):
         file_size = os.path.getsize(task.file_path)
         logger.info(f"File size: {file_size} bytes")
         
-        # Use larger chunk size for bigger files (4MB for files >100MB, 1MB otherwise)
-        chunk_size = 4 * 1024 * 1024 if file_size > 100 * 1024 * 1024 else 1024 * 1024
+        # A session belongs to the project that started it, another project starts its own
+        if task.resumable_uri and task.upload_project_id != project_id:
+            logger.info(f"Upload session of {task.filename} was started with API project "
+                        f"{task.upload_project_id}, starting a new one with {project_id}")
+            forget_upload_session(task)
+        
+        # Chunk size adapts to the measured throughput while uploading
+        chunk_sizer = ChunkSizer.from_config(app_config, file_size)
             
-        # Prepare upload with optimized settings
-        media = MediaFileUpload(
-            task.file_path, 
-            chunksize=chunk_size,
-            resumable=True
+        # Prepare upload with optimized settings: the next chunk is read from disk while
+        # the current one is sent (large files are mapped instead), at the allowed bandwidth
+        mmap_min_mb = app_config.get("upload_mmap_min_mb", 512)
+        media = media_reader.create_media_upload(
+            task.file_path,
+            mimetypes.guess_type(task.file_path)[0] or 'application/octet-stream',
+            chunksize=chunk_sizer.chunk_size,
+            task_bucket=bandwidth.limiter.create_task_bucket(),
+            mmap_min_size=mmap_min_mb * 1024 * 1024 if mmap_min_mb is not None else None,
+            meter=TransferMeter(file_size, task.uploaded_bytes if task.resumable_uri else 0)
         )
+        task.meter = media.meter
         
         # Create the upload request with channel ID if available
         params = {
@@ -248,102 +712,136 @@ def upload_video(task):
             logger.info(f"Uploading on behalf of channel: {selected_channel_id}")
             params['onBehalfOfContentOwner'] = selected_channel_id
         
-        # Start upload
+        # Start upload, on a connection of its own so uploads can run in parallel
         logger.info(f"Creating YouTube upload request for {task.filename}")
         insert_request = youtube.videos().insert(**params)
+        upload_http = youtube_api.create_authorized_http(project_id) or insert_request.http
         
-        # Upload with progress tracking and better retry logic
+        # Continue an interrupted upload session from the last byte the server confirmed
+        if task.resumable_uri:
+            logger.info(f"Resuming upload session for {task.filename} at byte {task.uploaded_bytes}")
+            resume_upload_session(insert_request, task.resumable_uri)
+        
+        # Upload with progress tracking, failed chunks are retried as the retry policy decides
         response = None
         retry_count = 0
-        max_retries = app_config.get('max_retries', 3)
+        # Offset the server has confirmed. A resumed request starts at 0 and learns the
+        # offset in the same next_chunk() call that sends the next chunk, so count from here
+        confirmed_bytes = task.uploaded_bytes if task.resumable_uri else 0
+        policy = retry_policy.get_policy()
+        breaker = retry_policy.get_breaker(project_id)
         
-        while response is None and retry_count <= max_retries:
+        while response is None:
             try:
                 if task.cancel_requested:
                     logger.info(f"Upload cancelled for {task.filename}")
-                    insert_request.cancel()
                     task.mark_cancelled()
                     return
                     
-                status, response = insert_request.next_chunk()
+                chunk_sizer.apply(media)
+                chunk_sizer.start_chunk()
+                media.meter.chunk_started()
+                chunk_started_at = time.monotonic()
+                
+                status, response = insert_request.next_chunk(http=upload_http)
+                
+                chunk_end = file_size if response is not None else insert_request.resumable_progress
+                chunk_duration.observe(time.monotonic() - chunk_started_at)
+                uploaded_bytes.inc(max(0, chunk_end - confirmed_bytes))
+                media.meter.chunk_finished(chunk_end - confirmed_bytes)
+                chunk_sizer.chunk_succeeded(chunk_end - confirmed_bytes)
+                confirmed_bytes = chunk_end
+                breaker.record_success()
+                task.chunk_stats = chunk_sizer.stats()
+                task.read_stats = media.stats()
+                remember_upload_session(task, insert_request, project_id)
                 if status:
                     task.progress = int(status.progress() * 100)
+                    task_journal.get_journal().save(task)
                     logger.debug(f"Upload progress for {task.filename}: {task.progress}%")
                     # Reset retry counter on successful chunk
                     retry_count = 0
-            except HttpError as e:
+            except Exception as e:
                 error_content = str(e)
-                logger.error(f"HTTP error during upload: {error_content}")
+                logger.error(f"Error during upload of {task.filename}: {error_content}")
                 
-                # Check for upload limit exceeded
-                if "uploadLimitExceeded" in error_content:
-                    logger.warning("Upload limit exceeded error detected")
-                    # Try to switch to another API client
-                    current_client_id = youtube_api.active_client_id
-                    new_client = youtube_api.handle_upload_limit_error(current_client_id)
-                    
-                    if new_client:
-                        logger.info(f"Switched to a new API client, retrying upload for {task.filename}")
-                        # We switched to a new client, retry the upload from scratch
-                        task.status = "pending"
-                        task.error = None
-                        task.progress = 0
-                        return
+                # Sessions expire after about a week, start a new one
+                if isinstance(e, HttpError) and task.resumable_uri and e.resp.status in (404, 410):
+                    logger.warning(f"Upload session for {task.filename} has expired, starting over")
+                    media.meter.chunk_finished(0, ok=False)
+                    chunk_failures.inc()
+                    forget_upload_session(task)
+                    confirmed_bytes = 0
+                    # The new session starts at byte 0, so must the meter
+                    media.meter = TransferMeter(file_size)
+                    task.meter = media.meter
+                    insert_request = youtube.videos().insert(**params)
+                    continue
+                
+                # The session survives network errors, keep it for the retry
+                remember_upload_session(task, insert_request, project_id)
+                media.meter.chunk_finished(0, ok=False)
+                chunk_failures.inc()
+                
+                # Re-send less data if the chunk is retried
+                chunk_sizer.chunk_failed()
+                task.chunk_stats = chunk_sizer.stats()
+                
+                # Check for upload limit or quota exceeded
+                quota_reason = youtube_api.get_quota_error_reason(e)
+                if quota_reason:
+                    logger.warning(f"{quota_reason} error detected for API project {project_id}")
+                    # Put the task back, the workers of projects with quota left take it over
+                    # (with a session of their own)
+                    if youtube_api.handle_upload_limit_error(project_id, quota_reason):
+                        logger.info(f"Requeued {task.filename} for another API project")
                     else:
-                        # No other clients available, set the limit reached flag
-                        reset_hours = app_config.get("upload_limit_duration", 24)
-                        logger.warning(f"No other API clients available, setting upload limit for {reset_hours} hours")
-                        youtube_api.set_upload_limit_reached(reset_hours)
-                        task.mark_error(f"Upload limit exceeded. Will retry in {reset_hours} hours.")
-                        return
+                        reset_time = quota_ledger.get_next_reset()
+                        logger.warning(f"No API project has quota left, uploads paused until "
+                                       f"{reset_time.strftime('%Y-%m-%d %H:%M')}")
+                    task.mark_pending()
+                    return
                 
-                # Check for SSL or network errors that can be retried
-                if "SSL" in error_content or "connection" in error_content.lower() or "timeout" in error_content.lower():
-                    retry_count += 1
-                    logger.warning(f"Network error during upload, retry {retry_count}/{max_retries}: {error_content}")
-                    if retry_count <= max_retries:
-                        # Add exponential backoff before retry
-                        wait_time = 2 ** retry_count
-                        logger.info(f"Waiting {wait_time} seconds before retry...")
-                        time.sleep(wait_time)
-                        continue
+                # Client errors (4xx) and bugs won't go away by sending the chunk again
+                decision = retry_policy.classify_error(e)
+                breaker.record(decision)
+                if not decision.retryable:
+                    task.mark_error(f"Upload failed: {error_content}")
+                    logger.error(f"Upload failed for {task.filename}: {error_content}")
+                    return
                 
-                # For other errors, stop trying
-                task.mark_error(f"Upload failed: {error_content}")
-                logger.error(f"Upload failed for {task.filename}: {error_content}")
-                return
+                # The API keeps failing, leave the upload queued until the breaker closes
+                if breaker.is_open():
+                    logger.warning(f"Pausing upload of {task.filename} for {breaker.retry_in():.0f}s, "
+                                   f"API project {breaker.name} keeps failing")
+                    task.mark_pending()
+                    return
                 
-            except Exception as e:
-                # For general exceptions, also implement retry logic
-                retry_count += 1
-                logger.error(f"Error during upload, retry {retry_count}/{max_retries}: {str(e)}")
-                if retry_count <= max_retries:
-                    # Add exponential backoff before retry
-                    wait_time = 2 ** retry_count
-                    logger.info(f"Waiting {wait_time} seconds before retry...")
-                    time.sleep(wait_time)
-                    continue
+                if retry_count >= policy.max_retries:
+                    task.mark_error(f"Upload failed after {retry_count} retries: {error_content}")
+                    logger.error(f"Upload failed for {task.filename} after maximum retry attempts")
+                    return
                 
-                task.mark_error(f"Unknown error: {str(e)}")
-                logger.error(f"Upload failed for {task.filename} after all retries: {str(e)}")
-                return
-        
-        # If we ran out of retries
-        if retry_count > max_retries and response is None:
-            task.mark_error("Failed after maximum retry attempts")
-            logger.error(f"Upload failed for {task.filename} after maximum retry attempts")
-            return
+                wait_time = policy.delay(retry_count, decision)
+                retry_count += 1
+                upload_retries.inc()
+                logger.warning(f"Retrying upload of {task.filename} ({decision.reason}), "
+                               f"retry {retry_count}/{policy.max_retries} in {wait_time:.1f}s")
+                time.sleep(wait_time)
         
         # Upload completed
         if response:
             video_id = response['id']
+            task.resumable_uri = None
+            task.upload_project_id = None
+            task.uploaded_bytes = task.file_size
             task.mark_completed(video_id)
             logger.info(f"Upload completed for {task.filename}, video ID: {video_id}")
             
             # Delete file if configured
             if app_config.get("delete_after_upload"):
                 logger.info(f"Attempting to delete file after upload: {task.file_path}")
-                delete_video_file(task)
+                delete_video_file(task, app_config)
         else:
             task.mark_error("Upload failed - no response received")
             logger.error(f"Upload failed for {task.filename} - no response received")
@@ -351,76 +849,108 @@ def upload_video(task):
     except Exception as e:
         task.mark_error(str(e))
         logger.error(f"Unexpected error during upload of {task.filename}: {str(e)}")
+    finally:
+        task.meter = None
+        if media:
+            task.read_stats = media.stats()
+            media.close()
+
+def resume_upload_session(insert_request, resumable_uri):
+    """
+    Point an upload request at an existing resumable upload session
+    
+    The request then starts by asking the server how many bytes it already
+    has (an empty PUT with "Content-Range: bytes */size") and sends the rest.
+    
+    Args:
+        insert_request (HttpRequest): New videos.insert request for the same file
+        resumable_uri (str): URI of the earlier upload session
+    """
+    insert_request.resumable_uri = resumable_uri
+    insert_request.resumable_progress = 0
+    # The client library queries the upload status when it is in the error state.
+    # There is no public way to set it: this relies on the internals of
+    # google-api-python-client, check it when upgrading the pinned version
+    insert_request._in_error_state = True
 
-def delete_video_file(task):
+def remember_upload_session(task, insert_request, project_id=None):
     """
-    Try to delete the video file with multiple attempts
+    Store the upload session and confirmed offset of a request in its task
+    
+    A new session means the videos.insert request was accepted, its quota
+    units are charged to the project instead of being reserved.
     
     Args:
         task (UploadTask): The upload task
+        insert_request (HttpRequest): The request uploading the task's file
+        project_id (str, optional): API project the session was started with
     """
-    app_config = config.load_config()
+    if insert_request.resumable_uri and (
+            insert_request.resumable_uri != task.resumable_uri or
+            insert_request.resumable_progress != task.uploaded_bytes):
+        if insert_request.resumable_uri != task.resumable_uri:
+            quota_ledger.get_ledger().charge(project_id, 'youtube.videos.insert')
+            release_quota_reservation(task)
+            task.upload_project_id = project_id
+        task.resumable_uri = insert_request.resumable_uri
+        task.uploaded_bytes = insert_request.resumable_progress
+        task_journal.get_journal().save(task)
+
+def forget_upload_session(task):
+    """
+    Drop the upload session of a task, the next attempt starts from byte 0
+    
+    Args:
+        task (UploadTask): The upload task
+    """
+    task.resumable_uri = None
+    task.upload_project_id = None
+    task.uploaded_bytes = 0
+    task.progress = 0
+
+def delete_video_file(task, app_config=None):
+    """
+    Queue the video file of an uploaded task for deletion
+    
+    Files are deleted by the shared file deleter, which retries files
+    that are still in use (see file_deleter.py).
+    
+    Args:
+        task (UploadTask): The upload task
+        app_config (dict, optional): Application configuration if already loaded
+    """
+    app_config = app_config or config.load_config()
     
     if not app_config.get("delete_after_upload") or task.delete_success:
         return
-        
-    max_attempts = app_config.get("delete_retry_count", 5)
-    retry_delay = app_config.get("delete_retry_delay", 5)
     
-    # Schedule deletion attempt in a new thread to not block uploads
-    threading.Thread(
-        target=_try_delete_file, 
-        args=(task, max_attempts, retry_delay)
-    ).start()
+    file_deleter.deleter.schedule(
+        task,
+        max_attempts=app_config.get("delete_retry_count", 5),
+        retry_delay=app_config.get("delete_retry_delay", 5)
+    )
 
-def _try_delete_file(task, max_attempts, retry_delay):
+def file_deletion_changed(task):
     """
-    Internal function to try file deletion multiple times
+    Save the deletion state of a task after an attempt to delete its file
     
     Args:
         task (UploadTask): The upload task
-        max_attempts (int): Maximum number of deletion attempts
-        retry_delay (int): Delay in seconds between attempts
     """
-    logger.info(f"Starting file deletion for {task.file_path}, max attempts: {max_attempts}")
+    task_journal.get_journal().save(task, urgent=task.delete_success or task.delete_failed)
     
-    for attempt in range(max_attempts):
-        try:
-            # Ensure file exists
-            if not os.path.exists(task.file_path):
-                logger.info(f"File no longer exists, marking as deleted: {task.file_path}")
-                task.delete_success = True
-                return
-                
-            # Try to delete
-            logger.info(f"Deletion attempt {attempt+1}/{max_attempts} for {task.file_path}")
-            os.remove(task.file_path)
-            
-            # If we reach here, deletion was successful
-            task.delete_success = True
-            logger.info(f"Successfully deleted file: {task.file_path}")
-            return
-            
-        except Exception as e:
-            # Mark the attempt
-            task.delete_attempts += 1
-            logger.warning(f"Failed to delete file (attempt {attempt+1}/{max_attempts}): {e}")
-            
-            # Wait before retrying
-            time.sleep(retry_delay)
-    
-    # If we get here, all attempts failed
-    logger.error(f"Failed to delete file after {max_attempts} attempts: {task.file_path}")
-    task.error = f"Failed to delete file after {max_attempts} attempts"
+    # Let a waiting worker schedule the cleanup of the task
+    if task.delete_success:
+        upload_queue.notify()
 
 def get_upload_queue():
     """
     Get the current upload queue
     
     Returns:
-        list: List of upload tasks
+        tuple: Snapshot of the upload tasks, in the order they were added
     """
-    return upload_queue
+    return upload_queue.snapshot()
 
 def cancel_task(task_id):
     """
@@ -432,16 +962,22 @@ def cancel_task(task_id):
     Returns:
         bool: True if task was cancelled, False otherwise
     """
-    task = next((t for t in upload_queue if t.id == task_id), None)
-    
-    if not task:
-        logger.warning(f"Task not found for cancellation: {task_id}")
-        return False
+    with upload_queue.lock:
+        task = upload_queue.get(task_id)
+        
+        if not task:
+            logger.warning(f"Task not found for cancellation: {task_id}")
+            return False
+        
+        # Decide under the lock so no worker claims a pending task meanwhile
+        was_pending = task.status == "pending"
+        if was_pending:
+            logger.info(f"Removing pending task from queue: {task.filename} (ID: {task_id})")
+            upload_queue.remove(task_id)
+            task.mark_cancelled()
     
-    if task.status == "pending":
-        # Remove from queue if pending
-        logger.info(f"Removing pending task from queue: {task.filename} (ID: {task_id})")
-        upload_queue.remove(task)
+    if was_pending:
+        record_task_status(task)
         return True
     elif task.status == "uploading":
         # Request cancellation
@@ -459,18 +995,118 @@ def clear_completed_tasks():
     Returns:
         int: Number of tasks removed
     """
-    global upload_queue
-    
-    before_count = len(upload_queue)
-    upload_queue = [t for t in upload_queue if t.status != "completed"]
-    after_count = len(upload_queue)
-    removed = before_count - after_count
+    removed = len(upload_queue.remove_where(lambda t: True, status="completed"))
     
     if removed > 0:
         logger.info(f"Cleared {removed} completed tasks from queue")
     
     return removed
 
+def release_task_resources(task, event):
+    """
+    Drop the background work of a task that was removed or has finished
+    
+    Args:
+        task (UploadTask): The task that changed
+        event (str): "added", "removed" or "status"
+    """
+    if event == "removed" or task.status in TERMINAL_STATUSES:
+        discard_full_hash(task)
+
+def journal_task_change(task, event):
+    """
+    Save a change of the upload queue in the task journal
+    
+    Args:
+        task (UploadTask): The task that changed
+        event (str): "added", "removed" or "status"
+    """
+    journal = task_journal.get_journal()
+    if event == "removed":
+        journal.delete(task.id)
+    else:
+        journal.save(task, urgent=True)
+
+def restore_upload_queue():
+    """
+    Load the tasks saved in the task journal back into the upload queue
+    
+    Uploads that were interrupted by a crash or restart are queued again.
+    Finished tasks older than JOURNAL_TASK_RETENTION are dropped from the
+    journal, unless their file is still waiting to be deleted.
+    
+    Returns:
+        int: Number of restored tasks
+    """
+    journal = task_journal.get_journal()
+    restored = []
+    expired = 0
+    now = time.time()
+    app_config = config.load_config()
+    
+    for state in journal.load():
+        try:
+            task = UploadTask.from_state(state)
+        except Exception as e:
+            logger.error(f"Error restoring task {state.get('id')}: {e}")
+            continue
+        
+        if task.status in TERMINAL_STATUSES and not is_deletion_pending(task, app_config):
+            finished_at = task.end_time or task.start_time or task.created_at or 0
+            if now - finished_at > JOURNAL_TASK_RETENTION:
+                journal.delete(task.id)
+                expired += 1
+                continue
+        
+        if task.status == "uploading":
+            logger.info(f"Requeueing interrupted upload: {task.filename} (ID: {task.id})")
+            task.status = "pending"
+            task.cancel_requested = False
+            if not task.resumable_uri:
+                task.progress = 0
+        
+        if not upload_queue.add(task):
+            logger.warning(f"Dropping duplicate task from journal: {task.filename} (ID: {task.id})")
+            journal.delete(task.id)
+            continue
+        restored.append(task)
+        
+        # Deletions that were still being retried start over
+        if is_deletion_pending(task, app_config):
+            task.delete_attempts = 0
+            delete_video_file(task, app_config)
+    
+    # Pending files count as queued in this run, so rescans don't queue them again
+    pending = [(t.file_path, "queued", None, None) for t in restored if t.status == "pending"]
+    if pending:
+        file_index.get_index().record_many(pending)
+    
+    if expired:
+        logger.info(f"Dropped {expired} finished task(s) older than {JOURNAL_TASK_RETENTION // 86400} days from the journal")
+    if restored:
+        logger.info(f"Restored {len(restored)} task(s) from the journal, {len(pending)} pending")
+    return len(restored)
+
+def is_deletion_pending(task, app_config=None):
+    """
+    Check whether the file of an uploaded task still has to be deleted
+    
+    Args:
+        task (UploadTask): The upload task
+        app_config (dict, optional): Application configuration if already loaded
+        
+    Returns:
+        bool: True if files are deleted after upload and the task completed
+            without its file being deleted or given up on
+    """
+    app_config = app_config or config.load_config()
+    return (bool(app_config.get("delete_after_upload")) and task.status == "completed" and
+            not task.delete_success and not task.delete_failed)
+
+def save_upload_queue():
+    """Write all unsaved task changes to the journal, e.g. before a restart"""
+    task_journal.get_journal().flush()
+
 def init_uploader():
     """Initialize the uploader - call this at application startup"""
     logger.info("Initializing uploader")
@@ -478,11 +1114,21 @@ def init_uploader():
     try:
         # Register the upload callback with the file monitor
         import file_monitor
-        file_monitor.register_callback(add_to_upload_queue)
+        file_monitor.register_callback(add_to_upload_queue, add_files_to_upload_queue)
         logger.info("Registered callback with file_monitor")
         
-        # Start the upload thread
-        ensure_upload_thread_running()
+        # Start the workers of newly authenticated projects and wake the others
+        youtube_api.add_service_listener(ensure_upload_workers_running)
+        youtube_api.add_service_listener(upload_queue.notify)
+        
+        # Keep the queue in the journal and bring back the tasks of the last run
+        file_deleter.deleter.on_change = file_deletion_changed
+        upload_queue.add_listener(journal_task_change)
+        upload_queue.add_listener(release_task_resources)
+        restore_upload_queue()
+        
+        # Start the upload workers
+        ensure_upload_workers_running()
         logger.info("Uploader initialized successfully")
     except Exception as e:
         logger.error(f"Error initializing uploader: {e}")
\ No newline at end of file
@@ -6,12 +6,17 @@ import glob
 import pickle
 import random
 import shutil
-from datetime import datetime, timedelta
+import threading
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload, HttpRequest
+from googleapiclient.http import MediaFileUpload, HttpRequest, build_http
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.errors import HttpError
 from google.auth.transport.requests import Request
 
+import metrics
+import retry_policy
+import quota_ledger
+
 # YouTube API constants
 SCOPES = ['https://www.googleapis.com/auth/youtube.upload']
 API_SERVICE_NAME = 'youtube'
@@ -29,14 +34,26 @@ TOKEN_PICKLE_FILE = 'token.pickle'
 os.makedirs(API_CREDENTIALS_DIR, exist_ok=True)
 os.makedirs(TOKENS_DIR, exist_ok=True)
 
-# Track YouTube clients and active client
+# Track YouTube clients and active client. Uploads use the clients of all
+# authenticated projects, the active one serves the other API calls
 youtube_clients = {}
+youtube_credentials = {}  # project ID -> credentials of the loaded client
+clients_lock = threading.RLock()
 active_client_id = None
 youtube = None  # Current active client
 
-# Track upload limits
-upload_limit_reached = False
-upload_limit_reset_time = None
+# Functions called when a YouTube client becomes active
+service_listeners = []
+
+# HttpRequest.execute before it was patched with retry logic
+original_execute = None
+
+# Metrics
+api_requests = metrics.counter('api_requests_total', 'YouTube API requests, by method and HTTP status', ['method', 'status'])
+api_request_duration = metrics.histogram('api_request_duration_seconds', 'Duration of YouTube API requests', ['method'])
+api_retries = metrics.counter('api_retries_total', 'YouTube API requests retried after an error', ['method'])
+metrics.gauge('upload_limit_reached', '1 while no API project has quota left for an upload',
+              function=lambda: 1 if get_upload_limit_status()[0] else 0)
 
 def migrate_legacy_credentials():
     """Migrate legacy credentials to the new directory structure"""
@@ -84,47 +101,45 @@ def get_youtube_api_with_retry():
     """
     Creates YouTube API client with retry capabilities for transient network issues
     
+    Every API request is sent through the shared retry policy (see
+    retry_policy.py) and the circuit breaker of its project, and the
+    quota units it costs are recorded in the quota ledger.
+    
     Returns:
         function: A function to build YouTube API clients with retry logic
     """
-    # Store the original execute method
+    global original_execute
+    
+    # Patch only once, clients built later share the patched method
+    if original_execute is not None:
+        return build
     original_execute = HttpRequest.execute
     
     # Create a patched execute method with retry logic
     def _patched_execute(self, *args, **kwargs):
-        from config import load_config
+        method = getattr(self, 'methodId', None) or 'unknown'
+        project_id = get_request_project(self.http)
+        breaker = retry_policy.get_breaker(project_id)
         
-        config = load_config()
-        max_retries = config.get('max_retries', 3)
-        retry_count = 0
+        def on_attempt(error, decision, seconds):
+            api_request_duration.observe(seconds, method=method)
+            if error is None:
+                api_requests.inc(method=method, status=200)
+            else:
+                api_requests.inc(method=method, status=decision.status or 'error')
+            
+            # Requests the server answered cost quota, even if they failed
+            if error is None or decision.status is not None:
+                quota_ledger.get_ledger().charge(project_id, method)
+            if error is not None and is_quota_error(error):
+                quota_ledger.get_ledger().mark_exhausted(project_id, get_quota_error_reason(error))
         
-        while retry_count <= max_retries:
-            try:
-                return original_execute(self, *args, **kwargs)
-            except HttpError as e:
-                # Don't retry for most HTTP errors
-                if e.resp.status < 500:
-                    raise
-                retry_count += 1
-                if retry_count > max_retries:
-                    raise
-                # Exponential backoff
-                time.sleep(2 ** retry_count)
-            except Exception as e:
-                error_str = str(e).lower()
-                # Retry on network errors
-                if ("ssl" in error_str or 
-                   "connection" in error_str or 
-                   "timeout" in error_str or 
-                   "broken pipe" in error_str):
-                    retry_count += 1
-                    if retry_count > max_retries:
-                        raise
-                    # Exponential backoff
-                    time.sleep(2 ** retry_count)
-                else:
-                    # Don't retry for other types of errors
-                    raise
+        return retry_policy.get_policy().call(
+            lambda: original_execute(self, *args, **kwargs),
+            breaker=breaker,
+            on_attempt=on_attempt,
+            on_retry=lambda error, decision, wait: api_retries.inc(method=method)
+        )
     
     # Patch the execute method
     HttpRequest.execute = _patched_execute
@@ -132,6 +147,53 @@ def get_youtube_api_with_retry():
     # All subsequent API calls will use our patched execute method
     return build
 
+def get_request_project(http):
+    """
+    Find the API project whose credentials an HTTP connection uses
+    
+    Args:
+        http (object): Connection of a request
+        
+    Returns:
+        str: ID of the project, the active one if the connection is unknown
+    """
+    credentials = getattr(http, 'credentials', None)
+    if credentials is not None:
+        for project_id, project_credentials in list(youtube_credentials.items()):
+            if project_credentials is credentials:
+                return project_id
+    return active_client_id
+
+def is_quota_error(error):
+    """
+    Check whether an error means a project can't upload until the quota resets
+    
+    Args:
+        error (Exception): Error of an API request or upload
+        
+    Returns:
+        bool: True for quotaExceeded and uploadLimitExceeded errors
+    """
+    return get_quota_error_reason(error) is not None
+
+def get_quota_error_reason(error):
+    """
+    Get the quota reason of an API error
+    
+    Args:
+        error (Exception): Error of an API request or upload
+        
+    Returns:
+        str: quotaExceeded, uploadLimitExceeded, or None for other errors
+    """
+    if not isinstance(error, HttpError):
+        return None
+    content = str(error)
+    for reason in ('quotaExceeded', 'uploadLimitExceeded'):
+        if reason in content:
+            return reason
+    return None
+
 def select_api_project(project_id=None):
     """
     Select an API project to use
@@ -142,8 +204,6 @@ def select_api_project(project_id=None):
     Returns:
         object: YouTube API client if successful, None otherwise
     """
-    global youtube, active_client_id
-    
     projects = get_available_api_projects()
     
     if not projects:
@@ -167,17 +227,34 @@ def select_api_project(project_id=None):
     if not selected_project:
         return None
     
-    # If we already have this client loaded, activate it
-    if project_id in youtube_clients:
-        youtube = youtube_clients[project_id]
-        active_client_id = project_id
-        return youtube
+    # Load the client if needed and make it the active one
+    client = load_client(selected_project)
+    if client:
+        return activate_client(project_id, client)
     
-    # Try to authenticate with this project
-    client_file = selected_project['file_path']
-    token_file = selected_project['token_path']
+    return None
+
+def load_client(project):
+    """
+    Load the YouTube client of an authenticated project without activating it
     
-    if os.path.exists(token_file):
+    Args:
+        project (dict): Project from get_available_api_projects
+        
+    Returns:
+        object: YouTube API client if successful, None otherwise
+    """
+    project_id = project['id']
+    token_file = project['token_path']
+    
+    with clients_lock:
+        # If we already have this client loaded, use it
+        if project_id in youtube_clients:
+            return youtube_clients[project_id]
+        
+        if not os.path.exists(token_file):
+            return None
+        
         try:
             with open(token_file, 'rb') as token:
                 credentials = pickle.load(token)
@@ -193,37 +270,80 @@ def select_api_project(project_id=None):
                 # Use our improved builder with retry logic
                 client_builder = get_youtube_api_with_retry()
                 client = client_builder(API_SERVICE_NAME, API_VERSION, credentials=credentials)
-                
                 youtube_clients[project_id] = client
-                youtube = client
-                active_client_id = project_id
+                youtube_credentials[project_id] = credentials
                 return client
         except Exception as e:
             print(f"Error loading credentials for project {project_id}: {e}")
     
     return None
 
-def handle_upload_limit_error(previous_client_id):
+def load_project_clients():
+    """
+    Load the YouTube clients of all authenticated projects
+    
+    Returns:
+        list: IDs of the projects with a loaded client
+    """
+    return [project['id'] for project in get_available_api_projects()
+            if os.path.exists(project['token_path']) and load_client(project)]
+
+def activate_client(project_id, client, credentials=None):
     """
-    Try to switch to a different API client when hitting upload limits
+    Make a YouTube client the active one and tell the listeners
     
     Args:
-        previous_client_id (str): ID of the client that hit the upload limit
+        project_id (str): ID of the client's API project
+        client (object): YouTube API client
+        credentials (Credentials, optional): Credentials the client was built with
         
     Returns:
-        object: New YouTube API client if available, None otherwise
+        object: The client
     """
-    # Mark current client as limited
-    if previous_client_id:
-        youtube_clients.pop(previous_client_id, None)
+    global youtube, active_client_id
     
-    # Try to find another authenticated client
-    projects = get_available_api_projects()
-    for project in projects:
-        if project['id'] != previous_client_id and os.path.exists(project['token_path']):
-            return select_api_project(project['id'])
+    with clients_lock:
+        youtube_clients[project_id] = client
+        if credentials is not None:
+            youtube_credentials[project_id] = credentials
+    youtube = client
+    active_client_id = project_id
     
-    return None
+    for listener in list(service_listeners):
+        try:
+            listener()
+        except Exception as e:
+            print(f"Error notifying service listener: {e}")
+    
+    return client
+
+def add_service_listener(callback):
+    """
+    Register a function to call whenever a YouTube client becomes active
+    
+    Args:
+        callback (function): Called without arguments
+    """
+    if callback not in service_listeners:
+        service_listeners.append(callback)
+
+def handle_upload_limit_error(previous_client_id, reason='uploadLimitExceeded'):
+    """
+    Stop uploading with a project that hit its upload limit
+    
+    The project is not used again until its quota resets, uploads continue
+    on the other projects.
+    
+    Args:
+        previous_client_id (str): ID of the client that hit the upload limit
+        reason (str): Error reason reported by the API
+        
+    Returns:
+        str: ID of the loaded project with the most quota left, or None if
+            no project can upload until the reset
+    """
+    quota_ledger.get_ledger().mark_exhausted(previous_client_id, reason)
+    return quota_ledger.get_ledger().choose_project(list(youtube_clients))
 
 def get_youtube_service():
     """
@@ -253,32 +373,38 @@ def get_youtube_service():
     
     return None
 
-def set_upload_limit_reached(duration_hours=24):
+def create_authorized_http(project_id=None):
     """
-    Set the upload limit reached flag and calculate reset time
+    Create a separate authorized HTTP connection for an API project
+    
+    The connection of a client can't be shared between threads, so every
+    upload running in parallel sends its requests through its own connection.
     
     Args:
-        duration_hours (int): Number of hours to wait before resetting
+        project_id (str, optional): ID of the project, defaults to the active one
+        
+    Returns:
+        AuthorizedHttp: New connection, or None if the project isn't loaded
     """
-    global upload_limit_reached, upload_limit_reset_time
-    upload_limit_reached = True
-    upload_limit_reset_time = datetime.now() + timedelta(hours=duration_hours)
+    credentials = youtube_credentials.get(project_id or active_client_id)
+    if credentials is None:
+        return None
+    return AuthorizedHttp(credentials, http=build_http())
 
 def get_upload_limit_status():
     """
     Get the current upload limit status
     
+    The limit is reached while none of the loaded projects has quota left
+    for an upload, until the daily quota resets (midnight Pacific time).
+    
     Returns:
         tuple: (is_limit_reached, reset_time)
     """
-    # Reset upload limit if time has passed
-    global upload_limit_reached, upload_limit_reset_time
-    
-    if upload_limit_reached and upload_limit_reset_time and datetime.now() > upload_limit_reset_time:
-        upload_limit_reached = False
-        upload_limit_reset_time = None
-        
-    return (upload_limit_reached, upload_limit_reset_time)
+    project_ids = list(youtube_clients)
+    if project_ids and quota_ledger.get_ledger().choose_project(project_ids) is None:
+        return (True, quota_ledger.get_next_reset())
+    return (False, None)
 
 def get_channel_list():
     """